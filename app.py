@@ -1,41 +1,21 @@
 import streamlit as st
-import requests
 import time
-import json
+import uuid
+import threading
 import pandas as pd
 from datetime import datetime, timedelta
-from github import Github
-
-# ==========================================
-# 0. 🎯 核心配置：人工审计日志 (Audit Memo)
-# ==========================================
-# 这里就是你要的“审计胶囊”配置
-AUDIT_MEMO = {
-    "摩根均衡精选混合A": {
-        "tag": "✅ 准确率高", 
-        "text": "上周偏离值在0.1-0.5之间，可信度高", 
-        "color": "#D4EDDA", # 浅绿色背景
-        "text_color": "#155724" # 深绿色文字
-    },
-    "华安品质甄选混合A": {
-        "tag": "✅ 准确率高", 
-        "text": "基本跟净值一致，可信度高", 
-        "color": "#D4EDDA", # 浅绿色背景
-        "text_color": "#155724" # 深绿色文字
-    },
-    "财通周期优选混合C": {
-        "tag": "👌 偏差可控", 
-        "text": "偏离值可接受，参考性强", 
-        "color": "#D1ECF1", # 浅蓝色背景
-        "text_color": "#0C5460" # 深蓝色文字
-    },
-    "路博迈中国动力股票C": {
-        "tag": "👌 偏差可控", 
-        "text": "偏离值可接受，参考性强", 
-        "color": "#D1ECF1", # 浅蓝色背景
-        "text_color": "#0C5460" # 深蓝色文字
-    }
-}
+
+import backtest
+import calibration
+import nav_backfill
+import quote_client
+import signal_rules
+import trading_calendar
+import valuation
+from github_store import GithubStore, StaleWriteError
+from nav_store import NAV_STORE_DIR, NavStore
+from tick_recorder import TickRecorder
+from quote_client import get_realtime_price
 
 # === 🎨 1. 页面配置与 CSS 魔法 (Apple Glassmorphism V5.1) ===
 st.set_page_config(
@@ -231,113 +211,93 @@ FUND_CODES_MAP = {
     '华安品质甄选混合A (013680)': '013680'
 }
 
+# 进程级行情快照的刷新间隔 (秒)：所有会话共用，上游请求频率与会话数无关
+QUOTE_CACHE_TTL = 15
+# ⚡ 极速模式：只刷新关注基金的持仓代码，间隔 4 秒；看板循环同步加快
+FAST_QUOTE_TTL = 4
+DASHBOARD_INTERVAL = 30
+FAST_DASHBOARD_INTERVAL = 4
+
 # === 🛠️ 辅助逻辑：智能匹配基准 ===
 def get_benchmark_code(fund_name):
-    if "周期" in fund_name or "均衡" in fund_name:
-        return 'sh000001', '上证'
-    elif "成长" in fund_name or "AI" in fund_name or "优选" in fund_name:
-        return 'sz399006', '创指'
-    else:
-        return 'sh000001', '上证'
+    return signal_rules.benchmark_for(fund_name)
 
 # === 🛠️ GitHub 数据库操作 ===
 
-def get_repo():
+@st.cache_resource(show_spinner=False)
+def _open_store(token, username, repo_name):
+    """每个进程只连接一次 GitHub (仓库句柄 + 文件内容缓存)"""
+    return GithubStore(token, username, repo_name)
+
+def get_store():
     try:
-        token = st.secrets["github_token"]
-        username = st.secrets["github_username"]
-        repo_name = st.secrets["repo_name"]
-        g = Github(token)
-        return g.get_user(username).get_repo(repo_name)
+        return _open_store(st.secrets["github_token"], st.secrets["github_username"], st.secrets["repo_name"])
     except Exception as e:
         st.error(f"GitHub 连接失败: {e}")
         return None
 
 def load_json(filename):
-    repo = get_repo()
-    if not repo: return {}, None
+    store = get_store()
+    if not store: return {}, None
     try:
-        content = repo.get_contents(filename)
-        return json.loads(content.decoded_content.decode('utf-8')), content.sha
+        return store.read_json(filename)
     except:
         return {}, None
 
 def save_json(filename, data, sha, message):
-    repo = get_repo()
-    if repo:
-        new_content = json.dumps(data, indent=4, ensure_ascii=False)
-        if sha:
-            repo.update_file(filename, message, new_content, sha)
-        else:
-            repo.create_file(filename, message, new_content)
+    store = get_store()
+    if store:
+        store.write_json(filename, data, sha, message)
+
+def save_json_files(files, message, base_shas=None):
+    """多个文件合成一个 commit 原子写入 (files: {filename: data}，base_shas: {filename: 读取时的 sha})
+    文件在读取之后被别人改过时不写入，提示刷新后重试；返回是否写入成功
+    """
+    store = get_store()
+    if not store: return False
+    try:
+        store.commit_files(files, message, base_shas=base_shas)
+        return True
+    except StaleWriteError as e:
+        st.error(f"⚠️ {e}，为避免覆盖已取消保存，请刷新页面后重试")
+        return False
 
-def save_factor_history(date_str, new_factors_dict):
-    history, sha = load_json('factor_history.json')
+def merge_factor_history(history, date_str, new_factors_dict):
     if not isinstance(history, dict): history = {}
     existing_record = history.get(date_str, {})
     existing_record.update(new_factors_dict)
     history[date_str] = existing_record
-    save_json('factor_history.json', history, sha, f"Factor Log {date_str}")
+    return history
 
 # === 🕷️ 数据获取 ===
 
-def get_realtime_price(stock_codes):
-    if not stock_codes: return {}
-    codes_str = ",".join(stock_codes)
-    url = f"http://qt.gtimg.cn/q={codes_str}"
+@st.cache_resource
+def get_quote_cache():
+    """整个 Streamlit 进程只有一个行情缓存 (后台线程统一刷新)"""
+    return quote_client.SharedQuoteCache(ttl=QUOTE_CACHE_TTL, fast_ttl=FAST_QUOTE_TTL)
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def get_audit_memo(funds_config, nav_version, _nav_store):
+    """审计胶囊的兜底文案：用回测实测的近期误差 (收盘存证 + 本机录制的行情 vs 官方净值)"""
+    history, _ = load_json('history.json')
+    factor_hist, _ = load_json('factor_history.json')
     try:
-        r = requests.get(url, timeout=3)
-        text = r.text
-        price_data = {}
-        parts = text.split(';')
-        for part in parts:
-            if '="' in part:
-                try:
-                    key_raw = part.split('=')[0].strip()
-                    code = key_raw.split('_')[-1] 
-                    data = part.split('="')[1].strip('"').split('~')
-                    if len(data) > 30:
-                        name = data[1].replace(" ", "")
-                        current = float(data[3])
-                        close = float(data[4])
-                        pct = 0.0
-                        if close > 0: pct = ((current - close) / close) * 100
-                        
-                        # Extract date from index 30 (Format: 20231027153000)
-                        data_date = ""
-                        if len(data) > 30:
-                            raw_time = data[30]
-                            if len(raw_time) >= 8:
-                                data_date = f"{raw_time[:4]}-{raw_time[4:6]}-{raw_time[6:8]}"
-                        
-                        price_data[code] = {'name': name, 'change': pct, 'date': data_date}
-                except: continue
-        return price_data
-    except: return None
+        report = backtest.run(funds_config, history or {}, _nav_store.get, factor_hist, backtest.quotes_from_ticks())
+    except Exception as e:
+        print(f"⚠️ 估值回测失败: {e}")
+        return {}
+    return backtest.audit_memo(report)
+
+@st.cache_resource
+def get_tick_recorder():
+    """盘中估值录制 (后台线程写 ticks/，整个进程共用一个)"""
+    return TickRecorder()
 
 def get_fund_estimated_nav(fund_codes):
-    """获取公募基金的实时估算涨跌幅 (天天基金估值接口)。
+    """获取公募基金的实时估算涨跌幅 (天天基金估值接口，并发请求)。
     返回格式与 get_realtime_price 一致: {code: {'name':..., 'change':..., 'date':...}}
     """
-    result = {}
-    for code in fund_codes:
-        url = f"https://fundgz.1234567.com.cn/js/{code}.js"
-        try:
-            r = requests.get(url, timeout=4, headers={"Referer": "http://fund.eastmoney.com/"})
-            import re as _re
-            m = _re.search(r'jsonpgz\((.+)\)', r.text)
-            if m:
-                data = json.loads(m.group(1))
-                name = data.get('name', code)
-                # gszzl: 估算涨跌幅 (%), gztime: 估算时间
-                pct_str = data.get('gszzl', '0')
-                gztime = data.get('gztime', '')
-                pct = float(pct_str) if pct_str else 0.0
-                date_str = gztime[:10] if len(gztime) >= 10 else ''
-                result[code] = {'name': name, 'change': pct, 'date': date_str}
-        except:
-            continue
-    return result
+    return quote_client.get_fund_estimates(fund_codes)
 
 def is_fund_code(code):
     """判断一个 code 是公募基金代码（6位纯数字）而非股票代码（带前缀sh/sz/hk等）"""
@@ -359,7 +319,7 @@ def get_official_nav_pct(fund_code):
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
     }
     try:
-        r = requests.get(url, headers=headers, timeout=5)
+        r = quote_client.get(url, headers=headers)
         if r.status_code == 200:
             res = r.json()
             if "Data" in res and "LSJZList" in res["Data"]:
@@ -418,7 +378,7 @@ def fetch_fund_holdings(fund_code):
     }
     import re
     try:
-        r = requests.get(url, headers=headers, timeout=5)
+        r = quote_client.get(url, headers=headers)
         r.encoding = 'utf-8'
         match = re.search(r'content:"(.*?)",', r.text)
         if not match: return []
@@ -454,122 +414,288 @@ def fetch_fund_holdings(fund_code):
 
 # === 📈 历史数据与趋势分析 (Auto-Fetch) ===
 
-@st.cache_data(ttl=3600*4)
-def fetch_fund_history(fund_code, limit=20):
-    """从天天基金接口抓取历史净值"""
-    timestamp = int(time.time() * 1000)
-    url = f"https://api.fund.eastmoney.com/f10/lsjz?fundCode={fund_code}&pageIndex=1&pageSize={limit}&_={timestamp}"
-    headers = {
-        "Referer": "http://fund.eastmoney.com/",
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-    }
-    try:
-        r = requests.get(url, headers=headers, timeout=5)
-        if r.status_code == 200:
-            res = r.json()
-            if "Data" in res and "LSJZList" in res["Data"]:
-                return res["Data"]["LSJZList"]
-    except: pass
-    return []
+# 同一进程内历史净值最多每 30 分钟刷新一次
+HISTORY_REFRESH_INTERVAL = 1800
+HISTORY_WORKERS = 4
 
-def update_history_cache(funds_config):
-    """检查并更新历史净值缓存"""
-    cache, sha = load_json('nav_history.json')
-    if not isinstance(cache, dict): cache = {}
-    
-    need_save = False
+def open_nav_store(store):
+    """从 GitHub 懒加载净值存储 (nav_store/)，只有用到的文件才会请求"""
+    read_text = (lambda relpath: store.read_text(f"{NAV_STORE_DIR}/{relpath}")) if store else (lambda relpath: None)
+    return NavStore(NAV_STORE_DIR, read_text=read_text)
+
+def save_nav_store(nav_store, message, store):
+    """只提交有变化的基金文件 + index.json (一个 commit)"""
+    files = nav_store.changed_files()
+    if not files: return
+    if store:
+        store.commit_files({f"{NAV_STORE_DIR}/{relpath}": text for relpath, text in files.items()}, message)
+    nav_store.mark_clean()
+
+def update_history_cache(funds_config, store):
+    """检查并补齐历史净值：只按缺失的日期区间并发抓取 (新基金全量导入)，一次合并、一次提交
+    不调用任何 st.* 接口，可以在后台线程运行。返回 (nav_store, [(基金简称, 新增条数), ...])
+    """
+    nav_store = open_nav_store(store)
     today = datetime.now().strftime("%Y-%m-%d")
     
-    for name, info in funds_config.items():
-        code = FUND_CODES_MAP.get(name)
-        if not code: continue
-        
-        # 使用全名作为 Key，避免分割带来的混淆
-        key_name = name
-        if key_name not in cache: cache[key_name] = {}
-        
-        fund_history = cache[key_name]
-        
-        # 简单策略：如果最新数据的日期早于今天，就尝试更新
-        sorted_dates = sorted(fund_history.keys())
-        last_date = sorted_dates[-1] if sorted_dates else "2000-01-01"
-        
-        if last_date < today:
-            data = fetch_fund_history(code)
-            if data:
-                count_new = 0
-                for item in data:
-                    d = item["FSRQ"]
-                    try:
-                        val = float(item["JZZZL"]) if item["JZZZL"] else 0.0
-                        if d not in fund_history:
-                            fund_history[d] = val
-                            count_new += 1
-                            need_save = True
-                    except: pass
-                if count_new > 0:
-                    try:
-                        st.toast(f"已更新: {name.split('(')[0]} ({count_new}条)")
-                    except: pass
-                
-    if need_save:
-        save_json('nav_history.json', cache, sha, f"Auto Update {today}")
+    fund_codes = {name: FUND_CODES_MAP[name] for name in funds_config if name in FUND_CODES_MAP}
+    added = nav_backfill.backfill(nav_store, fund_codes, today, workers=HISTORY_WORKERS)
+    save_nav_store(nav_store, f"Auto Update {today}", store)
     
-    return cache
+    return nav_store, [(name.split('(')[0], count) for name, count in added.items()]
+
+class HistoryRefresher:
+    """后台刷新历史净值：整个进程只跑一个刷新线程，页面先用已缓存的净值渲染，
+    刷新完成后各会话在下一轮循环里换上新数据"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.thread = None
+        self.last_started = 0
+        self.version = 0
+        self.nav_store = None
+        self.updated = []
 
-def get_dashboard_stats(fund_name, cache):
-    """计算昨日收益和连涨连跌趋势"""
-    key_name = fund_name
+    def start(self, funds_config, store):
+        with self.lock:
+            if self.thread and self.thread.is_alive(): return
+            if time.time() - self.last_started < HISTORY_REFRESH_INTERVAL: return
+            self.last_started = time.time()
+            self.thread = threading.Thread(target=self._run, args=(dict(funds_config), store), name="nav-refresh", daemon=True)
+            self.thread.start()
+
+    def _run(self, funds_config, store):
+        try:
+            nav_store, updated = update_history_cache(funds_config, store)
+        except Exception as e:
+            print(f"⚠️ 历史净值刷新失败: {e}")
+            return
+        with self.lock:
+            self.nav_store, self.updated = nav_store, updated
+            self.version += 1
+
+@st.cache_resource
+def get_history_refresher():
+    return HistoryRefresher()
+
+def get_dashboard_stats(fund_name, nav_store):
+    """昨日收益和连涨连跌趋势 (写入净值时已预计算，这里只查表)"""
     stats = {"yesterday": 0, "streak": 0, "streak_type": "none", "last_date": "-"}
     
-    if key_name not in cache: return stats
+    pre = nav_store.stats(fund_name)
+    if not pre: return stats
+    
+    stats.update(pre)
+    stats["last_date"] = pre["last_date"][5:] # 只显示 MM-DD
+    stats["full_last_date"] = pre["last_date"] # YYYY-MM-DD
+    # 只有一天数据时不显示连涨连跌
+    if nav_store.index[fund_name].get('count', 0) < 2:
+        stats["streak"] = 0
+        stats["streak_type"] = "none"
+    
+    return stats
+
+# === 🖼️ 增量渲染：只重绘数值有变化的卡片 / 指标 ===
+
+# 定义简称映射
+FUND_ALIASES = {
+    "财通周期优选混合C (025547)": "财通周期",
+    "财通科技创新混合C (008984)": "财通科技",
+    "路博迈中国动力股票C (020237)": "路博迈",
+    "摩根均衡精选混合A (021273)": "摩根均衡",
+    "华安品质甄选混合A (013680)": "华安品质"
+}
+
+def render_if_changed(rendered, key, slot, signature, draw):
+    """signature 与上一次渲染相同则跳过；signature 由按显示精度格式化好的字符串组成，
+    所以数值在显示精度以内的抖动不会触发重绘"""
+    if rendered.get(key) == signature: return False
+    rendered[key] = signature
+    with slot.container():
+        draw()
+    return True
+
+def kpi_tile_html(label_html, value_html, extra_html=""):
+    """顶部 2x2 收益指标卡片"""
+    return f"""
+                <div style='background: rgba(255, 255, 255, 0.65); backdrop-filter: blur(16px); 
+                            border: 1px solid rgba(255, 255, 255, 0.6); padding: 15px 10px; 
+                            border-radius: 20px; box-shadow: 0 8px 32px rgba(31, 38, 135, 0.05); 
+                            min-height: 115px; display: flex; flex-direction: column; justify-content: center;'>
+                    <div style='font-size: 12px; color: rgb(49, 51, 63); margin-bottom: 4px;'>{label_html}</div>
+                    <div style='font-size: 16px; font-weight: 600; color: rgb(49, 51, 63); overflow: visible !important; text-overflow: clip !important; white-space: nowrap !important;'>{value_html}</div>
+                    {extra_html}
+                </div>
+                """
+
+def build_card_parts(card, zen_mode, nav_store, today_str, audit_memo):
+    """把一张基金卡片格式化成 HTML 片段元组，同时作为增量渲染的 signature"""
+    icon = "👑" if card['est'] > 0 else "📿"
     
-    history = cache[key_name]
-    if not history: return stats
+    title_suffix = f" {card['est']:+.2f}%"
+    if card['signal_type'] == "BUY": title_suffix += " 🎯 机会"
+    elif card['signal_type'] == "SELL": title_suffix += " 🔥 止盈"
     
-    # 按日期倒序
-    dates = sorted(history.keys(), reverse=True)
-    if not dates: return stats
+    # 使用简称
+    display_name = FUND_ALIASES.get(card['name'], card['name'])
+    title = f"{icon} {display_name}{title_suffix}"
+
+    # ----------------------------------------------------
+    # 🔥 审计胶囊 (AUDIT PILL) - 动态版
+    # ----------------------------------------------------
+    pill_html = ""
+    audit_data = None
     
-    # 1. 昨日（最新）数据
-    last_date = dates[0]
-    stats["yesterday"] = history[last_date]
-    stats["last_date"] = last_date[5:] # 只显示 MM-DD
-    stats["full_last_date"] = last_date # YYYY-MM-DD
+    # 1. 尝试获取今日实际净值进行动态对比
+    actual_pct = nav_store.get(card['full_name'], today_str) # name is short, full_name is key
+    if actual_pct is not None:
+        audit_data = get_audit_status(card['est'], actual_pct)
     
-    # 2. 连涨连跌计算
-    if len(dates) < 2: return stats
+    # 2. 如果没有今日数据，使用回测统计的近期误差 (作为兜底)
+    if not audit_data:
+        audit_data = audit_memo.get(card['full_name'])
     
-    first_val = history[dates[0]]
-    if first_val > 0:
-        streak_type = "up"
-    elif first_val < 0:
-        streak_type = "down"
-    else:
-        streak_type = "flat"
+    if audit_data:
+        # 确保兼容新旧字段
+        bg_color = audit_data.get('color', '#f8f9fa')
+        text_color = audit_data.get('text_color', '#333')
+        tag = audit_data.get('tag', 'Note')
+        text = audit_data.get('text', '')
+        tooltip = audit_data.get('tooltip', '')
+        pill_html = f"<div class='audit-pill' title='{tooltip}' style='background-color:{bg_color}; color:{text_color};'><strong>{tag}</strong> | {text}</div>"
+
+    # ----------------------------------------------------
+    # 📊 昨日盈亏数据
+    # ----------------------------------------------------
+    h_stats = card['h_stats']
+    if h_stats['last_date'] != "-":
+        yes_profit = card['yes_profit']
+        abs_profit = abs(yes_profit)
+        y_sign_pct = "+" if h_stats['yesterday'] > 0 else ""
+        y_sign_money = "+" if yes_profit > 0 else "-"
         
-    count = 1
-    for d in dates[1:]:
-        val = history[d]
-        # 容错：0% 视为中断，或者延续？通常视为中断
-        if (streak_type == "up" and val > 0) or \
-           (streak_type == "down" and val < 0):
-            count += 1
-        else:
-            break
-            
-    stats["streak"] = count
-    stats["streak_type"] = streak_type
+        # 颜色逻辑保持一致：涨红跌绿
+        color_style = "color:#ff3b30" if h_stats['yesterday'] > 0 else "color:#34c759"
+        
+        s_icon = "🔥" if h_stats['streak_type'] == "up" else "🥶" if h_stats['streak_type'] == "down" else "😐"
+        s_text = f"{h_stats['streak']}连涨" if h_stats['streak_type'] == "up" else f"{h_stats['streak']}连跌" if h_stats['streak_type'] == "down" else "平盘"
+        
+        # 格式化日期：2026-02-06 -> 2026年2月6日
+        date_display = ""
+        try:
+            full_date = h_stats.get('full_last_date', '')
+            if full_date:
+                ymd = full_date.split('-')
+                date_display = f"{ymd[0]}年{int(ymd[1])}月{int(ymd[2])}日"
+        except: pass
+
+        yesterday_html = f"""
+                            <div style='
+                                background-color: rgba(248, 249, 250, 0.7); 
+                                border: 1px solid rgba(0,0,0,0.05); 
+                                border-radius: 10px; 
+                                padding: 10px 14px; 
+                                display: flex; 
+                                align-items: center; 
+                                justify-content: space-between; 
+                                margin-bottom: 15px;
+                                margin-top: 4px;
+                                font-family: -apple-system;
+                            '>
+                                <div style='display:flex; align-items:center;'>
+                                    <span style='color:#8e8e93; font-size:12px; font-weight:500; letter-spacing:0.3px'>{date_display}</span>
+                                    <div style='width:1px; height:12px; background:#ddd; margin:0 8px;'></div>
+                                    <span style='{color_style}; font-size:14px; font-weight:600; font-variant-numeric: tabular-nums;'>{y_sign_pct}{h_stats['yesterday']:.2f}%</span>
+                                    <span style='{color_style}; font-size:14px; font-weight:600; margin-left:6px; font-variant-numeric: tabular-nums;'>{y_sign_money}¥{abs_profit:,.0f}</span>
+                                </div>
+                                <div style='
+                                    background: rgba(0,0,0,0.04); 
+                                    padding: 3px 8px; 
+                                    border-radius: 6px; 
+                                    font-size: 11px; 
+                                    font-weight: 600; 
+                                    color: #555;
+                                    display: flex;
+                                    align-items: center;
+                                '>
+                                    {s_icon} <span style='margin-left:3px'>{s_text}</span>
+                                </div>
+                            </div>
+                            """
+    else:
+        yesterday_html = "<div style='height:8px'></div>"
+
+    # 信号区域 (不受禅模式影响，必须清晰)
+    signal_html = ""
+    if card['signal_type'] == "BUY":
+        signal_html = f"<div class='signal-buy'><div><div>🎯 {card['signal_desc']}</div><div style='font-size:15px; margin-top:4px'>👉 {card['action_advice']}</div></div></div>"
+    elif card['signal_type'] == "SELL":
+        signal_html = f"<div class='signal-sell'><div><div>🔥 {card['signal_desc']}</div><div style='font-size:15px; margin-top:4px'>👉 {card['action_advice']}</div></div></div>"
+
+    # 详情数据 (禅模式屏蔽逻辑)
+    color_code = "#ff3b30" if card['profit']>0 else "#34c759"
+    if zen_mode:
+        profit_display = "<span style='color:#aaa'>****</span>"
+        principal_display = "****"
+    else:
+        profit_display = f"￥{card['profit']:+.1f}"
+        principal_display = f"￥{card['principal']:,}"
     
-    return stats
+    # 有行情的持仓占净值的比例 (前十大之外的仓位不在其中)
+    coverage_text = f"行情覆盖 {card['coverage']:.0%}"
+    if card['proxy_label']: coverage_text += f" · 其余按{card['proxy_label']}"
+
+    detail_html = f"""
+                        <div class='detail-box'>
+                            <div style='font-size:12px; color:#888; margin-bottom:2px'>今日预估盈亏</div>
+                            <div style='font-size:20px; font-weight:600; color:{color_code}; font-family:-apple-system'>{profit_display}</div>
+                            <div style='height:15px'></div>
+                            <div style='font-size:12px; color:#888; margin-bottom:2px'>本金</div>
+                            <div style='font-size:16px; color:#333; font-weight:500'>{principal_display}</div>
+                            <div style='font-size:11px; color:#aaa; margin-top:8px'>{coverage_text}</div>
+                        </div>
+                        """
+    
+    # 2列网格布局，展示前10大持仓
+    list_html = "<div class='ios-list-container' style='display: grid; grid-template-columns: 1fr 1fr; gap: 0 12px;'>"
+    for i, s in enumerate(card['stocks']):
+        pct = s['pct']
+        if pct is None:
+            bg_color = "#8e8e93"
+            pct_label = "--"
+        else:
+            bg_color = "#ff3b30" if pct > 0 else ("#34c759" if pct < 0 else "#8e8e93")
+            pct_label = f"{pct:+.2f}%"
+        txt_color = "white"
+        # 简化行样式，适应网格
+        list_html += f"<div class='ios-row' style='border-bottom: 1px solid rgba(0,0,0,0.03); padding: 6px 0;'><div class='ios-index'>{i+1}</div><div class='ios-name' style='font-size:13px; white-space:nowrap; overflow:hidden; text-overflow:ellipsis;'>{s['name']}</div><div class='ios-pill' style='background-color:{bg_color}; color:{txt_color}; font-size:12px; padding:2px 6px; min-width:50px;'>{pct_label}</div></div>"
+    list_html += "</div>"
+
+    return (title, pill_html, yesterday_html, signal_html, detail_html, list_html)
+
+def draw_card(parts):
+    title, pill_html, yesterday_html, signal_html, detail_html, list_html = parts
+    with st.expander(title):
+        if pill_html:
+            st.markdown(pill_html, unsafe_allow_html=True)
+        st.markdown(yesterday_html, unsafe_allow_html=True)
+        if signal_html:
+            st.markdown(signal_html, unsafe_allow_html=True)
+        kc1, kc2 = st.columns([1.1, 2])
+        kc1.markdown(detail_html, unsafe_allow_html=True)
+        kc2.markdown(list_html, unsafe_allow_html=True)
 
 # === 🚀 主程序 ===
 def main():
     funds_config, config_sha = load_json('funds.json')
     if not funds_config: st.stop()
 
-    # 🔥 自动更新历史数据
-    nav_cache = update_history_cache(funds_config)
+    # 🔥 自动更新历史数据 (后台进行，首屏直接用已缓存的净值)
+    store = get_store()
+    nav_store = open_nav_store(store)
+    history_refresher = get_history_refresher()
+    history_refresher.start(funds_config, store)
+    if history_refresher.nav_store is not None: nav_store = history_refresher.nav_store
+    nav_version = history_refresher.version
 
     # ==========================================
     # 🌟 顶部导航栏
@@ -577,6 +703,8 @@ def main():
     
     bj_time = datetime.utcnow() + timedelta(hours=8)
     now_hour = bj_time.hour
+    # 信号只在交易日的盘中 (连续竞价时段) 给出
+    signal_window = trading_calendar.is_trading_time(bj_time)
     greeting = "Good Morning ☀️" if 5 <= now_hour < 12 else "Good Afternoon ☕" if 12 <= now_hour < 18 else "Good Evening 🌙"
 
     top_col1, top_col2 = st.columns([3, 1])
@@ -584,15 +712,8 @@ def main():
     with top_col1:
         st.caption(f"{greeting} | {bj_time.strftime('%m-%d %H:%M')}")
         
-        # 🟢 交易状态逻辑 (Added by User Request)
-        is_trading = False
-        if bj_time.weekday() < 5: # Mon-Fri
-            current_time = bj_time.time()
-            # 简单构造时间对象用于比较 (注意：这里用replace是为了确保只比较时间部分，或者直接构造datetime)
-            # 更简单的是比较 hour/minute
-            t_val = current_time.hour * 100 + current_time.minute
-            if (930 <= t_val <= 1130) or (1300 <= t_val <= 1500):
-                is_trading = True
+        # 🟢 交易状态逻辑 (Added by User Request)：按交易日历判断，节假日也显示休市
+        is_trading = trading_calendar.is_trading_time(bj_time)
         
         # 🌟 交易状态胶囊 (美化版 Glassmorphism)
         if is_trading:
@@ -619,12 +740,24 @@ def main():
 
     # 🔥 禅模式状态初始化 (默认关闭)
     zen_mode = False
+    fast_mode, fast_focus = False, []
+    estimator_mode = None
 
     with top_col2:
         with st.popover("⚙️ Settings", use_container_width=True):
             st.caption("Mode")
             # 🔥 禅模式开关
             zen_mode = st.toggle("🧘 禅模式 (隐藏金额)", value=False)
+            # ⚡ 极速模式 (行情剧烈波动时手动打开)：只盯选中的基金
+            fast_mode = st.toggle("⚡ 极速刷新 (4秒)", value=False, key="fast_mode")
+            fast_focus = []
+            if fast_mode:
+                by_principal = sorted(funds_config, key=lambda n: funds_config[n].get('holding_value', 0), reverse=True)
+                fast_focus = st.multiselect("极速关注", by_principal, default=by_principal[:3], key="fast_focus",
+                                            format_func=lambda n: n.split('(')[0].strip())
+            # 🧩 前十大以外 / 缺行情的仓位按基准 (或 funds.json 里的 proxy) 估算；关闭时按各基金配置
+            if st.toggle("🧩 残余仓位按基准估算", value=False, key="residual_mode"):
+                estimator_mode = "residual"
             st.markdown("<div style='height:10px'></div>", unsafe_allow_html=True)
 
             st.caption("Views")
@@ -670,50 +803,68 @@ def main():
                 st.divider()
                 if st.button("📸 Run Snapshot", type="primary", use_container_width=True):
                     with st.spinner("Processing..."):
-                        snapshot_data = {}
-                        all_codes = []
-                        for f in funds_config.values():
-                            for s in f['holdings']: all_codes.append(s['code'])
-                        prices = get_realtime_price(list(set(all_codes)))
+                        engine = valuation.get_engine(funds_config)
+                        stock_codes = [c for c in engine.symbols if not is_fund_code(c)]
+                        fof_codes = [c for c in engine.symbols if is_fund_code(c)]
+                        bench_codes = {name: get_benchmark_code(name)[0] for name in funds_config}
+                        prices = get_realtime_price(stock_codes + list(set(bench_codes.values())))
                         if prices:
                             today_str = bj_time.strftime("%Y-%m-%d")
-                            for name, info in funds_config.items():
-                                val = 0; w = 0
-                                for s in info['holdings']:
-                                    if s['code'] in prices:
-                                        val += prices[s['code']]['change'] * s['weight']; w += s['weight']
-                                snapshot_data[name] = val / w if w > 0 else 0
-                            history, hist_sha = load_json('history.json')
+                            quotes = {**prices, **get_fund_estimated_nav(fof_codes)}
+                            # 存证保存未乘 factor 的原始估值，供晚间审计校准
+                            snapshot_data = {name: v['raw'] for name, v in engine.evaluate(quotes).items()}
+                            # 同时记下各基金对应基准的涨跌幅，供校准时拟合 beta
+                            snapshot_data[calibration.BENCH_KEY] = {
+                                name: prices[code]['change'] for name, code in bench_codes.items() if code in prices
+                            }
+                            history, history_sha = load_json('history.json')
                             history[today_str] = snapshot_data
-                            save_json('history.json', history, hist_sha, f"Snapshot {today_str}")
-                            st.success(f"Snapshot Saved: {today_str}")
+                            if save_json_files({'history.json': history}, f"Snapshot {today_str}", {'history.json': history_sha}):
+                                st.success(f"Snapshot Saved: {today_str}")
 
             elif current_selection == "⚖️  晚间审计":
                 st.divider()
                 if st.button("🚀 Start Audit", type="primary", use_container_width=True):
                     history, _ = load_json('history.json')
-                    factor_hist, _ = load_json('factor_history.json')
+                    factor_hist, factor_sha = load_json('factor_history.json')
                     if history:
-                        last_date = sorted(history.keys())[-1]
+                        last_date = max(history)
+                        # 官方涨跌幅优先查净值存储；最后一天夜间任务可能还没入库，现场补抓
+                        live_official = {}
+                        for name in funds_config:
+                            code = FUND_CODES_MAP.get(name)
+                            if code and nav_store.get(name, last_date) is None:
+                                off_pct, off_date = get_official_nav_pct(code)
+                                if off_date and off_date >= last_date: live_official[name] = off_pct
+                        def official(name, date):
+                            pct = nav_store.get(name, date)
+                            if pct is None and date == last_date: pct = live_official.get(name)
+                            return pct
+
+                        # 📐 所有存证日期一起做 walk-forward 最小二乘，以审计日之前生效的因子为起点 (重复审计结果不变)
+                        bases = calibration.base_factors(funds_config, factor_hist, last_date)
+                        results = calibration.calibrate(history, official, {n: {'factor': f} for n, f in bases.items()})
+                        # 样本外没跑赢起点因子就不动；跑赢了也只靠拢一半并截断到合理范围
+                        current_success = calibration.audit_factors(results, bases, funds_config)
                         audited = factor_hist.get(last_date, {}) if factor_hist else {}
-                        updates = []; need_save = False; current_success = {}
-                        progress = st.progress(0)
-                        for idx, (name, info) in enumerate(funds_config.items()):
-                            if name in audited: progress.progress((idx+1)/len(funds_config)); continue
+                        for name, info in funds_config.items():
+                            if name in current_success or (results.get(name) or {}).get('factor') is not None: continue
+                            # 观测不足：退回单日平滑 (同一天只做一次)
                             raw = history[last_date].get(name)
-                            code = FUND_CODES_MAP.get(name)
-                            if raw is not None and code:
-                                off_pct, off_date = get_official_nav(code)
-                                if off_date and off_date >= last_date and raw != 0:
-                                    new_f = (info['factor'] * 0.8) + ((off_pct / raw) * 0.2)
-                                    funds_config[name]['factor'] = round(new_f, 4)
-                                    current_success[name] = round(new_f, 4)
-                                    need_save = True
-                            progress.progress((idx+1)/len(funds_config))
-                        if need_save:
-                            save_json('funds.json', funds_config, config_sha, "Audit")
-                            save_factor_history(last_date, current_success)
-                            st.success("Factors Optimized!"); time.sleep(1); st.rerun()
+                            off_pct = official(name, last_date)
+                            if name in audited or raw is None or off_pct is None or raw == 0: continue
+                            new_f = calibration.clip_factor((info['factor'] * 0.8) + ((off_pct / raw) * 0.2))
+                            if new_f != info.get('factor'): current_success[name] = new_f
+                        for name, new_f in current_success.items(): funds_config[name]['factor'] = new_f
+                        if results:
+                            st.dataframe(pd.DataFrame.from_dict(results, orient='index')[['factor', 'n', 'oos_n', 'oos_mae', 'baseline_mae']],
+                                         use_container_width=True)
+                        if current_success:
+                            # funds.json 与 factor_history.json 同一个 commit 写入，不会出现只写了一半的状态
+                            factor_hist = merge_factor_history(factor_hist, last_date, current_success)
+                            if save_json_files({'funds.json': funds_config, 'factor_history.json': factor_hist}, f"Audit {last_date}",
+                                               {'funds.json': config_sha, 'factor_history.json': factor_sha}):
+                                st.success("Factors Optimized!"); time.sleep(1); st.rerun()
                         else: st.info("No updates needed today")
 
             elif current_selection == "🔄  季报更新":
@@ -746,429 +897,274 @@ def main():
     # 👇 主展示区 (全域火控版 + 禅模式)
     # ==========================================
     if "持仓管理" not in str(mode) and "持仓管理" not in str(action_mode):
-        placeholder = st.empty()
-        
-        all_codes = list(MARKET_INDICES.keys())
-        for f in funds_config.values():
-            for s in f['holdings']: all_codes.append(s['code'])
-        all_codes = list(set(all_codes))
+        # 持仓 + 残余仓位的代理指数 + 信号用的基准指数
+        all_codes = set(MARKET_INDICES) | set(signal_rules.benchmark_codes())
+        fof_codes = set()
+        for code in valuation.get_engine(funds_config, estimator_mode).symbols:
+            (fof_codes if is_fund_code(code) else all_codes).add(code)
+        all_codes = list(all_codes)
+        fof_codes = list(fof_codes)
+
+        # 按持仓金额从高到低排序（无持仓的自动沉底）；会话内本金不变，顺序只算一次
+        card_order = sorted(funds_config.keys(), key=lambda n: funds_config[n].get('holding_value', 0), reverse=True)
+
+        # 🧱 页面骨架只搭一次，之后每轮只往有变化的槽位里重绘
+        status_slot = st.empty()
+        st.markdown("<br>", unsafe_allow_html=True)
+        # 布局：2x2网格 - 增加间距
+        row1_col1, row1_col2 = st.columns(2, gap="medium")
+        kpi_slots = {"est_profit": row1_col1.empty(), "act_profit": row1_col2.empty()}
+        st.markdown("<div style='height: 12px'></div>", unsafe_allow_html=True)
+        row2_col1, row2_col2 = st.columns(2, gap="medium")
+        kpi_slots["est_yield"] = row2_col1.empty()
+        kpi_slots["act_yield"] = row2_col2.empty()
+        st.markdown("<div style='margin-bottom: 12px;'></div>", unsafe_allow_html=True)
+        portfolio_header_slot = st.empty()
+        card_slots = {name: st.empty() for name in card_order}
+        st.divider()
+        st.markdown("<span style='color:#999; font-size:12px; letter-spacing:1px; margin-left:2px; font-weight:500'>MARKET INDICES</span>", unsafe_allow_html=True)
+        index_slots = [c.empty() for c in st.columns(3)]
+
+        # 极速模式只额外刷新关注基金的持仓 + 基准
+        fast_codes = set()
+        for name in fast_focus:
+            fast_codes.update(s['code'] for s in funds_config[name]['holdings'])
+            fast_codes.add(get_benchmark_code(name)[0])
+
+        rendered = {}
+        last_signal_msg = None
+        quote_cache = get_quote_cache()
+        tick_recorder = get_tick_recorder()
+        if "quote_session" not in st.session_state:
+            st.session_state["quote_session"] = uuid.uuid4().hex
+
+        live = None          # 本会话的增量估值状态
+        quote_version = 0    # 上一轮读到的快照版本
+        cards_data = {}
         
         while True:
-            with placeholder.container():
-                market_data = get_realtime_price(all_codes)
-                if not market_data:
-                    st.warning("Connecting..."); time.sleep(2); continue
-                
-                total_profit = 0
-                total_principal = 0
-                cards_data = []
-                signal_msg = None
+            # 📜 后台历史净值刷新完成后换上新数据 (卡片签名变化会自动重绘)
+            nav_changed = history_refresher.version != nav_version
+            if nav_changed:
+                nav_store, nav_version = history_refresher.nav_store, history_refresher.version
+                for short_name, count_new in history_refresher.updated:
+                    st.toast(f"已更新: {short_name} ({count_new}条)")
+
+            # 📡 读进程级共享快照 (股票行情 + 所有 FOF 子基金估值)，不直接请求上游；只拿上一轮之后变化的代码
+            quote_cache.subscribe(st.session_state["quote_session"], all_codes, fof_codes, fast_codes)
+            snapshot = quote_cache.snapshot_delta(quote_version)
+            if not snapshot:
+                status_slot.warning("Connecting..."); time.sleep(2); continue
+            status_slot.empty()
+            market_data, sub_fund_data, changed, quote_version = snapshot
+            
+            # 🧮 只重算持仓价格有变化的基金 (反向索引)，其余沿用上一轮结果
+            engine = valuation.get_engine(funds_config, estimator_mode)
+            if live is None or live.engine is not engine:
+                live, changed = valuation.LiveValuation(engine), None
+            dirty = set(live.update({**market_data, **sub_fund_data}, changed))
+            # 🎞️ 录下这一轮的估值和行情 (后台写盘，同一行情版本只记一次)
+            tick_recorder.record(quote_version, engine, live.est, live.values, live.present)
+            if changed is None or nav_changed:
+                dirty = set(funds_config)
+            else:
+                # 基准指数变了，相关基金的信号也要重算
+                dirty.update(n for n in funds_config if get_benchmark_code(n)[0] in changed)
+
+            for name, info in funds_config.items():
+                if name not in dirty: continue
+                principal = info.get('holding_value', 0)
+                base_unit = info.get('base_unit', 1000) 
                 
-                for name, info in funds_config.items():
-                    factor = info.get('factor', 1.0)
-                    principal = info.get('holding_value', 0)
-                    base_unit = info.get('base_unit', 1000) 
-                    
-                    val = 0; w = 0; stocks = []
-                    
-                    # 判断持仓类型：股票 or 公募基金
-                    fund_sub_codes = [s['code'] for s in info['holdings'] if is_fund_code(s['code'])]
-                    
-                    if fund_sub_codes:
-                        # 🏦 FOF模式：子持仓为公募基金，使用天天基金估值接口
-                        sub_fund_data = get_fund_estimated_nav(fund_sub_codes)
-                        for s in info['holdings']:
-                            d = sub_fund_data.get(s['code'])
-                            if d:
-                                val += d['change'] * s['weight']; w += s['weight']
-                                if len(stocks) < 10:
-                                    stocks.append({"name": shorten_fund_name(d['name']), "pct": d['change']})
-                            else:
-                                # 降级：API 无数据（如持有港股的基金），用配置名字占位，pct=0
-                                if len(stocks) < 10:
-                                    fallback_name = shorten_fund_name(s.get('name', s['code']))
-                                    stocks.append({"name": fallback_name, "pct": None})
-                    else:
-                        # 📈 普通模式：子持仓为股票，使用腾讯行情
-                        for s in info['holdings']:
-                            d = market_data.get(s['code'])
-                            if d:
-                                val += d['change'] * s['weight']; w += s['weight']
-                                if len(stocks) < 10: 
-                                    stocks.append({"name": d['name'], "pct": d['change']})
-                    
-                    est = (val / w * factor) if w > 0 else 0
-                    profit = principal * est / 100
-                    total_profit += profit
-                    total_principal += principal
-                    
-                    # 📈 历史统计 & 实际收益计算
-                    h_stats = get_dashboard_stats(name, nav_cache)
-                    yes_profit = principal * h_stats['yesterday'] / 100
-                    
-                    # 信号逻辑
-                    bench_code, bench_name = get_benchmark_code(name)
-                    bench_val = 0
-                    if bench_code in market_data: bench_val = market_data[bench_code]['change']
-                    
-                    signal_type = None 
-                    signal_desc = ""
-                    action_advice = ""
-                    
-                    # 1. 🎯 买入
-                    if 9 <= now_hour < 15 and est < -2.5 and est < bench_val:
-                        signal_type = "BUY"
-                        multiplier = 2 if est < -4.0 else 1
-                        buy_amt = base_unit * multiplier
-                        signal_desc = f"超跌错杀：跑输{bench_name} {abs(est-bench_val):.1f}%"
-                        action_advice = f"建议加仓: +¥{buy_amt:,}"
-                        if not signal_msg: signal_msg = "🎯 出现加仓机会"
-
-                    # 2. 🔥 止盈
-                    elif 9 <= now_hour < 15 and est > 3.0 and est > (bench_val + 1.5):
-                        signal_type = "SELL"
-                        signal_desc = f"短期过热：跑赢{bench_name} {abs(est-bench_val):.1f}%"
-                        action_advice = "建议卖出: 1/4 持仓"
-                        if not signal_msg: signal_msg = "🔥 出现止盈机会"
-
-                    cards_data.append({
-                        "name": name.split('(')[0].strip(),
-                        "full_name": name, # 保留全名用于匹配胶囊
-                        "est": est,
-                        "profit": profit,
-                        "principal": principal,
-                        "stocks": stocks,
-                        "signal_type": signal_type,
-                        "signal_desc": signal_desc,
-                        "action_advice": action_advice,
-                        "h_stats": h_stats,
-                        "yes_profit": yes_profit
-                    })
+                stocks = []
                 
-                # 按持仓金额从高到低排序（无持仓的自动沉底）
-                cards_data.sort(key=lambda x: x['principal'], reverse=True)
+                # 判断持仓类型：股票 or 公募基金 (仅用于展示持仓明细)
+                if any(is_fund_code(s['code']) for s in info['holdings']):
+                    # 🏦 FOF模式：子持仓为公募基金，使用天天基金估值接口 (本轮已统一抓取)
+                    for s in info['holdings']:
+                        if len(stocks) >= 10: break
+                        d = sub_fund_data.get(s['code'])
+                        if d:
+                            stocks.append({"name": shorten_fund_name(d['name']), "pct": d['change']})
+                        else:
+                            # 降级：API 无数据（如持有港股的基金），用配置名字占位
+                            fallback_name = shorten_fund_name(s.get('name', s['code']))
+                            stocks.append({"name": fallback_name, "pct": None})
+                else:
+                    # 📈 普通模式：子持仓为股票，使用腾讯行情
+                    for s in info['holdings']:
+                        d = market_data.get(s['code'])
+                        if d and len(stocks) < 10:
+                            stocks.append({"name": d['name'], "pct": d['change']})
                 
-                # Toast
-                if signal_msg: st.toast(signal_msg)
-
-                # 1. 💰 核心收益看板 (改版：预估 vs 实际)
-                st.markdown("<br>", unsafe_allow_html=True)
+                result = live.result(name)
+                est = result['est']
+                profit = result['profit']
                 
-                # 计算今日实际收益 (基于 nav_cache)
-                today_str = bj_time.strftime("%Y-%m-%d")
-                total_actual_profit = 0
-                actual_data_ready = True # 假设数据已准备好，除非发现缺失
+                # 📈 历史统计 & 实际收益计算
+                h_stats = get_dashboard_stats(name, nav_store)
+                yes_profit = principal * h_stats['yesterday'] / 100
                 
-                for name, info in funds_config.items():
-                    # 检查缓存里是否有今天的日期
-                    key_name = name
-                    if key_name not in nav_cache or today_str not in nav_cache[key_name]:
-                        actual_data_ready = False
-                        break
-                    else:
-                        pct = nav_cache[key_name][today_str]
-                        total_actual_profit += info.get('holding_value', 0) * pct / 100
-
-                # 布局：2x2网格 - 给每个指标更多水平空间
-                # 布局：2x2网格 - 增加间距
-                # 第一行：预估收益 | 实际收益
-                row1_col1, row1_col2 = st.columns(2, gap="medium")
+                # 信号逻辑
+                bench_code, bench_name = get_benchmark_code(name)
+                # 残余仓位按代理指数估算时，卡片上注明用的是哪个指数
+                proxy_label = None
+                if engine.residual[engine.fund_index[name]]:
+                    proxy_code = engine.proxy_codes[engine.fund_index[name]]
+                    proxy_label = bench_name if proxy_code == bench_code else proxy_code
+                bench_val = 0
+                if bench_code in market_data: bench_val = market_data[bench_code]['change']
                 
-                # A. 今日预估收益 - 自定义HTML
-                if zen_mode:
-                    display_value_1 = "****"
-                else:
-                    # 使用完整数字格式
-                    if abs(total_profit) >= 1000:
-                        display_value_1 = f"{total_profit:+,.0f}"
-                    else:
-                        display_value_1 = f"{total_profit:+.0f}"
+                signal_type = None 
+                signal_desc = ""
+                action_advice = ""
                 
-                # 优先使用行情数据中的日期
-                est_date_str = bj_time.strftime('%Y年%m月%d日')
-                if market_data:
-                    # 尝试从第一个有效数据中获取日期
-                    for code, d in market_data.items():
-                        if d.get('date'):
-                            try:
-                                ymd = d['date'].split('-')
-                                est_date_str = f"{ymd[0]}年{int(ymd[1])}月{int(ymd[2])}日"
-                                break
-                            except: pass
-
-                row1_col1.markdown(f"""
-                <div style='background: rgba(255, 255, 255, 0.65); backdrop-filter: blur(16px); 
-                            border: 1px solid rgba(255, 255, 255, 0.6); padding: 15px 10px; 
-                            border-radius: 20px; box-shadow: 0 8px 32px rgba(31, 38, 135, 0.05); 
-                            min-height: 115px; display: flex; flex-direction: column; justify-content: center;'>
-                    <div style='font-size: 12px; color: rgb(49, 51, 63); margin-bottom: 4px;'>
-                        今日预估收益 <span style='font-size:11px; color:#999; margin-left:4px; font-weight:400'>{est_date_str}</span>
-                    </div>
-                    <div style='font-size: 16px; font-weight: 600; color: rgb(49, 51, 63); overflow: visible !important; text-overflow: clip !important; white-space: nowrap !important;'>{display_value_1}</div>
-                </div>
-                """, unsafe_allow_html=True)
+                signal = signal_rules.evaluate(est, bench_val, base_unit, signal_rules.rules_for(info)) if signal_window else None
+                # 1. 🎯 买入
+                if signal and signal['type'] == "BUY":
+                    signal_type = "BUY"
+                    signal_desc = f"超跌错杀：跑输{bench_name} {signal['gap']:.1f}%"
+                    action_advice = f"建议加仓: +¥{signal['amount']:,}"
 
-                # B. 今日实际收益 - 自定义HTML
-                if zen_mode:
-                    display_value_2 = "****"
-                    delta_display = ""
-                else:
-                    if actual_data_ready:
-                        # 使用完整数字格式
-                        if abs(total_actual_profit) >= 1000:
-                            display_value_2 = f"{total_actual_profit:+,.0f}"
-                        else:
-                            display_value_2 = f"{total_actual_profit:+.0f}"
-                        delta_val = total_actual_profit - total_profit
-                        delta_color = "#00ab41" if delta_val >= 0 else "#ff2b2b"
-                        delta_display = f"<div style='font-size: 11px; color: {delta_color}; margin-top: 4px;'>{delta_val:+.0f} 差额</div>"
-                    else:
-                        display_value_2 = "💎"
-                        delta_display = ""
-                
-                row1_col2.markdown(f"""
-                <div style='background: rgba(255, 255, 255, 0.65); backdrop-filter: blur(16px); 
-                            border: 1px solid rgba(255, 255, 255, 0.6); padding: 15px 10px; 
-                            border-radius: 20px; box-shadow: 0 8px 32px rgba(31, 38, 135, 0.05); 
-                            min-height: 115px; display: flex; flex-direction: column; justify-content: center;'>
-                    <div style='font-size: 12px; color: rgb(49, 51, 63); margin-bottom: 4px;'>今日实际收益</div>
-                    <div style='font-size: 16px; font-weight: 600; color: rgb(49, 51, 63); overflow: visible !important; text-overflow: clip !important; white-space: nowrap !important;'>{display_value_2}</div>
-                    {delta_display}
-                </div>
-                """, unsafe_allow_html=True)
+                # 2. 🔥 止盈
+                elif signal and signal['type'] == "SELL":
+                    signal_type = "SELL"
+                    signal_desc = f"短期过热：跑赢{bench_name} {signal['gap']:.1f}%"
+                    action_advice = f"建议卖出: {signal_rules.fraction_label(signal['fraction'])} 持仓"
 
-                # 增加行间距
-                st.markdown("<div style='height: 12px'></div>", unsafe_allow_html=True)
+                cards_data[name] = {
+                    "name": name.split('(')[0].strip(),
+                    "full_name": name, # 保留全名用于匹配胶囊
+                    "est": est,
+                    "coverage": result['coverage'],
+                    "proxy_label": proxy_label,
+                    "profit": profit,
+                    "principal": principal,
+                    "stocks": stocks,
+                    "signal_type": signal_type,
+                    "signal_desc": signal_desc,
+                    "action_advice": action_advice,
+                    "h_stats": h_stats,
+                    "yes_profit": yes_profit
+                }
 
-                # 第二行：预估收益率 | 实际收益率
-                row2_col1, row2_col2 = st.columns(2, gap="medium")
-                
-                # C. 预估收益率 - 自定义HTML
-                est_yield_rate = (total_profit/total_principal*100) if total_principal > 0 else 0
-                row2_col1.markdown(f"""
-                <div style='background: rgba(255, 255, 255, 0.65); backdrop-filter: blur(16px); 
-                            border: 1px solid rgba(255, 255, 255, 0.6); padding: 15px 10px; 
-                            border-radius: 20px; box-shadow: 0 8px 32px rgba(31, 38, 135, 0.05); 
-                            min-height: 115px; display: flex; flex-direction: column; justify-content: center;'>
-                    <div style='font-size: 12px; color: rgb(49, 51, 63); margin-bottom: 4px;'>预估收益率</div>
-                    <div style='font-size: 16px; font-weight: 600; color: rgb(49, 51, 63); overflow: visible !important; text-overflow: clip !important; white-space: nowrap !important;'>{est_yield_rate:+.2f}%</div>
-                </div>
-                """, unsafe_allow_html=True)
+            total_profit = sum(card['profit'] for card in cards_data.values())
+            total_principal = sum(card['principal'] for card in cards_data.values())
+            # 按基金顺序取第一个信号作为提示
+            signal_msg = None
+            for card in cards_data.values():
+                if card['signal_type'] == "BUY": signal_msg = "🎯 出现加仓机会"; break
+                if card['signal_type'] == "SELL": signal_msg = "🔥 出现止盈机会"; break
+            
+            # Toast (信号变化时才提示，避免每轮重复弹出)
+            if signal_msg and signal_msg != last_signal_msg: st.toast(signal_msg)
+            last_signal_msg = signal_msg
 
-                # D. 实际收益率 - 自定义HTML
-                if actual_data_ready:
-                    act_yield_rate = (total_actual_profit/total_principal*100) if total_principal > 0 else 0
-                    display_value_4 = f"{act_yield_rate:+.2f}%"
+            # 1. 💰 核心收益看板 (预估 vs 实际)
+            # 计算今日实际收益 (基于 nav_store)
+            today_str = bj_time.strftime("%Y-%m-%d")
+            audit_memo = get_audit_memo(funds_config, nav_version, nav_store)
+            total_actual_profit = 0
+            actual_data_ready = True # 假设数据已准备好，除非发现缺失
+            
+            for name, info in funds_config.items():
+                # 检查缓存里是否有今天的日期
+                pct = nav_store.get(name, today_str)
+                if pct is None:
+                    actual_data_ready = False
+                    break
+                total_actual_profit += info.get('holding_value', 0) * pct / 100
+
+            # A. 今日预估收益
+            if zen_mode:
+                display_value_1 = "****"
+            else:
+                # 使用完整数字格式
+                if abs(total_profit) >= 1000:
+                    display_value_1 = f"{total_profit:+,.0f}"
                 else:
-                    display_value_4 = "💎"
-                
-                row2_col2.markdown(f"""
-                <div style='background: rgba(255, 255, 255, 0.65); backdrop-filter: blur(16px); 
-                            border: 1px solid rgba(255, 255, 255, 0.6); padding: 15px 10px; 
-                            border-radius: 20px; box-shadow: 0 8px 32px rgba(31, 38, 135, 0.05); 
-                            min-height: 115px; display: flex; flex-direction: column; justify-content: center;'>
-                    <div style='font-size: 12px; color: rgb(49, 51, 63); margin-bottom: 4px;'>实际收益率</div>
-                    <div style='font-size: 16px; font-weight: 600; color: rgb(49, 51, 63); overflow: visible !important; text-overflow: clip !important; white-space: nowrap !important;'>{display_value_4}</div>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                # 2. 💎 持仓列表
-                st.markdown("<div style='margin-bottom: 12px;'></div>", unsafe_allow_html=True)
-                
-                # 获取最新日期用于标题显示
-                latest_date_str = ""
-                if cards_data:
-                    # 尝试从第一个数据的 h_stats 中获取日期
+                    display_value_1 = f"{total_profit:+.0f}"
+            
+            # 优先使用行情数据中的日期
+            est_date_str = bj_time.strftime('%Y年%m月%d日')
+            for code, d in market_data.items():
+                if d.get('date'):
                     try:
-                        raw_date = cards_data[0]['h_stats']['last_date']
-                        if raw_date and raw_date != "-":
-                            # 格式化: 2026-02-06 -> 2026年2月6日收益情况
-                            ymd = raw_date.split('-')
-                            if len(ymd) == 3:
-                                latest_date_str = f" <span style='font-size:11px; font-weight:400; color:#999; margin-left:6px'>{ymd[0]}年{int(ymd[1])}月{int(ymd[2])}日收益情况</span>"
+                        ymd = d['date'].split('-')
+                        est_date_str = f"{ymd[0]}年{int(ymd[1])}月{int(ymd[2])}日"
+                        break
                     except: pass
 
-                st.markdown(f"<span style='color:#999; font-size:12px; letter-spacing:1px; margin-left:2px; font-weight:500'>PORTFOLIO</span>{latest_date_str}", unsafe_allow_html=True)
-                
-                # 定义简称映射
-                FUND_ALIASES = {
-                    "财通周期优选混合C (025547)": "财通周期",
-                    "财通科技创新混合C (008984)": "财通科技",
-                    "路博迈中国动力股票C (020237)": "路博迈",
-                    "摩根均衡精选混合A (021273)": "摩根均衡",
-                    "华安品质甄选混合A (013680)": "华安品质"
-                }
+            # B. 今日实际收益
+            if zen_mode:
+                display_value_2 = "****"
+                delta_display = ""
+            else:
+                if actual_data_ready:
+                    # 使用完整数字格式
+                    if abs(total_actual_profit) >= 1000:
+                        display_value_2 = f"{total_actual_profit:+,.0f}"
+                    else:
+                        display_value_2 = f"{total_actual_profit:+.0f}"
+                    delta_val = total_actual_profit - total_profit
+                    delta_color = "#00ab41" if delta_val >= 0 else "#ff2b2b"
+                    delta_display = f"<div style='font-size: 11px; color: {delta_color}; margin-top: 4px;'>{delta_val:+.0f} 差额</div>"
+                else:
+                    display_value_2 = "💎"
+                    delta_display = ""
 
-                for card in cards_data:
-                    icon = "👑" if card['est'] > 0 else "📿"
-                    
-                    title_suffix = f" {card['est']:+.2f}%"
-                    if card['signal_type'] == "BUY": title_suffix += " 🎯 机会"
-                    elif card['signal_type'] == "SELL": title_suffix += " 🔥 止盈"
-                    
-                    # ----------------------------------------------------
-                    # 📊 昨日盈亏数据 (已移回卡片内部显示)
-                    # ----------------------------------------------------
-                    
-                    # 使用简称
-                    display_name = FUND_ALIASES.get(card['name'], card['name'])
-                    
-                    title = f"{icon} {display_name}{title_suffix}"
-                    
-                    with st.expander(title):
-                        # ----------------------------------------------------
-                        # 🔥 插入审计胶囊 (AUDIT PILL) - 动态版
-                        # ----------------------------------------------------
-                        pill_html = ""
-                        audit_data = None
-                        
-                        # 1. 尝试获取今日实际净值进行动态对比
-                        key_name = card['full_name'] # name is short, full_name is key
-                        if key_name in nav_cache and today_str in nav_cache[key_name]:
-                            actual_pct = nav_cache[key_name][today_str]
-                            audit_data = get_audit_status(card['est'], actual_pct)
-                        
-                        # 2. 如果没有今日数据，尝试使用静态配置 (作为兜底)
-                        if not audit_data:
-                            for k, v in AUDIT_MEMO.items():
-                                if k in card['full_name']:
-                                    audit_data = v
-                                    break
-                        
-                        # 3. 渲染
-                        if audit_data:
-                            # 确保兼容新旧字段
-                            bg_color = audit_data.get('color', '#f8f9fa')
-                            text_color = audit_data.get('text_color', '#333')
-                            tag = audit_data.get('tag', 'Note')
-                            text = audit_data.get('text', '')
-                            
-                            html_parts = [
-                                f"<div class='audit-pill' style='background-color:{bg_color}; color:{text_color};'>",
-                                f"<strong>{tag}</strong> | {text}",
-                                "</div>"
-                            ]
-                            pill_html = "".join(html_parts)
-                        
-                        if pill_html:
-                            st.markdown(pill_html, unsafe_allow_html=True)
-                        
-                        # ----------------------------------------------------
-                        # 📊 昨日盈亏数据 (回归卡片内部)
-                        # ----------------------------------------------------
-                        h_stats = card['h_stats']
-                        if h_stats['last_date'] != "-":
-                            yes_profit = card['yes_profit']
-                            abs_profit = abs(yes_profit)
-                            y_sign_pct = "+" if h_stats['yesterday'] > 0 else ""
-                            y_sign_money = "+" if yes_profit > 0 else "-"
-                            
-                            # 颜色逻辑保持一致：涨红跌绿
-                            color_style = "color:#ff3b30" if h_stats['yesterday'] > 0 else "color:#34c759"
-                            
-                            s_icon = "🔥" if h_stats['streak_type'] == "up" else "🥶" if h_stats['streak_type'] == "down" else "😐"
-                            s_text = f"{h_stats['streak']}连涨" if h_stats['streak_type'] == "up" else f"{h_stats['streak']}连跌" if h_stats['streak_type'] == "down" else "平盘"
-                            
-                            # 格式化日期：2026-02-06 -> 2026年2月6日
-                            date_display = ""
-                            try:
-                                full_date = h_stats.get('full_last_date', '')
-                                if full_date:
-                                    ymd = full_date.split('-')
-                                    date_display = f"{ymd[0]}年{int(ymd[1])}月{int(ymd[2])}日"
-                            except: pass
-
-                            st.markdown(f"""
-                            <div style='
-                                background-color: rgba(248, 249, 250, 0.7); 
-                                border: 1px solid rgba(0,0,0,0.05); 
-                                border-radius: 10px; 
-                                padding: 10px 14px; 
-                                display: flex; 
-                                align-items: center; 
-                                justify-content: space-between; 
-                                margin-bottom: 15px;
-                                margin-top: 4px;
-                                font-family: -apple-system;
-                            '>
-                                <div style='display:flex; align-items:center;'>
-                                    <span style='color:#8e8e93; font-size:12px; font-weight:500; letter-spacing:0.3px'>{date_display}</span>
-                                    <div style='width:1px; height:12px; background:#ddd; margin:0 8px;'></div>
-                                    <span style='{color_style}; font-size:14px; font-weight:600; font-variant-numeric: tabular-nums;'>{y_sign_pct}{h_stats['yesterday']:.2f}%</span>
-                                    <span style='{color_style}; font-size:14px; font-weight:600; margin-left:6px; font-variant-numeric: tabular-nums;'>{y_sign_money}¥{abs_profit:,.0f}</span>
-                                </div>
-                                <div style='
-                                    background: rgba(0,0,0,0.04); 
-                                    padding: 3px 8px; 
-                                    border-radius: 6px; 
-                                    font-size: 11px; 
-                                    font-weight: 600; 
-                                    color: #555;
-                                    display: flex;
-                                    align-items: center;
-                                '>
-                                    {s_icon} <span style='margin-left:3px'>{s_text}</span>
-                                </div>
-                            </div>
-                            """, unsafe_allow_html=True)
-                        else:
-                            st.markdown("<div style='height:8px'></div>", unsafe_allow_html=True)
-                        # ----------------------------------------------------
-
-                        # 信号区域 (不受禅模式影响，必须清晰)
-                        if card['signal_type'] == "BUY":
-                            st.markdown(f"<div class='signal-buy'><div><div>🎯 {card['signal_desc']}</div><div style='font-size:15px; margin-top:4px'>👉 {card['action_advice']}</div></div></div>", unsafe_allow_html=True)
-                        elif card['signal_type'] == "SELL":
-                            st.markdown(f"<div class='signal-sell'><div><div>🔥 {card['signal_desc']}</div><div style='font-size:15px; margin-top:4px'>👉 {card['action_advice']}</div></div></div>", unsafe_allow_html=True)
-
-                        # 详情数据 (禅模式屏蔽逻辑)
-                        kc1, kc2 = st.columns([1.1, 2])
-                        color_code = "#ff3b30" if card['profit']>0 else "#34c759"
-                        
-                        if zen_mode:
-                            profit_display = "<span style='color:#aaa'>****</span>"
-                            principal_display = "****"
-                        else:
-                            profit_display = f"￥{card['profit']:+.1f}"
-                            principal_display = f"￥{card['principal']:,}"
-                        
-                        kc1.markdown(f"""
-                        <div class='detail-box'>
-                            <div style='font-size:12px; color:#888; margin-bottom:2px'>今日预估盈亏</div>
-                            <div style='font-size:20px; font-weight:600; color:{color_code}; font-family:-apple-system'>{profit_display}</div>
-                            <div style='height:15px'></div>
-                            <div style='font-size:12px; color:#888; margin-bottom:2px'>本金</div>
-                            <div style='font-size:16px; color:#333; font-weight:500'>{principal_display}</div>
-                        </div>
-                        """, unsafe_allow_html=True)
-                        
-                        # 改为2列网格布局，展示前10大持仓
-                        list_html = "<div class='ios-list-container' style='display: grid; grid-template-columns: 1fr 1fr; gap: 0 12px;'>"
-                        for i, s in enumerate(card['stocks']):
-                            pct = s['pct']
-                            if pct is None:
-                                bg_color = "#8e8e93"
-                                pct_label = "--"
-                            else:
-                                bg_color = "#ff3b30" if pct > 0 else ("#34c759" if pct < 0 else "#8e8e93")
-                                pct_label = f"{pct:+.2f}%"
-                            txt_color = "white"
-                            # 简化行样式，适应网格
-                            list_html += f"<div class='ios-row' style='border-bottom: 1px solid rgba(0,0,0,0.03); padding: 6px 0;'><div class='ios-index'>{i+1}</div><div class='ios-name' style='font-size:13px; white-space:nowrap; overflow:hidden; text-overflow:ellipsis;'>{s['name']}</div><div class='ios-pill' style='background-color:{bg_color}; color:{txt_color}; font-size:12px; padding:2px 6px; min-width:50px;'>{pct_label}</div></div>"
-                        list_html += "</div>"
-                        
-                        kc2.markdown(list_html, unsafe_allow_html=True)
+            # C. 预估收益率
+            est_yield_rate = (total_profit/total_principal*100) if total_principal > 0 else 0
 
-                # 3. 🌍 底部大盘
-                st.divider()
-                st.markdown("<span style='color:#999; font-size:12px; letter-spacing:1px; margin-left:2px; font-weight:500'>MARKET INDICES</span>", unsafe_allow_html=True)
-                mc1, mc2, mc3 = st.columns(3)
-                m_cols = [mc1, mc2, mc3]
-                for i, code in enumerate(MARKET_INDICES):
-                    d = market_data.get(code)
-                    if d: m_cols[i].metric(MARKET_INDICES[code], f"{d['change']:.2f}%")
-
-            time.sleep(30)
+            # D. 实际收益率
+            if actual_data_ready:
+                act_yield_rate = (total_actual_profit/total_principal*100) if total_principal > 0 else 0
+                display_value_4 = f"{act_yield_rate:+.2f}%"
+            else:
+                display_value_4 = "💎"
+
+            kpi_tiles = {
+                "est_profit": kpi_tile_html(f"今日预估收益 <span style='font-size:11px; color:#999; margin-left:4px; font-weight:400'>{est_date_str}</span>", display_value_1),
+                "act_profit": kpi_tile_html("今日实际收益", display_value_2, delta_display),
+                "est_yield": kpi_tile_html("预估收益率", f"{est_yield_rate:+.2f}%"),
+                "act_yield": kpi_tile_html("实际收益率", display_value_4),
+            }
+            for key, html in kpi_tiles.items():
+                render_if_changed(rendered, f"kpi:{key}", kpi_slots[key], html,
+                                  lambda html=html: st.markdown(html, unsafe_allow_html=True))
+            
+            # 2. 💎 持仓列表
+            # 获取最新日期用于标题显示
+            latest_date_str = ""
+            if card_order:
+                # 尝试从第一个数据的 h_stats 中获取日期
+                try:
+                    raw_date = cards_data[card_order[0]]['h_stats']['last_date']
+                    if raw_date and raw_date != "-":
+                        # 格式化: 2026-02-06 -> 2026年2月6日收益情况
+                        ymd = raw_date.split('-')
+                        if len(ymd) == 3:
+                            latest_date_str = f" <span style='font-size:11px; font-weight:400; color:#999; margin-left:6px'>{ymd[0]}年{int(ymd[1])}月{int(ymd[2])}日收益情况</span>"
+                except: pass
+
+            header_html = f"<span style='color:#999; font-size:12px; letter-spacing:1px; margin-left:2px; font-weight:500'>PORTFOLIO</span>{latest_date_str}"
+            render_if_changed(rendered, "portfolio_header", portfolio_header_slot, header_html,
+                              lambda: st.markdown(header_html, unsafe_allow_html=True))
+
+            for name in card_order:
+                parts = build_card_parts(cards_data[name], zen_mode, nav_store, today_str, audit_memo)
+                render_if_changed(rendered, f"card:{name}", card_slots[name], parts,
+                                  lambda parts=parts: draw_card(parts))
+
+            # 3. 🌍 底部大盘
+            for i, code in enumerate(MARKET_INDICES):
+                d = market_data.get(code)
+                if d:
+                    value = f"{d['change']:.2f}%"
+                    render_if_changed(rendered, f"index:{code}", index_slots[i], value,
+                                      lambda i=i, code=code, value=value: st.metric(MARKET_INDICES[code], value))
+
+            time.sleep(FAST_DASHBOARD_INTERVAL if fast_mode else DASHBOARD_INTERVAL)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,213 @@
+import calendar
+import json
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+
+import valuation
+from tick_recorder import TICK_DIR, load_day
+
+# ==========================================
+# 🧪 估值回测 (离线，不联网)
+# ==========================================
+# 把每天收盘时的行情向量重新套到各基金的持仓上，乘以当天实际生效的 factor，
+# 再和净值存储里的官方涨跌幅对比，统计 MAE / RMSE / 偏差 / 误差在 0.3%、1.0% 以内的天数占比：
+#   - 行情来源：ticks/ 里录制的盘中数据 (取每天收盘那一轮)，或 --quotes 指定的本地样本 {date: {code: pct}}
+#     没有行情向量的日期退回用 history.json 收盘存证里的 raw
+#   - factor：factor_history.json 里某天审计出的因子从下一个交易日起生效，更早的日期用 funds.json 当前值
+#   - 所有日期、所有基金一次矩阵运算；窗口按每只基金最近 N 个有官方净值的交易日统计
+# ⚠️ 前视偏差：行情重放用的是今天 funds.json 里的持仓 (没有保存历史持仓)，季报换仓之前的日期会“用未来的持仓估过去”，
+#    误差会偏乐观。每个窗口里这类观测的天数记在 'replayed'，CLI 输出和看板胶囊都会标出来；收盘存证 raw 没有这个问题。
+
+WINDOWS = (5, 20, 60)       # 最近 N 个观测日；另外还有一个 "all"
+TOLERANCES = (0.3, 1.0)     # 命中率阈值 (%)
+MEMO_WINDOW = "20"          # 看板审计胶囊用哪个窗口
+MEMO_MIN_OBS = 3            # 窗口内观测太少时改用更长的窗口
+CLOSE_GRACE = 60            # 秒：15:00 之后这么久以内的一轮也算收盘
+
+def _close_ts(date):
+    """某天 15:00 (北京时间) + 宽限 对应的时间戳"""
+    d = datetime.strptime(date, "%Y-%m-%d")
+    return calendar.timegm((d.year, d.month, d.day, 15, 0, 0)) - 8 * 3600 + CLOSE_GRACE
+
+def quotes_from_ticks(root=TICK_DIR):
+    """录制数据里每天收盘那一轮的行情 {date: {code: pct}}"""
+    if not os.path.isdir(root): return {}
+    out = {}
+    for fname in sorted(os.listdir(root)):
+        if not fname.endswith(".json"): continue
+        date = fname[:-5]
+        close_ts = _close_ts(date)
+        best = None
+        for funds, symbols, ticks in load_day(date, root):
+            before = np.flatnonzero(ticks['ts'] <= close_ts)
+            if not len(before): continue
+            i = before[-1]
+            if best is None or ticks['ts'][i] > best[0]:
+                best = (ticks['ts'][i], symbols, np.array(ticks['quote'][i]))
+        if best is None: continue
+        _, symbols, quote = best
+        out[date] = {code: float(q) for code, q in zip(symbols, quote) if not np.isnan(q)}
+    return out
+
+def load_quote_fixture(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def factor_matrix(dates, names, factor_history, funds_config):
+    """每天实际生效的 factor (天数 × 基金)"""
+    F = np.full((len(dates), len(names)), np.nan)
+    for rec_date, factors in (factor_history or {}).items():
+        # 审计当天晚上算出的因子，从下一个交易日开始用
+        t = np.searchsorted(dates, rec_date, side='right')
+        if t >= len(dates): continue
+        for j, name in enumerate(names):
+            if name in factors: F[t, j] = factors[name]
+    # 沿时间向前填充：每格取它之前最近一次有记录的行
+    rows = np.where(np.isnan(F), 0, np.arange(len(dates))[:, None])
+    rows = np.maximum.accumulate(rows, axis=0)
+    F = F[rows, np.arange(len(names))]
+    default = np.array([funds_config[n].get('factor', 1.0) for n in names])
+    return np.where(np.isnan(F), default, F)
+
+def build_panel(funds_config, history, official, factor_history=None, daily_quotes=None):
+    """拼出回测面板 dict(dates, names, est, actual, mask, source)
+    source: 1 = 行情向量重放，2 = 收盘存证 raw，0 = 无估值
+    """
+    names = list(funds_config)
+    daily_quotes = daily_quotes or {}
+    dates = np.array(sorted(set(history) | set(daily_quotes)))
+    T, N = len(dates), len(names)
+    raw = np.zeros((T, N))
+    source = np.zeros((T, N), dtype=np.int8)
+
+    # 1) 有行情向量的日期：按当前持仓整体重放
+    engine = valuation.get_engine(funds_config)
+    replay_rows = [t for t, d in enumerate(dates) if d in daily_quotes]
+    if replay_rows and engine.n_symbols:
+        values = np.zeros((len(replay_rows), engine.n_symbols))
+        present = np.zeros(values.shape, dtype=bool)
+        for k, t in enumerate(replay_rows):
+            quotes = daily_quotes[dates[t]]
+            for j, code in enumerate(engine.symbols):
+                pct = quotes.get(code)
+                if pct is not None: values[k, j], present[k, j] = pct, True
+        r, covered = engine.evaluate_matrix(values, present)
+        raw[replay_rows] = r
+        source[replay_rows] = np.where(covered > 0, 1, 0)
+
+    # 2) 其余的用收盘存证里的 raw
+    actual = np.zeros((T, N))
+    mask = np.zeros((T, N), dtype=bool)
+    for t, date in enumerate(dates):
+        snap = history.get(date, {})
+        for j, name in enumerate(names):
+            if source[t, j] == 0 and snap.get(name) is not None:
+                raw[t, j], source[t, j] = snap[name], 2
+            if source[t, j] == 0: continue
+            pct = official(name, date)
+            if pct is None: continue
+            actual[t, j], mask[t, j] = pct, True
+
+    est = raw * factor_matrix(dates, names, factor_history, funds_config)
+    return {'dates': dates, 'names': names, 'est': est, 'actual': actual, 'mask': mask, 'source': source}
+
+def window_stats(err, mask, windows=WINDOWS, tolerances=TOLERANCES, replayed=None):
+    """按每只基金最近 N 个观测统计误差，返回 {窗口名: {指标: 按基金排列的数组}}
+    replayed: 可选的掩码，标记按当前持仓重放的观测，各窗口内的个数记在 'replayed'
+    """
+    # 从后往前数第几个观测 (1 = 最近一次)
+    rank = np.cumsum(mask[::-1], axis=0)[::-1]
+    out = {}
+    for w in list(windows) + [None]:
+        m = mask & (rank <= w) if w else mask
+        n = m.sum(axis=0)
+        e = np.where(m, err, 0.0)
+        safe = np.maximum(n, 1)
+        stats = {
+            'n': n,
+            'mae': np.where(n > 0, np.abs(e).sum(axis=0) / safe, np.nan),
+            'rmse': np.where(n > 0, np.sqrt((e * e).sum(axis=0) / safe), np.nan),
+            'bias': np.where(n > 0, e.sum(axis=0) / safe, np.nan),
+        }
+        for tol in tolerances:
+            stats[f'hit_{tol}'] = np.where(n > 0, ((np.abs(e) <= tol) & m).sum(axis=0) / safe, np.nan)
+        if replayed is not None: stats['replayed'] = (m & replayed).sum(axis=0)
+        out[str(w) if w else "all"] = stats
+    return out
+
+def run(funds_config, history, official, factor_history=None, daily_quotes=None):
+    """回测入口，返回 {基金名: {窗口名: {'n', 'mae', 'rmse', 'bias', 'hit_0.3', 'hit_1.0', 'replayed'}}}
+    replayed 为按当前持仓重放的观测数 (有前视偏差)
+    """
+    panel = build_panel(funds_config, history, official, factor_history, daily_quotes)
+    if not len(panel['dates']): return {}
+    err = panel['est'] - panel['actual']
+    stats = window_stats(err, panel['mask'], replayed=panel['source'] == 1)
+    report = {}
+    for j, name in enumerate(panel['names']):
+        report[name] = {
+            window: {k: (int(v[j]) if k in ('n', 'replayed') else (None if np.isnan(v[j]) else round(float(v[j]), 4)))
+                     for k, v in s.items()}
+            for window, s in stats.items()
+        }
+    return report
+
+def audit_memo(report, window=MEMO_WINDOW, min_obs=MEMO_MIN_OBS):
+    """把回测结果转成看板审计胶囊 {基金名: {'tag', 'text', 'color', 'text_color', 'tooltip'}}
+    窗口里有按当前持仓重放的观测时，文案里注明天数，tooltip 说明前视偏差
+    """
+    order = [window] + [w for w in [str(w) for w in WINDOWS] + ["all"] if w != window]
+    memo = {}
+    for name, windows in report.items():
+        s = next((windows[w] for w in order if w in windows and windows[w]['n'] >= min_obs), None)
+        if s is None: continue
+        mae = s['mae']
+        text = f"近{s['n']}日 MAE {mae:.2f}%，{s['hit_0.3']:.0%} 的交易日误差≤0.3%"
+        tooltip = ""
+        if s.get('replayed'):
+            text += f" (含{s['replayed']}日按当前持仓回放)"
+            tooltip = "这些日期用今天的持仓重放历史行情，换仓前的误差会偏乐观 (前视偏差)"
+        if mae <= 0.3:
+            memo[name] = {"tag": "✅ 准确率高", "text": text, "color": "#D4EDDA", "text_color": "#155724"}
+        elif mae <= 1.0:
+            memo[name] = {"tag": "👌 偏差可控", "text": text, "color": "#D1ECF1", "text_color": "#0C5460"}
+        else:
+            memo[name] = {"tag": "⚠️ 偏差较大", "text": text, "color": "#FFF3CD", "text_color": "#856404"}
+        memo[name]["tooltip"] = tooltip
+    return memo
+
+if __name__ == "__main__":
+    # python backtest.py [--quotes 样本.json] [--no-ticks] [--json 输出.json]
+    # 只读本地 funds.json / history.json / factor_history.json / nav_store/ / ticks/
+    from nav_store import NavStore
+
+    args = sys.argv[1:]
+    def opt(flag):
+        return args[args.index(flag) + 1] if flag in args and args.index(flag) + 1 < len(args) else None
+
+    def read(path):
+        if not os.path.exists(path): return {}
+        with open(path, 'r', encoding='utf-8') as f: return json.load(f)
+
+    funds = read('funds.json')
+    daily_quotes = {} if "--no-ticks" in args else quotes_from_ticks()
+    if opt("--quotes"): daily_quotes.update(load_quote_fixture(opt("--quotes")))
+    report = run(funds, read('history.json'), NavStore().get, read('factor_history.json'), daily_quotes)
+
+    print(f"行情重放 {len(daily_quotes)} 天，窗口 {', '.join(map(str, WINDOWS))}, all")
+    if daily_quotes:
+        print("⚠️ 行情重放用的是当前 funds.json 的持仓，换仓之前的日期有前视偏差 (误差偏乐观)，下面 replay=N 为这类观测数")
+    for name, windows in report.items():
+        print(name)
+        for w, s in windows.items():
+            if not s['n']:
+                print(f"  {w:>4}: 无观测")
+                continue
+            print(f"  {w:>4}: n={s['n']:<3} MAE={s['mae']:.3f}  RMSE={s['rmse']:.3f}  bias={s['bias']:+.3f}  "
+                  f"≤0.3%: {s['hit_0.3']:.0%}  ≤1.0%: {s['hit_1.0']:.0%}  replay={s['replayed']}")
+    if opt("--json"):
+        with open(opt("--json"), 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4, ensure_ascii=False)
@@ -0,0 +1,93 @@
+import random
+import sys
+import time
+
+from quote_client import iter_quotes, parse_quotes
+
+# ==========================================
+# ⏱️ 行情解析微基准：旧版 split 解析 vs 单次正则解析
+# ==========================================
+# 用法: python bench_quotes.py [payload.txt] [次数]
+# 不传文件时按 qt.gtimg.cn 的真实格式生成 500 个代码的样本 (88 个字段，下标 30 为时间，含港股的 YYYY/MM/DD 时间格式)；
+# 对照组是最初 app.py 里 get_realtime_price 的解析写法 (逐条 split)，它会把港股日期解析错，所以日期只比对 A 股；
+# 抓一份真实样本: curl "http://qt.gtimg.cn/q=sh600000,..." > payload.txt
+
+def legacy_parse_quotes(text):
+    """最初 app.py 里 get_realtime_price 的解析写法 (原样保留，只去掉了网络请求)，作对照"""
+    price_data = {}
+    parts = text.split(';')
+    for part in parts:
+        if '="' in part:
+            try:
+                key_raw = part.split('=')[0].strip()
+                code = key_raw.split('_')[-1]
+                data = part.split('="')[1].strip('"').split('~')
+                if len(data) > 30:
+                    name = data[1].replace(" ", "")
+                    current = float(data[3])
+                    close = float(data[4])
+                    pct = 0.0
+                    if close > 0: pct = ((current - close) / close) * 100
+                    data_date = ""
+                    if len(data) > 30:
+                        raw_time = data[30]
+                        if len(raw_time) >= 8:
+                            data_date = f"{raw_time[:4]}-{raw_time[4:6]}-{raw_time[6:8]}"
+                    price_data[code] = {'name': name, 'change': pct, 'date': data_date}
+            except: continue
+    return price_data
+
+def compare(old, new):
+    """对照组解析出的每个代码，名称 / 涨跌幅必须一致；日期只比对 A 股格式的，返回对照组日期解析错的代码数"""
+    wrong_dates = 0
+    for code, d in old.items():
+        n = new.get(code)
+        assert n is not None and n['name'] == d['name'] and n['change'] == d['change'], f"新旧解析结果不一致: {code}"
+        if n['date'] != d['date']:
+            assert '/' in d['date'], f"新旧解析日期不一致: {code}"
+            wrong_dates += 1
+    return wrong_dates
+
+def sample_payload(n=500, seed=42):
+    rng = random.Random(seed)
+    lines = []
+    for i in range(n):
+        code = f"sh{600000 + i}" if i % 2 else f"sz{i:06d}"
+        prev = round(rng.uniform(3, 200), 2)
+        price = round(prev * (1 + rng.uniform(-0.1, 0.1)), 2)
+        fields = ["1", f"样本 股票{i}", code[2:], str(price), str(prev), str(prev)]
+        fields += [str(rng.randint(1, 10 ** 6)) for _ in range(24)]
+        # 每 10 个里放一个港股 (时间格式为 2026/01/16 16:08:05)
+        if i % 10 == 0:
+            code = f"hk{i:05d}"
+            fields[2] = code[2:]
+        fields.append("2026/01/16 16:08:05" if code.startswith("hk") else "20260116150003")
+        fields += [f"{rng.uniform(-10, 10):.2f}" for _ in range(57)]
+        lines.append(f'v_{code}="' + "~".join(fields) + '";')
+    lines.append('v_pv_none_match="1";')
+    return "\n".join(lines) + "\n"
+
+def bench(fn, text, rounds):
+    fn(text)
+    start = time.perf_counter()
+    for _ in range(rounds): fn(text)
+    return (time.perf_counter() - start) / rounds * 1000
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'r', encoding='utf-8', errors='ignore') as f:
+            text = f.read()
+    else:
+        text = sample_payload()
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    old, new = legacy_parse_quotes(text), parse_quotes(text)
+    wrong_dates = compare(old, new)
+    print(f"样本: {len(new)} 个代码, {len(text) / 1024:.0f} KB, 每项跑 {rounds} 次 (对照组有 {wrong_dates} 个港股日期解析错误)")
+
+    t_old = bench(legacy_parse_quotes, text, rounds)
+    t_new = bench(parse_quotes, text, rounds)
+    t_iter = bench(lambda t: sum(1 for _ in iter_quotes(t)), text, rounds)
+    print(f"baseline split : {t_old:.3f} ms")
+    print(f"parse_quotes   : {t_new:.3f} ms  ({t_old / t_new:.1f}x)")
+    print(f"iter_quotes    : {t_iter:.3f} ms  ({t_old / t_iter:.1f}x, 只取字段不建字典)")
@@ -0,0 +1,200 @@
+import json
+import sys
+
+import numpy as np
+
+# ==========================================
+# 📐 估值因子批量校准 (walk-forward 最小二乘)
+# ==========================================
+# 拿 history.json (收盘存证的原始估值 raw) 与净值存储 (官方涨跌幅) 的所有重叠日期，
+# 为每只基金拟合 official ≈ factor × raw (+ intercept / + beta × 基准)：
+#   - 所有基金、所有日期一起算：先把 x·y、x² 等量沿时间做前缀和，任意滑动窗口的和都是两行相减，
+#     窗口内最小二乘是闭式解，没有 Python 循环
+#   - walk-forward：第 t 天只用 [t-window, t) 的数据拟合，再去预测第 t 天，得到样本外误差
+#   - 最终因子用最近一个窗口 (含最后一天) 拟合
+# 观测太少 (< min_obs) 的基金不给新因子，由调用方沿用旧值。
+# 上线前再过一道闸 (accepted_factor)：样本外 MAE 必须比当前 factor 小，且只向新值靠拢 BLEND，结果限制在 FACTOR_BOUNDS 内。
+# 靠拢的起点是审计日之前生效的因子 (base_factors，取自 factor_history.json)，同一天审计几次结果都一样。
+
+WINDOW = 20      # 滑动窗口 (交易日)
+MIN_OBS = 5      # 窗口内至少几个有效观测才拟合
+MODELS = ("factor", "intercept", "beta")
+# 收盘存证里记录各基金基准涨跌幅的键 (history.json 每天的快照里)
+BENCH_KEY = "_bench"
+EPS = 1e-9
+FACTOR_BOUNDS = (0.5, 1.5)   # 因子允许的范围，超出一律截断
+BLEND = 0.5                  # 每次只向新拟合值靠拢这么多，单日异常不会让因子大幅跳动
+
+def build_panel(history, official, names, bench=None):
+    """拼出按日期 × 基金排列的矩阵
+    history: {date: {基金名: raw}}；official(name, date) -> 官方涨跌幅% 或 None
+    bench: 可选 {date: {基金名: 基准涨跌幅%}} (beta 模型用)
+    返回 (dates, X, Y, B, M)，M 为 raw 与官方值都存在的掩码
+    """
+    dates = sorted(history)
+    X = np.zeros((len(dates), len(names)))
+    Y = np.zeros_like(X)
+    B = np.zeros_like(X)
+    M = np.zeros(X.shape, dtype=bool)
+    for t, date in enumerate(dates):
+        snap = history[date]
+        for j, name in enumerate(names):
+            raw = snap.get(name)
+            if raw is None: continue
+            actual = official(name, date)
+            if actual is None: continue
+            X[t, j], Y[t, j], M[t, j] = raw, actual, True
+            if bench: B[t, j] = bench.get(date, {}).get(name, 0.0)
+    return dates, X, Y, B, M
+
+def bench_from_history(history):
+    """从收盘存证里取出基准涨跌幅 {date: {基金名: pct}}"""
+    return {date: snap.get(BENCH_KEY, {}) for date, snap in history.items()}
+
+def _prefix(a):
+    """沿时间的前缀和，多一行 0：区间 [lo, hi) 的和 = P[hi] - P[lo]"""
+    return np.vstack([np.zeros((1,) + a.shape[1:]), np.cumsum(a, axis=0)])
+
+def _solve(s, model):
+    """由窗口内各项和解出 (factor, intercept, beta, 是否可解)"""
+    n, sx, sy, sxx, sxy = s['n'], s['x'], s['y'], s['xx'], s['xy']
+    zeros = np.zeros_like(sxx)
+    if model == "factor":
+        ok = sxx > EPS
+        f = np.divide(sxy, sxx, out=zeros.copy(), where=ok)
+        return f, zeros, zeros, ok
+    if model == "intercept":
+        den = n * sxx - sx * sx
+        ok = (n > 1) & (den > EPS)
+        f = np.divide(n * sxy - sx * sy, den, out=zeros.copy(), where=ok)
+        a = np.divide(sy - f * sx, n, out=zeros.copy(), where=ok)
+        return f, a, zeros, ok
+    if model == "beta":
+        sbb, sxb, sby = s['bb'], s['xb'], s['by']
+        det = sxx * sbb - sxb * sxb
+        ok = np.abs(det) > EPS
+        f = np.divide(sxy * sbb - sby * sxb, det, out=zeros.copy(), where=ok)
+        b = np.divide(sxx * sby - sxb * sxy, det, out=zeros.copy(), where=ok)
+        return f, zeros, b, ok
+    raise ValueError(f"未知模型: {model}")
+
+def walk_forward(X, Y, M, B=None, model="factor", window=WINDOW, min_obs=MIN_OBS):
+    """返回 dict：
+    params: 最近一个窗口拟合的 (factor, intercept, beta, n) 四个按基金排列的数组
+    pred / err: 每天的样本外预测和误差 (不可预测处为 NaN)
+    """
+    B = np.zeros_like(X) if B is None else B
+    Mf = M.astype(float)
+    x, y, b = X * Mf, Y * Mf, B * Mf
+    terms = {'n': Mf, 'x': x, 'y': y, 'xx': x * X, 'xy': x * Y, 'bb': b * B, 'xb': x * B, 'by': b * Y}
+    P = {k: _prefix(v) for k, v in terms.items()}
+
+    T = X.shape[0]
+    hi = np.arange(T)
+    lo = np.maximum(hi - window, 0)
+    # 第 t 天的训练窗口 [t-window, t)，不含当天
+    train = {k: p[hi] - p[lo] for k, p in P.items()}
+    f, a, beta, ok = _solve(train, model)
+    ok &= (train['n'] >= min_obs) & M
+    pred = np.where(ok, a + f * X + beta * B, np.nan)
+    err = pred - np.where(M, Y, np.nan)
+
+    # 上线用的参数：最近一个窗口，含最后一天
+    last = {k: p[T] - p[max(T - window, 0)] for k, p in P.items()}
+    f_last, a_last, b_last, ok_last = _solve({k: v[None] for k, v in last.items()}, model)
+    ok_last = ok_last[0] & (last['n'] >= min_obs)
+    return {
+        'params': (np.where(ok_last, f_last[0], np.nan), a_last[0], b_last[0], last['n']),
+        'pred': pred,
+        'err': err,
+    }
+
+def _error_stats(err):
+    valid = ~np.isnan(err)
+    n = valid.sum(axis=0)
+    e = np.where(valid, err, 0.0)
+    mae = np.divide(np.abs(e).sum(axis=0), n, out=np.full(n.shape, np.nan), where=n > 0)
+    rmse = np.sqrt(np.divide((e * e).sum(axis=0), n, out=np.full(n.shape, np.nan), where=n > 0))
+    return n, mae, rmse
+
+def calibrate(history, official, funds_config, bench=None, model="factor", window=WINDOW, min_obs=MIN_OBS):
+    """对 funds_config 里的每只基金做 walk-forward 校准
+    返回 {基金名: {'factor', 'intercept', 'beta', 'n', 'oos_n', 'oos_mae', 'oos_rmse', 'baseline_mae'}}
+    factor 为 None 表示观测不足，应沿用旧值；baseline_mae 是当前 factor 在同一批样本外日期上的误差
+    """
+    names = list(funds_config)
+    dates, X, Y, B, M = build_panel(history, official, names, bench)
+    if not dates: return {}
+    res = walk_forward(X, Y, M, B, model, window, min_obs)
+    f, a, b, n = res['params']
+    oos_n, mae, rmse = _error_stats(res['err'])
+
+    current = np.array([funds_config[nm].get('factor', 1.0) for nm in names])
+    baseline_err = np.where(np.isnan(res['err']), np.nan, current * X - Y)
+    _, base_mae, _ = _error_stats(baseline_err)
+
+    out = {}
+    for j, name in enumerate(names):
+        out[name] = {
+            'factor': None if np.isnan(f[j]) else round(float(f[j]), 4),
+            'intercept': round(float(a[j]), 4),
+            'beta': round(float(b[j]), 4),
+            'n': int(n[j]),
+            'oos_n': int(oos_n[j]),
+            'oos_mae': None if np.isnan(mae[j]) else round(float(mae[j]), 4),
+            'oos_rmse': None if np.isnan(rmse[j]) else round(float(rmse[j]), 4),
+            'baseline_mae': None if np.isnan(base_mae[j]) else round(float(base_mae[j]), 4),
+        }
+    return out
+
+def clip_factor(f):
+    lo, hi = FACTOR_BOUNDS
+    return round(min(max(f, lo), hi), 4)
+
+def accepted_factor(r, current, blend=BLEND):
+    """calibrate 单只基金的结果 -> 实际要写入的因子；样本外没有跑赢当前 factor 时返回 None (保持不动)"""
+    if not r or r['factor'] is None or not r['oos_n']: return None
+    if r['oos_mae'] is None or r['baseline_mae'] is None or r['oos_mae'] >= r['baseline_mae']: return None
+    return clip_factor(current + blend * (r['factor'] - current))
+
+def factor_before(factor_history, name, date):
+    """factor_history 里 date 之前 (不含当天) 最近一次记录的因子；没有记录返回 None"""
+    for d in sorted(factor_history or {}, reverse=True):
+        if d < date and name in factor_history[d]: return factor_history[d][name]
+    return None
+
+def base_factors(funds_config, factor_history, date):
+    """date 这天审计的起点 {基金名: 因子}：date 之前最近一次记录的因子，没有记录时用 funds.json 现值；
+    当天已经审计过、又没有更早记录的基金 (现值已经被这次审计改过) 不给起点，不再参与校准
+    """
+    audited = (factor_history or {}).get(date, {})
+    bases = {}
+    for name, info in funds_config.items():
+        base = factor_before(factor_history, name, date)
+        if base is None and name not in audited: base = info.get('factor', 1.0)
+        if base is not None: bases[name] = base
+    return bases
+
+def audit_factors(results, bases, funds_config):
+    """calibrate 的结果 -> 要写入的新因子 {基金名: 因子}，只含通过 accepted_factor 且与现值不同的基金"""
+    out = {}
+    for name, base in bases.items():
+        new_f = accepted_factor(results.get(name), base)
+        if new_f is not None and new_f != funds_config[name].get('factor'): out[name] = new_f
+    return out
+
+if __name__ == "__main__":
+    # python calibration.py [factor|intercept|beta] [窗口]   离线校准 (读本地 history.json + nav_store/)，只打印不写入
+    from nav_store import NavStore
+
+    model = sys.argv[1] if len(sys.argv) > 1 else "factor"
+    window = int(sys.argv[2]) if len(sys.argv) > 2 else WINDOW
+    with open('history.json', 'r', encoding='utf-8') as f: history = json.load(f)
+    with open('funds.json', 'r', encoding='utf-8') as f: funds = json.load(f)
+    nav_store = NavStore()
+    bench = bench_from_history(history) if model == "beta" else None
+    result = calibrate(history, nav_store.get, funds, bench=bench, model=model, window=window)
+    for name, r in result.items():
+        print(f"{name.split('(')[0]:<14} factor={r['factor']}  n={r['n']}  oos_n={r['oos_n']}  "
+              f"oos_mae={r['oos_mae']}  baseline_mae={r['baseline_mae']}  "
+              f"采用={accepted_factor(r, funds[name].get('factor', 1.0))}")
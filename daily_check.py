@@ -1,8 +1,13 @@
-import requests
 import json
 import os
 from datetime import datetime, timedelta
-import time
+
+import notifier
+import quote_client
+import signal_journal
+import signal_rules
+import trading_calendar
+import valuation
 
 # ==========================================
 # ⚙️ 配置区 (安全升级版)
@@ -32,113 +37,30 @@ def load_funds():
             return json.load(f)
     except: return {}
 
-def get_realtime_price(stock_codes):
-    if not stock_codes: return {}
-    url = f"http://qt.gtimg.cn/q={','.join(stock_codes)}"
-    
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-    }
-
-    for attempt in range(3):
-        try:
-            r = requests.get(url, headers=headers, timeout=5)
-            if r.status_code != 200:
-                print(f"⚠️ 行情接口返回 {r.status_code}，重试 ({attempt+1}/3)...")
-                continue
-
-            price_data = {}
-            parts = r.text.split(';')
-            for part in parts:
-                if '="' in part:
-                    try:
-                        code = part.split('=')[0].split('_')[-1]
-                        data = part.split('="')[1].split('~')
-                        if len(data) > 4:
-                            close = float(data[4])
-                            if close > 0:
-                                price_data[code] = ((float(data[3]) - close) / close) * 100
-                    except: continue
-            
-            if price_data: return price_data
-            else: print("⚠️ 获取到的行情数据为空")
-            
-        except Exception as e:
-            print(f"⚠️ 网络请求异常: {e}，重试 ({attempt+1}/3)...")
-            time.sleep(2)
-            
-    print("❌ 多次重试失败，无法获取行情数据")
-    return {}
-
 def get_benchmark_pct(fund_name, market_data):
-    code = 'sz399006' if any(k in fund_name for k in ["成长", "AI", "优选"]) else 'sh000001'
-    return market_data.get(code, 0)
+    code, _ = signal_rules.benchmark_for(fund_name)
+    return market_data[code]['change'] if code in market_data else 0
 
-# 🔥 新增：写日记功能
+# 🔥 新增：写日记功能 (只追加到 signals.jsonl，同日同基金同信号去重，再刷新 signals.md 视图)
 def append_to_log(log_entries):
     if not log_entries: return
-    
-    today = datetime.now().strftime("%Y-%m-%d")
-    new_lines = []
-    
-    for entry in log_entries:
-        # 格式: | 日期 | 基金 | 信号 | 详情 | 操作 |
-        line = f"| {today} | {entry['name']} | {entry['type']} | {entry['detail']} | {entry['action']} |"
-        new_lines.append(line)
-        
     try:
-        # 读取现有内容
-        LOG_FILE = "signals.md"
-        with open(LOG_FILE, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-            
-        # 在表头(第2行)下面插入新内容，这样最新的在最上面
-        insert_idx = 2
-        for i, line in enumerate(lines):
-            if "|---" in line:
-                insert_idx = i + 1
-                break
-                
-        # 插入
-        for line in reversed(new_lines):
-            lines.insert(insert_idx, line + "\n")
-            
-        # 写入
-        with open(LOG_FILE, 'w', encoding='utf-8') as f:
-            f.writelines(lines)
-        print("✅ 日记写入成功")
+        journal = signal_journal.SignalJournal()
+        written = journal.append(log_entries)
+        if written:
+            signal_journal.render(journal)
+        print(f"📝 已记录 {len(written)} 条信号 (重复 {len(log_entries) - len(written)} 条已跳过)")
     except Exception as e:
         print(f"❌ 写日记失败: {e}")
 
 # ==========================================
 # 🛠️ 核心功能函数
 # ==========================================
+NOTIFIER = notifier.Notifier(notifier.build_channels(BARK_KEY, PUSHPLUS_TOKEN))
+
 def send_message(title, content):
-    """统一发送通知 (Bark + PushPlus)"""
-    print(f"[MSG] 准备发送通知: {title}")
-    
-    # 1. Push Bark
-    if BARK_KEY:
-        try:
-            # 兼容完整URL或纯Key
-            base_url = BARK_KEY if BARK_KEY.startswith("http") else f"https://api.day.app/{BARK_KEY}/"
-            clean_url = base_url.rstrip('/')
-            requests.get(f"{clean_url}/{title}/{content}?group=fund", timeout=10)
-        except: pass
-    
-    # 2. Push PushPlus
-    if PUSHPLUS_TOKEN and len(PUSHPLUS_TOKEN) > 5:
-        try:
-            pp_url = "http://www.pushplus.plus/send"
-            pp_data = {
-                "token": PUSHPLUS_TOKEN,
-                "title": title,
-                "content": content.replace("\n", "<br>"), # HTML换行
-                "template": "html"
-            }
-            requests.post(pp_url, json=pp_data, timeout=10)
-        except Exception as e:
-            print(f"❌ PushPlus 推送失败: {e}")
+    """统一发送通知 (Bark + PushPlus 并发，失败的进 outbox 下次补发)"""
+    return NOTIFIER.send(title, content)
 
 # ==========================================
 # 🚀 主程序
@@ -148,15 +70,26 @@ def main():
     if not BARK_KEY and not PUSHPLUS_TOKEN:
         print("[!] 未找到推送配置 (Env或secrets.json)，仅本地运行")
 
+    # 先补发上次没送达的通知
+    NOTIFIER.drain()
+
+    # 非交易日 (周末 / 节假日) 直接结束，不请求行情
+    if not trading_calendar.is_covered():
+        print("⚠️ 今年的休市安排还没录入 trading_calendar，暂按周一到周五都开市处理")
+    if not trading_calendar.is_trading_day():
+        print(f"今天 ({trading_calendar.bj_now().strftime('%Y-%m-%d')}) 休市，跳过巡检")
+        return
+
     funds = load_funds()
     if not funds: return
     
-    all_codes = ['sh000001', 'sz399006']
-    for f in funds.values():
-        for s in f['holdings']: all_codes.append(s['code'])
+    engine = valuation.get_engine(funds)
+    all_codes = signal_rules.benchmark_codes() + engine.symbols
     
-    market_data = get_realtime_price(list(set(all_codes)))
-    if not market_data: return
+    market_data = quote_client.get_realtime_price(all_codes)
+    if not market_data:
+        print("❌ 无法获取行情数据")
+        return
 
     messages = []
     log_entries = [] # 专门用于写日记的数据结构
@@ -168,52 +101,46 @@ def main():
     report_lines = []
     total_est_profit = 0
     
+    valuations = engine.evaluate(market_data)
+    
     for name, info in funds.items():
-        factor = info.get('factor', 1.0)
         base_unit = info.get('base_unit', 1000)
-        val = 0; w = 0
-        for s in info['holdings']:
-            if s['code'] in market_data:
-                val += market_data[s['code']] * s['weight']; w += s['weight']
-        
-        est = (val / w * factor) if w > 0 else 0
+        est = valuations[name]['est']
         bench_val = get_benchmark_pct(name, market_data)
         short_name = name.split('(')[0]
 
         # 收集报告数据 (无论是否触发信号)
         icon = "🔴" if est > 0 else "🟢" if est < 0 else "⚪"
-        report_lines.append(f"{icon} {short_name}: {est:+.2f}%")
+        report_lines.append(f"{icon} {short_name}: {est:+.2f}% (覆盖 {valuations[name]['coverage']:.0%})")
 
         # 信号判断
-        signal_type = None
-        detail = ""
-        action = ""
+        signal = signal_rules.evaluate(est, bench_val, base_unit, signal_rules.rules_for(info))
         
         # 1. 买入
-        if est < -2.5 and est < bench_val:
-            multiplier = 2 if est < -4.0 else 1
-            buy_amt = base_unit * multiplier
-            msg = f"🟢【机会】{short_name} {est:.2f}%\n📉 跑输基准 {abs(est-bench_val):.1f}%\n👉 建议加仓 ¥{buy_amt:,}"
+        if signal and signal['type'] == "BUY":
+            buy_amt = signal['amount']
+            msg = f"🟢【机会】{short_name} {est:.2f}%\n📉 跑输基准 {signal['gap']:.1f}%\n👉 建议加仓 ¥{buy_amt:,}"
             messages.append(msg)
             
             # 记录日志数据
             log_entries.append({
                 "name": short_name,
                 "type": "🟢 买入机会",
-                "detail": f"估值 {est:.2f}% (跑输 {abs(est-bench_val):.1f}%)",
+                "detail": f"估值 {est:.2f}% (跑输 {signal['gap']:.1f}%)",
                 "action": f"买入 ¥{buy_amt:,}"
             })
 
         # 2. 卖出
-        elif est > 3.0 and est > (bench_val + 1.5):
-            msg = f"🔴【止盈】{short_name} +{est:.2f}%\n🔥 跑赢基准 {abs(est-bench_val):.1f}%\n👉 建议卖出 1/4"
+        elif signal and signal['type'] == "SELL":
+            fraction = signal_rules.fraction_label(signal['fraction'])
+            msg = f"🔴【止盈】{short_name} +{est:.2f}%\n🔥 跑赢基准 {signal['gap']:.1f}%\n👉 建议卖出 {fraction}"
             messages.append(msg)
             
             log_entries.append({
                 "name": short_name,
                 "type": "🔴 止盈提醒",
-                "detail": f"估值 +{est:.2f}% (跑赢 {abs(est-bench_val):.1f}%)",
-                "action": "卖出 1/4"
+                "detail": f"估值 +{est:.2f}% (跑赢 {signal['gap']:.1f}%)",
+                "action": f"卖出 {fraction}"
             })
 
     # ---------------------------
@@ -244,7 +171,7 @@ def main():
 
     # 🕒 收盘估值报告逻辑优化
     # 只要是 15:00 之后，且今天还没发过，就发送 (不再限制 16:30 截止，防止 GitHub Action 延迟)
-    is_report_time = (now.hour >= 15)
+    is_report_time = trading_calendar.after_close(now)
     
     # ---------------------------
     # 📢 2. 发送收盘估值报告
@@ -0,0 +1,145 @@
+import base64
+import copy
+import hashlib
+import json
+import threading
+from urllib.parse import quote
+
+from github import Github, GithubException, InputGitTreeElement
+
+import quote_client
+
+# ==========================================
+# ☁️ GitHub 轻量数据库
+# ==========================================
+# 仓库句柄每个进程只建一次；文件内容按 sha 缓存，
+# 再次读取时带 If-None-Match 发条件请求，文件没变就是一次 304 (不计 API 配额)。
+# 多个文件一起保存时走 Git Data API：一棵 tree + 一个 commit，要么全写入要么全不写。
+# 提交前核对每个文件在分支最新 HEAD 里的 blob sha 是否还是读取时的那个，
+# 被别人 (nightly 任务 / 其他会话) 改过就抛 StaleWriteError，不覆盖别人的修改。
+
+class StaleWriteError(Exception):
+    def __init__(self, paths):
+        super().__init__(f"文件已被其他提交修改: {', '.join(paths)}")
+        self.paths = paths
+
+class GithubStore:
+    def __init__(self, token, username, repo_name):
+        self._token = token
+        self.repo = Github(token).get_user(username).get_repo(repo_name)
+        self._cache = {}  # path -> {'etag': ..., 'sha': ..., 'data': ...}
+        self._lock = threading.Lock()
+
+    def _contents_url(self, path):
+        return f"{self.repo.url}/contents/{quote(path)}"
+
+    def _headers(self, etag=None):
+        headers = {
+            "Authorization": f"token {self._token}",
+            "Accept": "application/vnd.github+json",
+        }
+        if etag: headers["If-None-Match"] = etag
+        return headers
+
+    def _read(self, path, parse):
+        """读取文件并用 parse(bytes) 解析，返回 (data, sha)；文件不存在返回 (None, None)"""
+        cached = self._cache.get(path)
+        r = quote_client.get(self._contents_url(path), headers=self._headers(cached and cached['etag']))
+        if r.status_code == 304 and cached:
+            return cached['data'], cached['sha']
+        if r.status_code == 404:
+            return None, None
+        r.raise_for_status()
+
+        body = r.json()
+        sha = body['sha']
+        if cached and cached['sha'] == sha:
+            # 内容没变 (例如自己刚写入过)，只是 ETag 失效，不用重新解析
+            data = cached['data']
+        else:
+            if body.get('encoding') == 'base64' and body.get('content'):
+                raw = base64.b64decode(body['content'])
+            else:
+                # 超过 1MB 的文件 contents 接口不返回正文，改走 blob 接口
+                raw = base64.b64decode(self.repo.get_git_blob(sha).content)
+            data = parse(raw)
+        with self._lock:
+            self._cache[path] = {'etag': r.headers.get('ETag'), 'sha': sha, 'data': data}
+        return data, sha
+
+    def read_json(self, path):
+        """读取 JSON 文件，返回 (data, sha)；文件不存在返回 ({}, None)
+        返回的是缓存的深拷贝，调用方可以随意修改
+        """
+        data, sha = self._read(path, lambda raw: json.loads(raw.decode('utf-8')))
+        if sha is None: return {}, None
+        return copy.deepcopy(data), sha
+
+    def read_text(self, path):
+        """读取文本文件，不存在返回 None"""
+        data, _ = self._read(path, lambda raw: raw.decode('utf-8'))
+        return data
+
+    def write_json(self, path, data, sha, message):
+        """写入单个 JSON 文件 (sha 为 None 时新建)，并刷新本地缓存"""
+        new_content = json.dumps(data, indent=4, ensure_ascii=False)
+        if sha:
+            result = self.repo.update_file(path, message, new_content, sha)
+        else:
+            result = self.repo.create_file(path, message, new_content)
+        new_sha = result['content'].sha
+        with self._lock:
+            # 新写入的内容没有 ETag，下次读取会拿到 200 + 相同 sha，直接复用已解析的数据
+            self._cache[path] = {'etag': None, 'sha': new_sha, 'data': copy.deepcopy(data)}
+        return new_sha
+
+    def _check_base(self, tree_sha, expected):
+        """expected: {path: 读取时的 blob sha (None 表示读取时文件不存在)}；返回 HEAD 里已经变了的路径"""
+        if not expected: return []
+        current = {e.path: e.sha for e in self.repo.get_git_tree(tree_sha, recursive=True).tree if e.type == 'blob'}
+        return [path for path, sha in expected.items() if current.get(path) != sha]
+
+    def commit_files(self, files, message, base_shas=None, max_attempts=3):
+        """把多个文件合成一个 commit 原子写入当前默认分支
+        files: {path: 内容}，内容为 str 时原样写入，否则按 JSON 序列化。
+        base_shas: {path: 调用方读取时的 sha}；没给的路径用本进程最近一次读 / 写时缓存的 sha，都没有则不核对。
+        HEAD 里任一文件的 sha 与之不同时抛 StaleWriteError；
+        分支在此期间被推进 (ref 更新不是 fast-forward) 时，在新的 HEAD 上重新核对、建树再提交。
+        返回新 commit 的 sha
+        """
+        texts = {
+            path: content if isinstance(content, str) else json.dumps(content, indent=4, ensure_ascii=False)
+            for path, content in files.items()
+        }
+        elements = [InputGitTreeElement(path, '100644', 'blob', content=text) for path, text in texts.items()]
+        ref_name = f"heads/{self.repo.default_branch}"
+        expected = {}
+        with self._lock:
+            for path in files:
+                if base_shas and path in base_shas: expected[path] = base_shas[path]
+                elif path in self._cache: expected[path] = self._cache[path]['sha']
+
+        for attempt in range(max_attempts):
+            ref = self.repo.get_git_ref(ref_name)
+            head = self.repo.get_git_commit(ref.object.sha)
+            stale = self._check_base(head.tree.sha, expected)
+            if stale: raise StaleWriteError(stale)
+            tree = self.repo.create_git_tree(elements, base_tree=head.tree)
+            commit = self.repo.create_git_commit(message, tree, [head])
+            try:
+                ref.edit(commit.sha)  # 默认非强制，只接受 fast-forward
+                break
+            except GithubException as e:
+                if e.status != 422 or attempt == max_attempts - 1: raise
+                print(f"⚠️ 分支已被更新，核对后基于最新提交重试 ({attempt+1}/{max_attempts})...")
+
+        with self._lock:
+            for path, content in files.items():
+                data = content if isinstance(content, str) else copy.deepcopy(content)
+                self._cache[path] = {'etag': None, 'sha': git_blob_sha(texts[path]), 'data': data}
+        return commit.sha
+
+def git_blob_sha(text):
+    """本地计算 git blob sha，省掉一次读回请求"""
+    raw = text.encode('utf-8')
+    return hashlib.sha1(b"blob %d\0" % len(raw) + raw).hexdigest()
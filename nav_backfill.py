@@ -0,0 +1,133 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import quote_client
+import trading_calendar
+
+# ==========================================
+# 🧩 历史净值补缺 / 全量导入
+# ==========================================
+# 不再固定抓最近 20 条：先按存储里已有的日期算出缺了哪几段，
+# 再只按日期区间翻页抓这几段 (多只基金并发)，最后统一写入一次。
+#   - 存储里没有的基金：一次性导入全部历史
+#   - 已有基金：中间的空洞 + 最新日期之后到今天 (按交易日历，节假日不算缺口)
+# 交易日历没覆盖到的年份里，节假日空洞第一次会被请求一遍；补过的区间记在 index 的 "backfilled" 里，
+# 之后不再重复请求。
+
+BACKFILL_PAGE_SIZE = 20
+BACKFILL_WORKERS = 4
+# 两段缺口相隔不超过这么多天就合并成一次区间请求
+MERGE_GAP_DAYS = 7
+
+def _to_date(s):
+    return datetime.strptime(s, "%Y-%m-%d").date()
+
+def _trading_days_between(start, end):
+    """(start, end) 开区间内的交易日"""
+    return trading_calendar.trading_days(start + timedelta(days=1), end - timedelta(days=1))
+
+def missing_ranges(dates, today, checked_through=None):
+    """根据已有日期 (升序) 算出需要补抓的区间 [(start, end), ...] (YYYY-MM-DD, 闭区间)
+    checked_through 之前的空洞已经补过 (剩下的都是节假日)，不再计入
+    """
+    if isinstance(today, str): today = _to_date(today)
+    missing = []
+    days = [_to_date(d) for d in dates]
+    floor = _to_date(checked_through) if checked_through else None
+    for prev, cur in zip(days, days[1:]):
+        if floor and cur <= floor: continue
+        missing.extend(_trading_days_between(prev, cur))
+    if days:
+        missing.extend(_trading_days_between(days[-1], today + timedelta(days=1)))
+
+    ranges = []
+    for d in missing:
+        if ranges and (d - ranges[-1][1]).days <= MERGE_GAP_DAYS:
+            ranges[-1][1] = d
+        else:
+            ranges.append([d, d])
+    return [(s.isoformat(), e.isoformat()) for s, e in ranges]
+
+def fetch_pages(fund_code, start_date="", end_date=""):
+    """按日期区间翻页抓取 (不传区间即全部历史)：第一页拿到总条数，再只请求剩下需要的页
+    返回 LSJZList；任何一页请求失败返回 None
+    """
+    rows, total = quote_client.get_nav_page(fund_code, 1, BACKFILL_PAGE_SIZE, start_date, end_date)
+    if rows is None: return None
+    pages = -(-total // BACKFILL_PAGE_SIZE)
+    for page in range(2, pages + 1):
+        more, _ = quote_client.get_nav_page(fund_code, page, BACKFILL_PAGE_SIZE, start_date, end_date)
+        if more is None: return None
+        if not more: break
+        rows.extend(more)
+    return rows
+
+def nav_items(rows):
+    """LSJZList -> [(日期, 涨跌幅%)]，解析失败的行跳过"""
+    items = []
+    for item in rows:
+        try:
+            items.append((item["FSRQ"], float(item["JZZZL"]) if item["JZZZL"] else 0.0))
+        except: pass
+    return items
+
+def plan_backfill(nav_store, fund_codes, today, full=()):
+    """返回 {基金名: None(全量导入) 或 [(start, end), ...]}，不需要补的基金不出现"""
+    plan = {}
+    for name in fund_codes:
+        if name in full or name not in nav_store:
+            plan[name] = None
+            continue
+        entry = nav_store.index[name]
+        if entry['last'] >= today and entry.get('backfilled', '') >= entry['last']: continue
+        ranges = missing_ranges(nav_store.series(name).dates, today, entry.get('backfilled'))
+        if ranges: plan[name] = ranges
+    return plan
+
+def _fetch_plan(code, ranges):
+    """返回 (LSJZList, 是否全部请求成功)"""
+    if ranges is None:
+        rows = fetch_pages(code)
+        return rows or [], rows is not None
+    rows, ok = [], True
+    for start, end in ranges:
+        part = fetch_pages(code, start, end)
+        if part is None: ok = False
+        else: rows.extend(part)
+    return rows, ok
+
+def backfill(nav_store, fund_codes, today=None, full=(), workers=BACKFILL_WORKERS):
+    """补齐 fund_codes ({基金名: 基金代码}) 在 nav_store 里缺失的净值
+    只写内存，由调用方统一落盘 / 提交；已有日期不覆盖。返回 {基金名: 新增条数}
+    """
+    today = today or date.today().isoformat()
+    plan = plan_backfill(nav_store, fund_codes, today, full)
+    if not plan: return {}
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(plan))) as pool:
+        fetched = dict(zip(plan, pool.map(_fetch_plan, [fund_codes[n] for n in plan], plan.values())))
+
+    added = {}
+    for name, (rows, ok) in fetched.items():
+        items = sorted(nav_items(rows))
+        count = nav_store.extend(name, [(d, v) for d, v in items if nav_store.get(name, d) is None])
+        if ok and name in nav_store:
+            # 全部请求成功：到最新日期为止的空洞都核对过了，剩下的是节假日
+            nav_store.mark_backfilled(name, nav_store.last_date(name))
+        if count: added[name] = count
+    return added
+
+if __name__ == "__main__":
+    # python nav_backfill.py [--full]   补齐 nightly_check 里所有基金的缺口 (--full 重新全量导入)
+    from nav_store import NavStore
+    from nightly_check import FUND_CODES_MAP
+
+    store = NavStore()
+    full = tuple(FUND_CODES_MAP) if "--full" in sys.argv[1:] else ()
+    added = backfill(store, FUND_CODES_MAP, full=full)
+    store.flush()
+    store.export_json('nav_history.json')
+    for name, count in added.items():
+        print(f"✅ {name.split('(')[0]}: 补入 {count} 条")
+    if not added: print("没有需要补的净值")
@@ -0,0 +1,296 @@
+import hashlib
+import json
+import os
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+
+# ==========================================
+# 🗄️ 净值历史存储 (列式、只追加)
+# ==========================================
+# 目录结构：
+#   nav_store/index.json      {基金名: {"file": 文件名, "last": 最新日期, "last_value": 最新涨幅, "count": 条数, "stats": {...},
+#                                      "backfilled": 已补抓核对到的日期}}
+#   nav_store/<file>.csv      每行 "YYYY-MM-DD,涨跌幅%"，按日期升序
+# 每只基金在内存里是一个有序日期数组 + 一个 float 数组：
+#   - 追加最新一天：O(1)，落盘时只往文件末尾追加一行
+#   - 按日期 / 区间查询：二分，O(log n)
+#   - 懒加载：只读 index.json 就能回答“最新日期 / 今天是否已有净值”，用到时才读具体基金的文件
+#   - 统计指标 (昨日涨幅、连涨连跌、5/20/60 日收益与波动率) 在写入时增量维护，存在 index.json 的 stats 里，
+#     看板只需查表
+# nav_history.json 作为兼容镜像保留 (export_json)。
+
+NAV_STORE_DIR = "nav_store"
+INDEX_FILE = "index.json"
+# 预计算的滚动窗口 (交易日)
+STAT_WINDOWS = (5, 20, 60)
+
+class NavSeries:
+    """单只基金的净值涨跌幅序列：dates 升序 (YYYY-MM-DD 字符串)，values 为对应的 float 数组"""
+    __slots__ = ("dates", "values")
+
+    def __init__(self, dates=None, values=None):
+        self.dates = list(dates or [])
+        self.values = array('d', values or [])
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def last_date(self):
+        return self.dates[-1] if self.dates else None
+
+    def get(self, date):
+        i = bisect_left(self.dates, date)
+        if i < len(self.dates) and self.dates[i] == date:
+            return self.values[i]
+        return None
+
+    def range(self, start=None, end=None):
+        """返回 [start, end] 闭区间内的 (dates, values)"""
+        lo = bisect_left(self.dates, start) if start else 0
+        hi = bisect_right(self.dates, end) if end else len(self.dates)
+        return self.dates[lo:hi], self.values[lo:hi]
+
+    def put(self, date, value):
+        """写入一条记录，返回 'append' / 'insert' / 'update' / None(无变化)"""
+        if not self.dates or date > self.dates[-1]:
+            self.dates.append(date)
+            self.values.append(value)
+            return 'append'
+        i = bisect_left(self.dates, date)
+        if i < len(self.dates) and self.dates[i] == date:
+            if self.values[i] == value: return None
+            self.values[i] = value
+            return 'update'
+        self.dates.insert(i, date)
+        self.values.insert(i, value)
+        return 'insert'
+
+    def to_csv(self):
+        return "".join(f"{d},{v!r}\n" for d, v in zip(self.dates, self.values))
+
+    @classmethod
+    def from_csv(cls, text):
+        series = cls()
+        for line in text.splitlines():
+            if not line.strip(): continue
+            d, v = line.split(',', 1)
+            series.put(d, float(v))
+        return series
+
+def _window_stats(values, stats):
+    """最近 N 个交易日的累计收益 (%) 和日涨幅标准差 (%)，只看序列尾部，与历史长度无关"""
+    for n in STAT_WINDOWS:
+        tail = values[-n:]
+        if len(tail) < n:
+            stats[f"ret_{n}"] = None
+            stats[f"vol_{n}"] = None
+            continue
+        growth = 1.0
+        for v in tail: growth *= 1 + v / 100
+        mean = sum(tail) / n
+        stats[f"ret_{n}"] = round((growth - 1) * 100, 4)
+        stats[f"vol_{n}"] = round((sum((v - mean) ** 2 for v in tail) / (n - 1)) ** 0.5, 4)
+    return stats
+
+def _streak_type(value):
+    return "up" if value > 0 else "down" if value < 0 else "flat"
+
+def compute_stats(series):
+    """从整条序列重新计算统计 (插入 / 修改历史数据时使用)"""
+    if not series.dates: return None
+    values = series.values
+    streak_type = _streak_type(values[-1])
+    streak = 1
+    if streak_type != "flat":
+        for v in reversed(values[:-1]):
+            if _streak_type(v) != streak_type: break
+            streak += 1
+    stats = {"last_date": series.dates[-1], "yesterday": values[-1], "streak": streak, "streak_type": streak_type}
+    return _window_stats(values, stats)
+
+def advance_stats(stats, series):
+    """追加了最新一天之后的增量更新：连涨连跌 O(1)，滚动窗口只看尾部"""
+    if not stats or len(series) < 2 or stats.get("last_date") != series.dates[-2]:
+        return compute_stats(series)
+    value = series.values[-1]
+    streak_type = _streak_type(value)
+    if streak_type != "flat" and streak_type == stats["streak_type"]:
+        streak = stats["streak"] + 1
+    else:
+        streak = 1
+    stats = {"last_date": series.dates[-1], "yesterday": value, "streak": streak, "streak_type": streak_type}
+    return _window_stats(series.values, stats)
+
+def _file_stem(name):
+    return hashlib.sha1(name.encode('utf-8')).hexdigest()[:12]
+
+def _read_local(root):
+    def read_text(relpath):
+        path = os.path.join(root, relpath)
+        if not os.path.exists(path): return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    return read_text
+
+class NavStore:
+    """
+    root: 本地目录 (nightly_check 等本地运行场景，flush 直接写文件)
+    read_text: 可选的读取函数 relpath -> str|None，用来从 GitHub 等远端读取；
+               远端场景不调用 flush，而是用 changed_files() 拿到改动后统一提交
+    """
+    def __init__(self, root=NAV_STORE_DIR, read_text=None):
+        self.root = root
+        self._read_text = read_text or _read_local(root)
+        self._index = None
+        self._series = {}
+        self._appended = {}   # name -> 待追加到文件末尾的行
+        self._rewrite = set() # 需要整文件重写的基金
+        self._index_dirty = False
+
+    # --- 读取 ---
+    @property
+    def index(self):
+        if self._index is None:
+            text = self._read_text(INDEX_FILE)
+            self._index = json.loads(text) if text else {}
+        return self._index
+
+    def names(self):
+        return list(self.index.keys())
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def series(self, name):
+        """懒加载某只基金的序列 (不存在时返回空序列)"""
+        s = self._series.get(name)
+        if s is None:
+            entry = self.index.get(name)
+            text = self._read_text(f"{entry['file']}.csv") if entry else None
+            s = NavSeries.from_csv(text) if text else NavSeries()
+            self._series[name] = s
+        return s
+
+    def last_date(self, name):
+        entry = self.index.get(name)
+        return entry['last'] if entry else None
+
+    def get(self, name, date):
+        """查询某天的涨跌幅；查最新一天时只看 index，不加载文件"""
+        entry = self.index.get(name)
+        if not entry or date > entry['last']: return None
+        if date == entry['last']: return entry['last_value']
+        return self.series(name).get(date)
+
+    def range(self, name, start=None, end=None):
+        return self.series(name).range(start, end)
+
+    def stats(self, name):
+        """预计算的统计指标 (只读 index)；旧数据没有 stats 时现算一次"""
+        entry = self.index.get(name)
+        if not entry: return None
+        if 'stats' not in entry:
+            entry['stats'] = compute_stats(self.series(name))
+            self._index_dirty = True
+        return entry['stats']
+
+    # --- 写入 ---
+    def append(self, name, date, value):
+        """写入一条记录，返回是否有变化。新日期晚于已有数据时只追加，否则标记整文件重写"""
+        value = float(value)
+        s = self.series(name)
+        op = s.put(date, value)
+        if op is None: return False
+        if op == 'append' and name not in self._rewrite:
+            self._appended.setdefault(name, []).append(f"{date},{value!r}\n")
+        else:
+            self._rewrite.add(name)
+            self._appended.pop(name, None)
+        entry = self.index.setdefault(name, {'file': _file_stem(name)})
+        entry.update({'last': s.dates[-1], 'last_value': s.values[-1], 'count': len(s)})
+        entry['stats'] = advance_stats(entry.get('stats'), s) if op == 'append' else compute_stats(s)
+        self._index_dirty = True
+        return True
+
+    def extend(self, name, items):
+        """批量写入 [(date, value), ...]，返回新增/变化条数"""
+        return sum(1 for d, v in items if self.append(name, d, v))
+
+    def mark_backfilled(self, name, date):
+        """记录 date 之前的缺口已经补抓核对过 (nav_backfill 用来跳过节假日空洞)"""
+        entry = self.index.get(name)
+        if not entry or entry.get('backfilled') == date: return
+        entry['backfilled'] = date
+        self._index_dirty = True
+
+    def changed_files(self):
+        """返回本次改动涉及的文件 {relpath: 完整内容}，用于远端提交 (只含有变化的基金)"""
+        files = {}
+        for name in set(self._appended) | self._rewrite:
+            files[f"{self.index[name]['file']}.csv"] = self.series(name).to_csv()
+        if self._index_dirty:
+            files[INDEX_FILE] = json.dumps(self.index, indent=4, ensure_ascii=False)
+        return files
+
+    def mark_clean(self):
+        self._appended.clear()
+        self._rewrite.clear()
+        self._index_dirty = False
+
+    def flush(self):
+        """写回本地目录：只追加的基金直接 append 到文件末尾，其他的整文件重写"""
+        if not (self._appended or self._rewrite or self._index_dirty): return False
+        os.makedirs(self.root, exist_ok=True)
+        for name, lines in self._appended.items():
+            with open(os.path.join(self.root, f"{self.index[name]['file']}.csv"), 'a', encoding='utf-8') as f:
+                f.writelines(lines)
+        for name in self._rewrite:
+            with open(os.path.join(self.root, f"{self.index[name]['file']}.csv"), 'w', encoding='utf-8') as f:
+                f.write(self.series(name).to_csv())
+        with open(os.path.join(self.root, INDEX_FILE), 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, indent=4, ensure_ascii=False)
+        self.mark_clean()
+        return True
+
+    # --- 兼容 nav_history.json ---
+    def as_dict(self):
+        """{基金名: {日期: 涨跌幅}} (日期倒序)，与旧版 nav_history.json 结构一致"""
+        result = {}
+        for name in self.names():
+            s = self.series(name)
+            result[name] = {d: v for d, v in zip(reversed(s.dates), reversed(s.values))}
+        return result
+
+    def export_json(self, path='nav_history.json'):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.as_dict(), f, indent=4, ensure_ascii=False)
+
+    @classmethod
+    def from_dict(cls, mapping, root=NAV_STORE_DIR):
+        store = cls(root)
+        store._index = {}
+        for name, history in mapping.items():
+            store.extend(name, sorted(history.items()))
+        return store
+
+if __name__ == "__main__":
+    # 一次性迁移：python nav_store.py migrate [nav_history.json]
+    if len(sys.argv) >= 2 and sys.argv[1] == "migrate":
+        src = sys.argv[2] if len(sys.argv) > 2 else 'nav_history.json'
+        with open(src, 'r', encoding='utf-8') as f:
+            store = NavStore.from_dict(json.load(f))
+        store._rewrite.update(store.names())
+        store._appended.clear()
+        store.flush()
+        print(f"✅ 已迁移 {len(store.names())} 只基金到 {store.root}/")
+    elif len(sys.argv) >= 2 and sys.argv[1] == "rebuild-stats":
+        store = NavStore()
+        for name in store.names():
+            store.index[name]['stats'] = compute_stats(store.series(name))
+        store._index_dirty = True
+        store.flush()
+        print(f"✅ 已重建 {len(store.names())} 只基金的统计指标")
+    else:
+        print("用法: python nav_store.py migrate [nav_history.json] | rebuild-stats")
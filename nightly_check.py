@@ -1,9 +1,15 @@
-import requests
 import time
 import json
 import os
 import sys
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import nav_backfill
+import notifier
+import quote_client
+import trading_calendar
+from nav_store import NavStore
 
 # Force UTF-8 output for Windows terminals
 sys.stdout.reconfigure(encoding='utf-8')
@@ -72,7 +78,7 @@ def get_official_nav_pct(fund_code):
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
     }
     try:
-        r = requests.get(url, headers=headers, timeout=5)
+        r = quote_client.get(url, headers=headers)
         if r.status_code == 200:
             res = r.json()
             if "Data" in res and "LSJZList" in res["Data"]:
@@ -90,32 +96,83 @@ def get_official_nav_pct(fund_code):
         print(f"Error fetching {fund_code}: {e}")
     return None, None, None
 
+NOTIFIER = notifier.Notifier(notifier.build_channels(BARK_KEY, PUSHPLUS_TOKEN))
+
 def send_notification(title, content):
-    """统一发送通知 (Bark + PushPlus)"""
-    print(f"[MSG] 准备发送通知: {title}")
+    """统一发送通知 (Bark + PushPlus 并发，失败的进 outbox 下次补发)"""
+    return NOTIFIER.send(title, content)
+
+# ==========================================
+# ⏱️ 轮询调度：按基金各自的历史公布时间自适应
+# ==========================================
+# 每只基金单独排期：预期公布时间前后 DENSE_WINDOW 分钟内每分钟查一次，
+# 离得远就稀疏地查，过了预期还没出就指数退避；全部到齐立即退出。
+
+PUBLISH_LOG_FILE = os.path.join('nav_store', 'publish_times.json')
+PUBLISH_LOG_KEEP = 30                   # 每只基金保留最近 30 次公布时间
+DEFAULT_PUBLISH_MINUTE = 20 * 60 + 30   # 没有历史记录时假设 20:30 左右公布
+DENSE_WINDOW = 20
+DENSE_INTERVAL = 60
+SPARSE_INTERVAL = 600
+POLL_WORKERS = 4
+DEADLINE_MINUTE = 22 * 60               # 北京时间 22:00 软截止，到点还没全齐也发报告
+
+def bj_datetime():
+    # 时区修正：GitHub Action 跑在 UTC，需+8小时转为北京时间
+    return trading_calendar.bj_now()
+
+def minute_of_day(dt):
+    return dt.hour * 60 + dt.minute
+
+def expected_publish_minute(times):
+    """历史公布时间 (HH:MM 列表) 的中位数，换算成当天第几分钟"""
+    if not times: return DEFAULT_PUBLISH_MINUTE
+    minutes = sorted(int(t[:2]) * 60 + int(t[3:5]) for t in times)
+    return minutes[len(minutes) // 2]
+
+def next_poll_delay(now_minute, expected, misses):
+    """距离下一次查询的秒数"""
+    if now_minute < expected - DENSE_WINDOW:
+        # 还早：直接睡到密集窗口开始 (最多 SPARSE_INTERVAL)
+        return min(SPARSE_INTERVAL, (expected - DENSE_WINDOW - now_minute) * 60)
+    if now_minute <= expected + DENSE_WINDOW:
+        return DENSE_INTERVAL
+    # 过了预期时间还没出：60s, 120s, 240s ... 最多 SPARSE_INTERVAL
+    return min(DENSE_INTERVAL * 2 ** misses, SPARSE_INTERVAL)
+
+def send_report(funds_config, nav_store, today_str, updated_count, total_funds, missing_funds):
+    is_all_updated = not missing_funds
+    report_type = "全量更新" if is_all_updated else "部分更新"
+
+    total_profit = 0
+    total_principal = 0
+    msg_lines = []
     
-    # 1. Push Bark
-    if BARK_KEY:
-        try:
-            # 兼容完整URL或纯Key
-            base_url = BARK_KEY if BARK_KEY.startswith("http") else f"https://api.day.app/{BARK_KEY}/"
-            clean_url = base_url.rstrip('/')
-            requests.get(f"{clean_url}/{title}/{content}?group=fund")
-        except: pass
+    for name, info in funds_config.items():
+        principal = info.get('holding_value', 0)
+        total_principal += principal
+        
+        # 找今天的涨幅 (存储的是百分比)
+        pct = nav_store.get(name, today_str)
+        
+        if pct is not None:
+            profit = principal * pct / 100
+            total_profit += profit
+            icon = "🔴" if pct > 0 else "🟢" if pct < 0 else "⚪"
+            msg_lines.append(f"{icon} {name.split('(')[0]}: {pct:+.2f}% (¥{profit:+.0f})")
+        else:
+            msg_lines.append(f"⏳ {name.split('(')[0]}: 待更新...")
 
-    # 2. Push PushPlus
-    if PUSHPLUS_TOKEN and len(PUSHPLUS_TOKEN) > 5:
-        try:
-            pp_url = "http://www.pushplus.plus/send"
-            pp_data = {
-                "token": PUSHPLUS_TOKEN,
-                "title": title,
-                "content": content.replace("\n", "<br>"), # HTML换行
-                "template": "html"
-            }
-            requests.post(pp_url, json=pp_data)
-        except Exception as e:
-            print(f"PushPlus Error: {e}")
+    yield_rate = (total_profit / total_principal * 100) if total_principal > 0 else 0
+    
+    # 标题区分
+    final_title = f"{report_type}: {total_profit:+.0f} ({yield_rate:+.2f}%)"
+    final_body = f"📅 {today_str} 净值 ({updated_count}/{total_funds})\n\n" + "\n".join(msg_lines)
+    
+    if not is_all_updated:
+        final_body += f"\n\n⚠️ 未更新: {', '.join(missing_funds)}"
+    
+    send_notification(final_title, final_body)
 
 # ==========================================
 # 🚀 主循环逻辑
@@ -123,161 +180,100 @@ def send_notification(title, content):
 
 def run_check():
     print("🌙 Nightly Check Started...")
+    # 先补发上次没送达的通知
+    NOTIFIER.drain()
+
+    # 非交易日没有新净值，不轮询也不发报告
+    if not trading_calendar.is_trading_day(bj_datetime()):
+        print(f"📅 {bj_datetime().strftime('%Y-%m-%d')} 休市，无需更新净值")
+        return
     
     funds_config = load_json('funds.json')
-    nav_cache = load_json('nav_history.json')
+    nav_store = NavStore()
+    publish_log = load_json(PUBLISH_LOG_FILE)
     
-    # 时区修正：GitHub Action 跑在 UTC，需+8小时转为北京时间
-    # 无论是本地还是云端，统一用这个“北京时间”对象来判断
-    bj_now = datetime.utcnow() + timedelta(hours=8)
+    # 无论是本地还是云端，统一用“北京时间”来判断
+    bj_now = bj_datetime()
     today_str = bj_now.strftime("%Y-%m-%d")
     print(f"📅 目标日期: {today_str} (当前时间: {bj_now.strftime('%H:%M')})")
 
-    # ==========================
-    # 🕒 等待逻辑：直到晚上 20:00
-    # ==========================
-    while True:
-        # 刷新时间
-        bj_now = datetime.utcnow() + timedelta(hours=8)
-        
-        # 如果是下午或晚上，且不到20点，就等待
-        # 范围：12:00 <= T < 20:00
-        if bj_now.hour >= 12 and bj_now.hour < 20:
-            minutes_to_wait = (20 - bj_now.hour) * 60 - bj_now.minute
-            print(f"[{bj_now.strftime('%H:%M')}] 也就是晚上8点才更新，我先歇会儿... 还有 {minutes_to_wait} 分钟")
-            
-            # 如果剩余时间很多，就睡久点；如果不到了，睡短点
-            sleep_sec = 60 * 10 
-            if minutes_to_wait < 10: sleep_sec = 60
-            time.sleep(sleep_sec) 
-        else:
+    # 过滤出有代码映射的基金（防止 funds.json 里有新基金但代码未配，导致死循环）
+    target_funds = [k for k in funds_config.keys() if k in FUND_CODES_MAP]
+    total_funds = len(target_funds)
+
+    # 先补齐之前漏跑的日期 / 新基金的全部历史 (今天的交给下面的轮询)
+    yesterday_str = trading_calendar.previous_trading_day(bj_now).isoformat()
+    added = nav_backfill.backfill(nav_store, {k: FUND_CODES_MAP[k] for k in target_funds}, yesterday_str)
+    if nav_store.flush():
+        nav_store.export_json('nav_history.json')
+    for name, count in added.items():
+        print(f"   🧩 {name.split('(')[0]} 补入 {count} 条历史净值")
+
+    pending = {}
+    for name in target_funds:
+        if nav_store.get(name, today_str) is not None: continue
+        expected = expected_publish_minute(publish_log.get(name, []))
+        pending[name] = {
+            "code": FUND_CODES_MAP[name],
+            "expected": expected,
+            "misses": 0,
+            "next_at": bj_now,  # 启动时先全部查一次 (重跑 / 提前公布的情况)
+        }
+        print(f"   ⏰ {name.split('(')[0]} 预计 {expected // 60:02d}:{expected % 60:02d} 公布")
+
+    while pending:
+        bj_now = bj_datetime()
+        if minute_of_day(bj_now) >= DEADLINE_MINUTE:
+            print(f"\n⚠️ 超过截止时间 ({DEADLINE_MINUTE // 60}:00)，发送部分报告...")
             break
-            
-    print("⏰ 时间到！开始干活！")
-    
-    # 设置一个截止时间 (例如 北京时间 22:00)
-    # 既然 GitHub Actions 最多跑 6 小时 (从 20:00 开始)，到 02:00 就会被杀掉
-    # 我们设一个 22:00 的“软截止”，如果到点了还没全齐，也发消息
-    deadline_hour = 22
-    deadline_minute = 0 
-    
-    while True:
-        updated_count = 0
-        
-        # 刷新时间
-        bj_now = datetime.utcnow() + timedelta(hours=8)
-        current_time_str = bj_now.strftime("%H:%M:%S")
-        
-        # 过滤出有代码映射的基金（防止 funds.json 里有新基金但代码未配，导致死循环）
-        target_funds = [k for k in funds_config.keys() if k in FUND_CODES_MAP]
-        total_funds = len(target_funds)
-        updates_info = [] # 存储更新详情
-        
-        print(f"[{current_time_str}] 正在轮询接口 (监控 {total_funds} 只基金)...", end="\r")
 
-        # 重新读取缓存，防止多进程写冲突（虽然本地一般单进程）
-        nav_cache = load_json('nav_history.json') 
-        
-        need_save = False
-        missing_funds = []
-
-        for name in target_funds:
-            info = funds_config[name]
-            code = FUND_CODES_MAP.get(name)
-            
-            # 检查该基金今天是否已更新
-            key_name = name
-            if key_name not in nav_cache: nav_cache[key_name] = {}
-            
-            if today_str in nav_cache[key_name]:
-                updated_count += 1
-                # 已经有数据了，不用重复打印，除非是刚抓到的（这里简单处理）
-                continue 
-            
-            # API 查询
-            nav_pct, date_str, t_nav = get_official_nav_pct(code)
-            
-            if date_str == today_str and nav_pct is not None:
-                # ！！！ 发现更新 ！！！
-                # Store PERCENTAGE to be compatible with app.py
-                nav_cache[key_name][date_str] = nav_pct
-                
-                # 如果配置了份额，根据最新净值更新持仓市值
-                if 'shares' in info and t_nav is not None:
-                    new_holding_value = info['shares'] * t_nav
-                    funds_config[name]['holding_value'] = round(new_holding_value, 2)
-                    print(f"   [市值更新] {name.split('(')[0]}: {info.get('holding_value',0)} -> {round(new_holding_value, 2)}")
-                
-                need_save = True
-                updated_count += 1
-                
-                updates_info.append({
-                    "name": name.split('(')[0],
-                    "pct": nav_pct
-                })
-                print(f"\n✅ {name.split('(')[0]} 已更新: {nav_pct:+.2f}%")
-            else:
-                missing_funds.append(name.split('(')[0])
-
-        if need_save:
-            save_json('nav_history.json', nav_cache)
-            save_json('funds.json', funds_config)
-
-        # 检查是否全部更新完毕 OR 超过截止时间
-        is_all_updated = (updated_count >= total_funds)
-        is_past_deadline = (bj_now.hour > deadline_hour) or (bj_now.hour == deadline_hour and bj_now.minute >= deadline_minute)
-        
-        if is_all_updated or is_past_deadline:
-            if is_all_updated:
-                print("\n🎉 所有基金净值已更新！准备发送报告...")
-                report_type = "全量更新"
-            else:
-                print(f"\n⚠️ 超过截止时间 ({deadline_hour}:{deadline_minute})，发送部分报告...")
-                report_type = "部分更新"
-            
-            # 生成报告
-            total_profit = 0
-            total_principal = 0
-            msg_lines = []
-            
-            for name, info in funds_config.items():
-                principal = info.get('holding_value', 0)
-                total_principal += principal
-                
-                # 找今天的涨幅
-                pct = 0
-                key_name = name
-                found_today = False
-                
-                if key_name in nav_cache and today_str in nav_cache[key_name]:
-                     # nav_cache stores PERCENTAGE now, so just use it
-                    pct = nav_cache[key_name][today_str]
-                    found_today = True
-                
-                # 计算收益 (如果还没更新，pct就是0，收益也是0，显示为“待更新”)
-                profit = principal * pct / 100
-                if found_today:
-                    total_profit += profit
-                    icon = "🔴" if pct > 0 else "🟢" if pct < 0 else "⚪"
-                    msg_lines.append(f"{icon} {name.split('(')[0]}: {pct:+.2f}% (¥{profit:+.0f})")
+        due = [name for name, p in pending.items() if p["next_at"] <= bj_now]
+        if due:
+            print(f"[{bj_now.strftime('%H:%M:%S')}] 正在轮询接口 ({len(due)}/{len(pending)} 只基金)...")
+            with ThreadPoolExecutor(max_workers=min(POLL_WORKERS, len(due))) as pool:
+                results = dict(zip(due, pool.map(get_official_nav_pct, [pending[n]["code"] for n in due])))
+
+            need_save = False
+            for name in due:
+                nav_pct, date_str, t_nav = results[name]
+                p = pending[name]
+                if date_str == today_str and nav_pct is not None:
+                    # ！！！ 发现更新 ！！！ (存百分比，与 app.py 一致)
+                    nav_store.append(name, date_str, nav_pct)
+                    info = funds_config[name]
+                    # 如果配置了份额，根据最新净值更新持仓市值
+                    if 'shares' in info and t_nav is not None:
+                        new_holding_value = round(info['shares'] * t_nav, 2)
+                        print(f"   [市值更新] {name.split('(')[0]}: {info.get('holding_value',0)} -> {new_holding_value}")
+                        info['holding_value'] = new_holding_value
+                    # 记录公布时间，下次据此安排轮询
+                    times = publish_log.setdefault(name, [])
+                    times.append(bj_now.strftime("%H:%M"))
+                    del times[:-PUBLISH_LOG_KEEP]
+                    need_save = True
+                    del pending[name]
+                    print(f"✅ {name.split('(')[0]} 已更新: {nav_pct:+.2f}%")
                 else:
-                    msg_lines.append(f"⏳ {name.split('(')[0]}: 待更新...")
-
-            yield_rate = (total_profit / total_principal * 100) if total_principal > 0 else 0
-            
-            # 标题区分
-            final_title = f"{report_type}: {total_profit:+.0f} ({yield_rate:+.2f}%)"
-            final_body = f"📅 {today_str} 净值 ({updated_count}/{total_funds})\n\n" + "\n".join(msg_lines)
-            
-            if not is_all_updated:
-                final_body += f"\n\n⚠️ 未更新: {', '.join(missing_funds)}"
-            
-            send_notification(final_title, final_body)
-            print("✅ 通知已发送，任务结束。")
-            break
-        
-        # 还没更完，休息一下再查
-        time.sleep(180) 
+                    if minute_of_day(bj_now) > p["expected"] + DENSE_WINDOW: p["misses"] += 1
+                    p["next_at"] = bj_now + timedelta(seconds=next_poll_delay(minute_of_day(bj_now), p["expected"], p["misses"]))
+
+            if need_save:
+                # 列式存储只追加新的一行；nav_history.json 作为兼容镜像同步导出
+                nav_store.flush()
+                nav_store.export_json('nav_history.json')
+                save_json('funds.json', funds_config)
+                save_json(PUBLISH_LOG_FILE, publish_log)
+
+        if pending:
+            # 睡到最早一只基金的下一次查询时间
+            wake_at = min(p["next_at"] for p in pending.values())
+            time.sleep(max(1, (wake_at - bj_datetime()).total_seconds()))
+
+    if not pending:
+        print("\n🎉 所有基金净值已更新！准备发送报告...")
+    missing_funds = [name.split('(')[0] for name in pending]
+    send_report(funds_config, nav_store, today_str, total_funds - len(pending), total_funds, missing_funds)
+    print("✅ 通知已发送，任务结束。")
 
 if __name__ == "__main__":
     run_check()
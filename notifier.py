@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+import quote_client
+
+# ==========================================
+# 🔔 通知分发 (daily_check / nightly_check 共用)
+# ==========================================
+# - 所有渠道并发发送，每个渠道单独超时 + 有限次退避重试，整体有截止时间，
+#   某个渠道卡住也不会拖住整个任务
+# - 确认没发出去的消息 (连不上服务端) 写进本地 outbox.json (按渠道记录)，下次运行先补发
+# - 推送请求走不自动重试的 Session，重试只在这里做，且只针对连不上 / 5xx / 429；
+#   读超时、截止时间到了还在等响应的，说明请求可能已经到了服务端，不重发也不进 outbox (宁可漏一条也不重复推送)；
+#   已经在某个渠道送达的消息不会再往这个渠道发
+# - 接口地址可以用环境变量 BARK_SERVER / PUSHPLUS_URL 指向本地桩服务做测试
+
+OUTBOX_FILE = "outbox.json"
+BARK_SERVER = os.getenv("BARK_SERVER", "https://api.day.app")
+PUSHPLUS_URL = os.getenv("PUSHPLUS_URL", "http://www.pushplus.plus/send")
+
+MAX_ATTEMPTS = 3
+BACKOFF = 1.0          # 重试间隔 1s, 2s
+SEND_DEADLINE = 30     # 一次分发最多等待的秒数
+OUTBOX_MAX_AGE = timedelta(days=2)  # 太旧的消息补发也没意义，直接丢弃
+
+# 单个渠道的投递结果：只有 UNSENT (请求根本没发出去) 会进 outbox 补发；
+# UNKNOWN (可能已送达) 和 REJECTED (服务端明确拒绝，重发也没用) 都不再补发
+SENT, UNSENT, UNKNOWN, REJECTED = "sent", "unsent", "unknown", "rejected"
+
+class DeliveryError(Exception):
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+def _check_response(r):
+    """HTTP 状态 + 业务返回码都是 200 才算送达"""
+    if r.status_code == 429 or r.status_code >= 500:
+        raise DeliveryError(f"HTTP {r.status_code}")
+    if r.status_code != 200:
+        raise DeliveryError(f"HTTP {r.status_code}", retryable=False)
+    try:
+        code = r.json().get("code", 200)
+    except ValueError:
+        return
+    if code != 200:
+        raise DeliveryError(f"code={code}", retryable=False)
+
+class BarkChannel:
+    name = "bark"
+
+    def __init__(self, key):
+        # 兼容完整URL或纯Key
+        base_url = key if key.startswith("http") else f"{BARK_SERVER}/{key}/"
+        self.base_url = base_url.rstrip('/')
+
+    def send(self, title, body):
+        url = f"{self.base_url}/{quote(title, safe='')}/{quote(body, safe='')}?group=fund"
+        _check_response(quote_client.get(url, retry=False))
+
+class PushPlusChannel:
+    name = "pushplus"
+
+    def __init__(self, token):
+        self.token = token
+
+    def send(self, title, body):
+        pp_data = {
+            "token": self.token,
+            "title": title,
+            "content": body.replace("\n", "<br>"), # HTML换行
+            "template": "html"
+        }
+        _check_response(quote_client.post(PUSHPLUS_URL, json=pp_data, retry=False))
+
+def build_channels(bark_key=None, pushplus_token=None):
+    channels = []
+    if bark_key: channels.append(BarkChannel(bark_key))
+    if pushplus_token and len(pushplus_token) > 5: channels.append(PushPlusChannel(pushplus_token))
+    return channels
+
+def _is_connect_error(e):
+    """请求还没发出去就失败了 (DNS / 建连失败 / 建连超时)，重发不会造成重复推送"""
+    if isinstance(e, requests.exceptions.ConnectTimeout): return True
+    if isinstance(e, requests.exceptions.ConnectionError):
+        reason = getattr(e.args[0], 'reason', e.args[0]) if e.args else None
+        return isinstance(reason, NewConnectionError)
+    return False
+
+def _deliver(channel, title, body):
+    """单个渠道带退避的重试，返回 SENT / UNSENT / UNKNOWN / REJECTED"""
+    result = UNSENT
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            channel.send(title, body)
+            return SENT
+        except DeliveryError as e:
+            print(f"❌ {channel.name} 推送失败: {e}")
+            if not e.retryable: return REJECTED
+            result = REJECTED
+        except requests.exceptions.ReadTimeout:
+            print(f"⚠️ {channel.name} 响应超时，可能已送达，不再重发")
+            return UNKNOWN
+        except Exception as e:
+            print(f"❌ {channel.name} 推送异常: {e}")
+            if not _is_connect_error(e): return UNKNOWN
+            result = UNSENT
+        if attempt < MAX_ATTEMPTS - 1: time.sleep(BACKOFF * 2 ** attempt)
+    return result
+
+class Notifier:
+    def __init__(self, channels, outbox_path=OUTBOX_FILE, deadline=SEND_DEADLINE):
+        self.channels = {c.name: c for c in channels}
+        self.outbox_path = outbox_path
+        self.deadline = deadline
+
+    def send(self, title, body):
+        """发往所有渠道，返回是否全部确认送达；没发出去的部分进 outbox"""
+        print(f"[MSG] 准备发送通知: {title}")
+        created = datetime.now().isoformat(timespec='seconds')
+        msg_id = hashlib.sha1(f"{created}|{title}|{body}".encode('utf-8')).hexdigest()[:16]
+        msg = {"id": msg_id, "title": title, "body": body, "created": created, "pending": list(self.channels)}
+        results = self._dispatch([msg])
+        return all(r == SENT for r in results.values())
+
+    def drain(self):
+        """补发 outbox 里上次没发出去的消息，返回重新进 outbox 的条数"""
+        messages = self._load_outbox()
+        if not messages: return 0
+        cutoff = (datetime.now() - OUTBOX_MAX_AGE).isoformat(timespec='seconds')
+        fresh = [m for m in messages if m["created"] >= cutoff]
+        if len(fresh) < len(messages):
+            print(f"🗑️ 丢弃 {len(messages) - len(fresh)} 条过期的待发通知")
+        print(f"📮 补发 {len(fresh)} 条待发通知...")
+        results = self._dispatch(fresh, replace_outbox=True)
+        return len({msg_id for (msg_id, _), r in results.items() if r == UNSENT})
+
+    def _dispatch(self, messages, replace_outbox=False):
+        """返回 {(消息 id, 渠道名): 投递结果}；截止时间到了还没返回的记为 UNKNOWN (请求可能还会成功，不补发)"""
+        results = {}
+        lock = threading.Lock()
+
+        def run(msg, name, channel):
+            result = _deliver(channel, msg["title"], msg["body"])
+            with lock: results[(msg["id"], name)] = result
+
+        # 守护线程：截止时间到了还没返回的请求直接放弃等待，不阻塞进程退出
+        threads = []
+        for msg in messages:
+            for name in msg["pending"]:
+                channel = self.channels.get(name)
+                if channel is None: continue
+                t = threading.Thread(target=run, args=(msg, name, channel), name=f"notify-{name}", daemon=True)
+                t.start()
+                threads.append(t)
+        end = time.time() + self.deadline
+        for t in threads:
+            t.join(max(0, end - time.time()))
+
+        undelivered = []
+        with lock:
+            for msg in messages:
+                for name in msg["pending"]:
+                    if name in self.channels and (msg["id"], name) not in results:
+                        results[(msg["id"], name)] = UNKNOWN
+                        print(f"⚠️ {name} 到截止时间仍未返回，可能已送达，不再补发")
+                pending = [name for name in msg["pending"] if results.get((msg["id"], name)) == UNSENT]
+                if pending: undelivered.append(dict(msg, pending=pending))
+            results = dict(results)
+        if replace_outbox:
+            self._save_outbox(undelivered)
+        elif undelivered:
+            self._save_outbox(self._load_outbox() + undelivered)
+        if undelivered:
+            print(f"📮 {len(undelivered)} 条通知没发出去，已存入 {self.outbox_path}")
+        return results
+
+    def _load_outbox(self):
+        if not os.path.exists(self.outbox_path): return []
+        try:
+            with open(self.outbox_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except: return []
+
+    def _save_outbox(self, messages):
+        if not messages and not os.path.exists(self.outbox_path): return
+        tmp = self.outbox_path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(messages, f, indent=4, ensure_ascii=False)
+        os.replace(tmp, self.outbox_path)
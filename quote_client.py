@@ -0,0 +1,412 @@
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import trading_calendar
+
+# ==========================================
+# 📡 行情客户端 (app.py / daily_check.py / nightly_check.py 共用)
+# ==========================================
+# 全进程共享一个 requests.Session：复用 TCP 连接和 DNS 结果，
+# 30 秒一次的看板刷新不再每次重新握手。
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# 各接口的 (连接超时, 读取超时)，单位秒
+HOST_TIMEOUTS = {
+    'qt.gtimg.cn': (2, 3),
+    'web.ifzq.gtimg.cn': (3, 8),
+    'fundgz.1234567.com.cn': (2, 4),
+    'api.fund.eastmoney.com': (3, 5),
+    'fundf10.eastmoney.com': (3, 5),
+    'api.day.app': (3, 10),
+    'www.pushplus.plus': (3, 10),
+    'api.github.com': (3, 10),
+}
+DEFAULT_TIMEOUT = (3, 5)
+
+# 有限次重试 + 指数退避 (0.3s, 0.6s)，只对幂等的 GET 生效；推送走 get_session(retry=False)，完全不在这层重试
+RETRY_POLICY = Retry(
+    total=2,
+    connect=2,
+    read=2,
+    backoff_factor=0.3,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset(["GET", "HEAD"]),
+    raise_on_status=False,
+)
+
+_sessions = {}
+_session_lock = threading.Lock()
+
+def get_session(retry=True):
+    """返回全局共享的 Session (懒加载，线程安全)
+    retry=False 的 Session 不做任何自动重试 (推送通知用，是否重发由调用方决定，避免重复推送)
+    """
+    s = _sessions.get(retry)
+    if s is None:
+        with _session_lock:
+            s = _sessions.get(retry)
+            if s is None:
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=RETRY_POLICY if retry else 0)
+                s.mount("http://", adapter)
+                s.mount("https://", adapter)
+                s.headers.update({"User-Agent": USER_AGENT})
+                _sessions[retry] = s
+    return s
+
+def host_timeout(url):
+    return HOST_TIMEOUTS.get(urlsplit(url).hostname or "", DEFAULT_TIMEOUT)
+
+def request(method, url, retry=True, **kwargs):
+    """走共享 Session 发请求；未显式传 timeout 时按域名取默认值"""
+    kwargs.setdefault("timeout", host_timeout(url))
+    return get_session(retry).request(method, url, **kwargs)
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+# === 🕷️ 腾讯行情 (qt.gtimg.cn) ===
+
+# 一条记录: v_sh600000="1~名称~代码~现价~昨收~今开~...~时间(下标30)~...";
+# 只取下标 1/3/4/30 四个字段，一次正则匹配直接定位，不把 80 多个字段切成列表
+_QUOTE_RE = re.compile(
+    r'v_([^=\s"]*)="[^~"]*~([^~"]*)~[^~"]*~([^~"]*)~([^~"]*)'
+    r'(?:~(?:[^~"]*~){25}([^~"]*))?'
+)
+
+def iter_quotes(text):
+    """逐条产出 (code, name, price, prev_close, timestamp)，都是原始字符串
+    字段不足 5 个的记录 (如无效代码返回的 v_pv_none_match="1") 直接跳过；没有时间字段时 timestamp 为 ""
+    """
+    for m in _QUOTE_RE.finditer(text):
+        yield m.group(1).rpartition('_')[2], m.group(2), m.group(3), m.group(4), m.group(5) or ""
+
+def parse_quotes(text):
+    """解析 qt.gtimg.cn 返回的文本
+    返回 {code: {'name':..., 'change': 涨跌幅%, 'date': 'YYYY-MM-DD'}}
+    """
+    price_data = {}
+    for code, name, price, prev_close, raw_time in iter_quotes(text):
+        try:
+            current = float(price)
+            close = float(prev_close)
+        except ValueError: continue
+        pct = ((current - close) / close) * 100 if close > 0 else 0.0
+        # 下标 30 为行情时间 (A 股: 20231027153000；港股: 2023/10/27 16:08:05)
+        if not raw_time.isdigit(): raw_time = re.sub(r'\D', '', raw_time)
+        data_date = f"{raw_time[:4]}-{raw_time[4:6]}-{raw_time[6:8]}" if len(raw_time) >= 8 else ""
+        price_data[code] = {'name': name.replace(" ", ""), 'change': pct, 'date': data_date}
+    return price_data
+
+QUOTE_URL = "http://qt.gtimg.cn/q="
+# 单次请求的代码数 / URL 长度上限 (上游对过长 URL 会直接拒绝)
+MAX_CODES_PER_REQUEST = 60
+MAX_URL_LENGTH = 1800
+QUOTE_WORKERS = 4
+
+def chunk_codes(stock_codes, max_codes=MAX_CODES_PER_REQUEST, max_url_len=MAX_URL_LENGTH):
+    """按代码数和 URL 长度把代码列表切成若干批 (去重、保持原顺序)"""
+    chunks = []
+    current = []
+    url_len = len(QUOTE_URL)
+    for code in dict.fromkeys(stock_codes):
+        extra = len(code) + (1 if current else 0)
+        if current and (len(current) >= max_codes or url_len + extra > max_url_len):
+            chunks.append(current)
+            current = []
+            url_len = len(QUOTE_URL)
+            extra = len(code)
+        current.append(code)
+        url_len += extra
+    if current: chunks.append(current)
+    return chunks
+
+def _fetch_quote_chunk(codes):
+    url = QUOTE_URL + ",".join(codes)
+    try:
+        r = get(url)
+        if r.status_code != 200:
+            print(f"⚠️ 行情接口返回 {r.status_code} ({len(codes)} 个代码)")
+            return None
+        return parse_quotes(r.text)
+    except Exception as e:
+        print(f"⚠️ 行情请求异常: {e} ({len(codes)} 个代码)")
+        return None
+
+# === 🌏 跨市场折算 (港股 / 美股) ===
+# 港股、美股的涨跌幅是以港币 / 美元计的，人民币计价的基金净值还要叠加汇率的变化：
+#   effective = (1 + 本地涨跌幅) × (1 + 汇率涨跌幅) - 1
+# 汇率和股票放在同一批请求里 (不多一次往返)。行情日期早于本批 A 股行情日期的 (港股假期、美股隔夜) 标记为 stale，
+# 估值时当作没有行情。'change' 保持本地涨跌幅不变 (看板展示用)，估值用 'effective'。
+
+MARKETS = {'sh': 'cn', 'sz': 'cn', 'bj': 'cn', 'hk': 'hk', 'us': 'us'}
+FX_CODES = {'hk': 'whHKDCNY', 'us': 'whUSDCNY'}
+FX_MAX_MOVE = 5.0  # 汇率单日涨跌超过这个幅度 (%) 视为脏数据，不做折算
+
+def market_of(code):
+    return MARKETS.get(code[:2], 'other')
+
+def fx_codes_for(codes):
+    """这些代码需要的汇率行情代码"""
+    return {FX_CODES[m] for m in map(market_of, codes) if m in FX_CODES}
+
+def apply_cross_market(price_data, session_date=None):
+    """给港股 / 美股行情补上 'fx_change'、'effective' (人民币口径涨跌幅) 和 'stale' (所在市场本交易日没开盘)"""
+    if session_date is None:
+        cn_dates = [d['date'] for c, d in price_data.items() if market_of(c) == 'cn' and d.get('date')]
+        session_date = max(cn_dates) if cn_dates else trading_calendar.session_date().isoformat()
+    for code, d in price_data.items():
+        market = market_of(code)
+        if market not in FX_CODES: continue
+        fx = price_data.get(FX_CODES[market])
+        fx_pct = fx['change'] if fx and abs(fx['change']) <= FX_MAX_MOVE else 0.0
+        d['fx_change'] = fx_pct
+        d['effective'] = ((1 + d['change'] / 100) * (1 + fx_pct / 100) - 1) * 100
+        d['stale'] = bool(d.get('date')) and d['date'] < session_date
+    return price_data
+
+def get_realtime_price(stock_codes):
+    """批量获取实时行情
+    代码按批切分后在线程池里并发请求，结果合并；单批失败只丢失该批数据。
+    有港股 / 美股时顺带请求对应汇率，并做跨市场折算 (见 apply_cross_market)。
+    所有批次都失败时返回 None，代码为空返回 {}
+    """
+    if not stock_codes: return {}
+    stock_codes = list(stock_codes) + sorted(fx_codes_for(stock_codes))
+    chunks = chunk_codes(stock_codes)
+    if len(chunks) == 1:
+        results = [_fetch_quote_chunk(chunks[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=min(QUOTE_WORKERS, len(chunks))) as pool:
+            results = list(pool.map(_fetch_quote_chunk, chunks))
+
+    if all(res is None for res in results): return None
+    price_data = {}
+    for res in results:
+        if res: price_data.update(res)
+    return apply_cross_market(price_data)
+
+# === 🏦 天天基金估值 (fundgz.1234567.com.cn) ===
+
+FUND_ESTIMATE_WORKERS = 8
+_JSONPGZ_RE = re.compile(r'jsonpgz\((.+)\)')
+
+def _fetch_fund_estimate(code):
+    url = f"https://fundgz.1234567.com.cn/js/{code}.js"
+    try:
+        r = get(url, headers={"Referer": "http://fund.eastmoney.com/"})
+        m = _JSONPGZ_RE.search(r.text)
+        if not m: return None
+        data = json.loads(m.group(1))
+        # gszzl: 估算涨跌幅 (%), gztime: 估算时间
+        pct_str = data.get('gszzl', '0')
+        gztime = data.get('gztime', '')
+        return {
+            'name': data.get('name', code),
+            'change': float(pct_str) if pct_str else 0.0,
+            'date': gztime[:10] if len(gztime) >= 10 else '',
+        }
+    except: return None
+
+def get_fund_estimates(fund_codes):
+    """并发获取公募基金的实时估算涨跌幅 (代码先去重)
+    返回格式与 get_realtime_price 一致: {code: {'name':..., 'change':..., 'date':...}}
+    """
+    codes = list(dict.fromkeys(fund_codes))
+    if not codes: return {}
+    with ThreadPoolExecutor(max_workers=min(FUND_ESTIMATE_WORKERS, len(codes))) as pool:
+        results = pool.map(_fetch_fund_estimate, codes)
+    return {code: d for code, d in zip(codes, results) if d}
+
+# === 📜 历史净值 (api.fund.eastmoney.com/f10/lsjz) ===
+
+NAV_HEADERS = {"Referer": "http://fund.eastmoney.com/"}
+
+def get_nav_page(fund_code, page_index=1, page_size=20, start_date="", end_date=""):
+    """抓取一页历史净值 (按日期倒序)，返回 (LSJZList, TotalCount)；请求失败返回 (None, 0)"""
+    timestamp = int(time.time() * 1000)
+    url = (f"https://api.fund.eastmoney.com/f10/lsjz?fundCode={fund_code}&pageIndex={page_index}&pageSize={page_size}"
+           f"&startDate={start_date}&endDate={end_date}&_={timestamp}")
+    try:
+        r = get(url, headers=NAV_HEADERS)
+        if r.status_code == 200:
+            res = r.json()
+            data = res.get("Data") or {}
+            if "LSJZList" in data:
+                return data["LSJZList"] or [], int(res.get("TotalCount") or 0)
+    except Exception as e:
+        print(f"⚠️ 净值接口异常 {fund_code}: {e}")
+    return None, 0
+
+# === 📈 指数日线 (web.ifzq.gtimg.cn，信号回测用的基准序列) ===
+
+KLINE_URL = "http://web.ifzq.gtimg.cn/appstock/app/fqkline/get?param={code},day,,,{days},qfq"
+
+def get_index_history(code, days=800):
+    """最近 days 个交易日的日涨跌幅 {date: pct}；请求失败返回 None"""
+    try:
+        r = get(KLINE_URL.format(code=code, days=days))
+        if r.status_code != 200: return None
+        node = (r.json().get("data") or {}).get(code) or {}
+        rows = node.get("qfqday") or node.get("day") or []
+    except Exception as e:
+        print(f"⚠️ 日线接口异常 {code}: {e}")
+        return None
+    # 每行 [日期, 开, 收, 高, 低, 量]，用相邻两天收盘价算涨跌幅
+    out = {}
+    for prev, cur in zip(rows, rows[1:]):
+        try:
+            close, prev_close = float(cur[2]), float(prev[2])
+            if prev_close > 0: out[cur[0]] = (close - prev_close) / prev_close * 100
+        except (ValueError, IndexError): continue
+    return out
+
+# === 🗂️ 进程级共享行情快照 ===
+
+def _quote_state(d):
+    """判断一条行情是否变化时比较的字段 (汇率变了，港股的 effective 也算变化)"""
+    return d['change'], d.get('effective'), d.get('stale')
+
+class SharedQuoteCache:
+    """进程内所有看板会话共用一份行情快照。
+    后台线程每 ttl 秒按所有会话订阅代码的并集抓一次行情，会话只读快照，
+    所以上游请求频率与打开的浏览器标签数无关。
+    开了极速模式的会话额外登记 fast_codes：这部分代码每 fast_ttl 秒单独刷新一次。
+    每个代码记下最近一次变化时的版本号，会话用 snapshot_delta 只拿自己上次之后变化的代码。
+    """
+    # 收盘后再多抓一轮的宽限时间 (秒)，确保拿到的是收盘价
+    CLOSE_GRACE = 60
+
+    def __init__(self, ttl=15, idle_timeout=120, fast_ttl=4):
+        self.ttl = ttl
+        self.fast_ttl = fast_ttl
+        self.idle_timeout = idle_timeout
+        self.version = 0
+        self.updated_at = 0  # 最近一次全量刷新的时间
+        self._market_updated = {}  # 市场 -> 最近一次刷新到该市场行情的时间
+        self._subs = {}  # session_key -> (股票代码, 基金代码, 极速代码, 最近一次访问时间)
+        self._market_data = {}
+        self._fund_data = {}
+        self._code_versions = {}  # code -> 最近一次变化时的 version
+        self._cond = threading.Condition()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def subscribe(self, session_key, stock_codes, fund_codes=(), fast_codes=()):
+        """登记 (或续期) 一个会话关心的代码；长时间不续期的会话会被自动清理"""
+        stock_codes, fund_codes, fast_codes = frozenset(stock_codes), frozenset(fund_codes), frozenset(fast_codes)
+        with self._cond:
+            known_stocks, known_funds, known_fast = set(), set(), set()
+            for s_codes, f_codes, q_codes, _ in self._subs.values():
+                known_stocks |= s_codes; known_funds |= f_codes; known_fast |= q_codes
+            self._subs[session_key] = (stock_codes, fund_codes, fast_codes, time.time())
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="quote-cache", daemon=True)
+                self._thread.start()
+            # 出现之前没人订阅过的代码 (或新开了极速模式) 时立即刷新，不必等到下一个 TTL
+            if not (stock_codes <= known_stocks and fund_codes <= known_funds and fast_codes <= known_fast):
+                self._wake.set()
+
+    def snapshot_delta(self, since=0, wait=5):
+        """返回 (market_data, fund_data, changed, version)
+        changed 为 version > since 之后变化过的代码集合；since 为 0 时返回 None (表示全部当作变化)
+        """
+        with self._cond:
+            if self.version == 0:
+                self._cond.wait_for(lambda: self.version > 0, timeout=wait)
+            if not self._market_data: return None
+            changed = {c for c, v in self._code_versions.items() if v > since} if since else None
+            return self._market_data, self._fund_data, changed, self.version
+
+    def _wanted_codes(self):
+        now = time.time()
+        with self._cond:
+            for key in [k for k, v in self._subs.items() if now - v[3] > self.idle_timeout]:
+                del self._subs[key]
+            stocks, funds, fast = set(), set(), set()
+            for s_codes, f_codes, q_codes, _ in self._subs.values():
+                stocks |= s_codes; funds |= f_codes; fast |= q_codes
+        return stocks, funds, fast
+
+    def refresh(self, fast_only=False, markets=None):
+        """全量刷新；fast_only 时只刷新极速模式登记的代码；
+        markets 给定时只刷新这些市场的股票 (连同汇率)，A 股收盘后单独跟港股用
+        """
+        stocks, funds, fast = self._wanted_codes()
+        if fast_only: stocks, funds = stocks & fast, funds & fast
+        if markets is not None:
+            stocks = {c for c in stocks if market_of(c) in markets}
+            if 'cn' not in markets: funds = set()
+        stocks |= fx_codes_for(stocks)
+        if not stocks and not funds: return
+        market_data = get_realtime_price(sorted(stocks)) if stocks else {}
+        fund_data = get_fund_estimates(sorted(funds)) if funds else {}
+        with self._cond:
+            self.version += 1
+            if fast_only or markets is not None:
+                merged, merged_funds = dict(self._market_data), dict(self._fund_data)
+            else:
+                # 单批失败时保留上一轮的数据，只清理已经没人订阅的代码
+                merged = {c: d for c, d in self._market_data.items() if c in stocks}
+                merged_funds = {c: d for c, d in self._fund_data.items() if c in funds}
+                for code in [c for c in self._code_versions if c not in stocks and c not in funds]:
+                    del self._code_versions[code]
+            for old, new in ((merged, market_data or {}), (merged_funds, fund_data)):
+                for code, d in new.items():
+                    prev = old.get(code)
+                    if prev is None or _quote_state(prev) != _quote_state(d):
+                        self._code_versions[code] = self.version
+                    old[code] = d
+            self._market_data, self._fund_data = merged, merged_funds
+            if not fast_only:
+                self.updated_at = time.time()
+                for m in (markets or trading_calendar.MARKET_SESSIONS): self._market_updated[m] = self.updated_at
+            self._cond.notify_all()
+
+    def moving_markets(self):
+        """还需要再抓的市场：处于该市场交易时段内，或者手上该市场的快照早于它最近一次收盘 (含午休) 之后 CLOSE_GRACE 秒
+        A 股 ('cn') 总是参与判断 (基金估值跟着它走)，其余市场只在有人订阅了该市场的代码时才算；还没有数据时全部要抓
+        """
+        if not self._market_data: return set(trading_calendar.MARKET_SESSIONS)
+        held = {market_of(c) for c in self._market_data} | {'cn'}
+        moving = set()
+        for m in trading_calendar.MARKET_SESSIONS:
+            if m not in held: continue
+            if trading_calendar.is_trading_time(market=m):
+                moving.add(m)
+                continue
+            last_end = trading_calendar.last_session_end(market=m)
+            if trading_calendar.from_timestamp(self._market_updated.get(m, 0)) < last_end + timedelta(seconds=self.CLOSE_GRACE):
+                moving.add(m)
+        return moving
+
+    def _run(self):
+        # 非交易时段只在收盘后补抓一次收盘价，之后一直用缓存的快照，不再请求上游；
+        # A 股收盘后港股还在交易时，只刷新港股代码和对应汇率，直到港股收盘；
+        # 有会话订阅了新代码 (subscribe 唤醒) 时照常抓
+        forced = True
+        while True:
+            self._wake.clear()
+            has_fast = bool(self._wanted_codes()[2])
+            moving = set() if forced else self.moving_markets()
+            if forced or moving:
+                full = forced or not has_fast or time.time() - self.updated_at >= self.ttl
+                markets = None if forced or 'cn' in moving else moving
+                try:
+                    self.refresh(fast_only=not full, markets=markets)
+                except Exception as e:
+                    print(f"⚠️ 行情缓存刷新失败: {e}")
+            forced = self._wake.wait(self.fast_ttl if has_fast else self.ttl)
@@ -0,0 +1,195 @@
+import itertools
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+import signal_rules
+
+# ==========================================
+# 🧪 信号规则回测 (参数网格扫描)
+# ==========================================
+# 用 nav_history.json 的每日官方涨跌幅当作当天 14:47 的估值 (估值误差见 backtest.py)，
+# 配合基准指数日线，逐日按 signal_rules 判断买入 / 止盈并模拟持仓：
+#   - 买入：当天净值买入 base_unit × 倍数；止盈：当天净值卖出 sell_fraction 的持仓
+#   - 整张参数网格 × 所有基金 是一个 (网格数, 基金数) 的数组，沿时间只循环一次，网格再大也是几秒内跑完
+# 每个网格单元输出：
+#   - 盈亏 (pnl = 期末市值 + 卖出所得 - 买入投入 - 初始持仓) 以及相对一直拿着不动的超额
+#   - 命中率：买入后 / 止盈后 HORIZON 个交易日的累计涨跌方向对了的比例
+#   - 换手：买卖总额 / 平均持仓市值
+# 基准日线缓存在 bench_history.json ({代码: {日期: 涨跌幅}})，缺了才联网抓取 (--fetch 强制刷新)。
+
+NAV_FILE = "nav_history.json"
+BENCH_FILE = "bench_history.json"
+BENCH_DAYS = 2000
+HORIZON = 5
+INITIAL = 10000      # 每只基金的初始持仓 (元)
+BASE_UNIT = 1000     # 回测里统一的加仓单位 (元)
+
+DEFAULT_GRID = {
+    "buy_below": [-1.5, -2.0, -2.5, -3.0, -3.5],
+    "double_below": [-3.5, -4.0, -5.0],
+    "double_multiplier": [1, 2, 3],
+    "sell_above": [2.0, 2.5, 3.0, 3.5, 4.0],
+    "sell_vs_bench": [0.5, 1.0, 1.5, 2.0],
+}
+
+def load_benchmarks(codes, path=BENCH_FILE, fetch=False):
+    """基准日线 {代码: {日期: 涨跌幅}}：优先读本地缓存，缺的 (或 fetch=True) 才联网抓取并写回缓存"""
+    cache = {}
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f: cache = json.load(f)
+    missing = [c for c in codes if fetch or c not in cache]
+    if missing:
+        import quote_client
+        fetched = 0
+        for code in missing:
+            series = quote_client.get_index_history(code, BENCH_DAYS)
+            if series:
+                cache[code] = {**cache.get(code, {}), **series}
+                fetched += 1
+            else: print(f"⚠️ 基准 {code} 日线获取失败，回测中按 0 处理")
+        if fetched:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(cache, f, ensure_ascii=False)
+    return cache
+
+def build_panel(nav, benchmarks):
+    """对齐成 天数 × 基金 的矩阵：R 基金涨跌幅 (无净值为 NaN)，B 对应基准涨跌幅 (缺失为 0)"""
+    names = [n for n in nav if nav[n]]
+    dates = sorted({d for n in names for d in nav[n]})
+    pos = {d: t for t, d in enumerate(dates)}
+    R = np.full((len(dates), len(names)), np.nan)
+    B = np.zeros_like(R)
+    for j, name in enumerate(names):
+        for d, pct in nav[name].items(): R[pos[d], j] = pct
+        bench = benchmarks.get(signal_rules.benchmark_for(name)[0], {})
+        for d, pct in bench.items():
+            if d in pos: B[pos[d], j] = pct
+    return dates, names, R, B
+
+def expand_grid(grid):
+    """{参数: [取值]} -> (每个网格单元的参数列表, {参数: (网格数, 1) 数组})；未列出的参数取默认值"""
+    keys = list(grid)
+    cells = [{**signal_rules.DEFAULT_RULES, **dict(zip(keys, combo))} for combo in itertools.product(*grid.values())]
+    arrays = {k: np.array([c[k] for c in cells], dtype=float)[:, None] for k in signal_rules.DEFAULT_RULES}
+    return cells, arrays
+
+def forward_returns(R, horizon=HORIZON):
+    """第 t 天之后 horizon 个交易日的累计涨跌幅 (%)，不足 horizon 天为 NaN"""
+    logr = np.log1p(np.nan_to_num(R) / 100)
+    csum = np.vstack([np.zeros((1, R.shape[1])), np.cumsum(logr, axis=0)])
+    T = R.shape[0]
+    fwd = np.full(R.shape, np.nan)
+    if T > horizon:
+        t = np.arange(T - horizon)
+        fwd[t] = np.expm1(csum[t + 1 + horizon] - csum[t + 1]) * 100
+    return fwd
+
+def simulate(R, B, rules, base_unit=BASE_UNIT, initial=INITIAL, horizon=HORIZON):
+    """rules 为 expand_grid 给出的 (网格数, 1) 数组；返回每个 (网格, 基金) 的统计量"""
+    G, N = next(iter(rules.values())).shape[0], R.shape[1]
+    valid = ~np.isnan(R)
+    fwd = forward_returns(R, horizon)
+    V = np.full((G, N), float(initial))
+    bought, sold, traded, v_sum = (np.zeros((G, N)) for _ in range(4))
+    hits, judged, n_buy, n_sell = (np.zeros((G, N)) for _ in range(4))
+    hold = np.full(N, float(initial))
+
+    for t in range(R.shape[0]):
+        r = np.where(valid[t], R[t], 0.0)
+        V *= 1 + r / 100
+        hold *= 1 + r / 100
+        side, mult = signal_rules.signal_arrays(r, B[t], rules)
+        side = np.where(valid[t], side, 0)
+        buy_amt = np.where(side == signal_rules.BUY, mult * base_unit, 0.0)
+        sell_amt = np.where(side == signal_rules.SELL, V * rules["sell_fraction"], 0.0)
+        V += buy_amt - sell_amt
+        bought += buy_amt
+        sold += sell_amt
+        traded += buy_amt + sell_amt
+        v_sum += V
+        n_buy += side == signal_rules.BUY
+        n_sell += side == signal_rules.SELL
+        if not np.isnan(fwd[t]).all():
+            f = fwd[t]
+            known = (side != 0) & ~np.isnan(f)
+            hits += known & (((side == signal_rules.BUY) & (f > 0)) | ((side == signal_rules.SELL) & (f < 0)))
+            judged += known
+
+    pnl = V + sold - bought - initial
+    return {
+        'pnl': pnl,
+        'excess': pnl - (hold - initial),
+        'hits': hits,
+        'judged': judged,
+        'buys': n_buy,
+        'sells': n_sell,
+        'turnover': np.divide(traded, v_sum / R.shape[0], out=np.zeros_like(traded), where=v_sum > 0),
+        'invested': bought,
+    }
+
+def summarize(cells, result, names, keys):
+    """按网格单元汇总 (所有基金合计)，按超额收益从高到低排序"""
+    pnl, excess = result['pnl'].sum(axis=1), result['excess'].sum(axis=1)
+    hits, judged = result['hits'].sum(axis=1), result['judged'].sum(axis=1)
+    rows = []
+    for g, cell in enumerate(cells):
+        rows.append({
+            'params': {k: cell[k] for k in keys},
+            'pnl': round(float(pnl[g]), 2),
+            'excess': round(float(excess[g]), 2),
+            'hit_rate': round(float(hits[g] / judged[g]), 4) if judged[g] else None,
+            'signals': int(result['buys'][g].sum() + result['sells'][g].sum()),
+            'buys': int(result['buys'][g].sum()),
+            'sells': int(result['sells'][g].sum()),
+            'turnover': round(float(result['turnover'][g].mean()), 3),
+            'per_fund': {name: round(float(result['excess'][g, j]), 2) for j, name in enumerate(names)},
+        })
+    return sorted(rows, key=lambda r: r['excess'], reverse=True)
+
+def run(nav, benchmarks, grid=DEFAULT_GRID, horizon=HORIZON):
+    dates, names, R, B = build_panel(nav, benchmarks)
+    cells, rules = expand_grid(grid)
+    if not dates: return dates, []
+    return dates, summarize(cells, simulate(R, B, rules, horizon=horizon), names, list(grid))
+
+if __name__ == "__main__":
+    # python signal_backtest.py [--nav-store] [--fetch] [--horizon N] [--top N] [--json 输出.json]
+    args = sys.argv[1:]
+    def opt(flag, default=None):
+        return args[args.index(flag) + 1] if flag in args and args.index(flag) + 1 < len(args) else default
+
+    if "--nav-store" in args:
+        from nav_store import NavStore
+        nav = NavStore().as_dict()
+    else:
+        with open(NAV_FILE, 'r', encoding='utf-8') as f: nav = json.load(f)
+    codes = sorted({signal_rules.benchmark_for(n)[0] for n in nav})
+    benchmarks = load_benchmarks(codes, fetch="--fetch" in args)
+
+    start = time.perf_counter()
+    dates, rows = run(nav, benchmarks, horizon=int(opt("--horizon", HORIZON)))
+    elapsed = time.perf_counter() - start
+    if not rows:
+        print("没有可回测的净值数据")
+        sys.exit(0)
+
+    print(f"{len(nav)} 只基金, {dates[0]} ~ {dates[-1]} ({len(dates)} 个交易日), {len(rows)} 组参数, 耗时 {elapsed:.2f}s")
+    current = {k: signal_rules.DEFAULT_RULES[k] for k in DEFAULT_GRID}
+    for rank, row in enumerate(rows, 1):
+        if row['params'] == current:
+            print(f"当前参数排第 {rank}: 超额 {row['excess']:+,.0f}  命中率 {row['hit_rate']}  信号 {row['signals']}")
+    print("超额最高的参数:")
+    for row in rows[:int(opt("--top", 10))]:
+        p = row['params']
+        hit = f"{row['hit_rate']:.0%}" if row['hit_rate'] is not None else "-"
+        print(f"  买<{p['buy_below']:+.1f} 加倍<{p['double_below']:+.1f}×{p['double_multiplier']:.0f} "
+              f"卖>{p['sell_above']:+.1f}/基准+{p['sell_vs_bench']:.1f}  "
+              f"盈亏 {row['pnl']:+,.0f}  超额 {row['excess']:+,.0f}  命中 {hit}  "
+              f"买 {row['buys']} 卖 {row['sells']}  换手 {row['turnover']:.2f}")
+    if opt("--json"):
+        with open(opt("--json"), 'w', encoding='utf-8') as f:
+            json.dump(rows, f, indent=4, ensure_ascii=False)
@@ -0,0 +1,160 @@
+import json
+import os
+import sys
+from datetime import datetime
+
+# ==========================================
+# 📓 交易信号日记 (只追加的 JSONL)
+# ==========================================
+# signals.jsonl 每行一条信号 {"date", "fund", "type", "detail", "action", "ts"}，按时间顺序追加：
+#   - 写入 O(1)：只往文件末尾 append，不再整文件读出来插到表头下面再写回
+#   - 去重：同一天同一只基金同一种信号只记第一次 (14:47 和 15:17 两次巡检不会重复记)
+#     去重只需要看文件尾部当天的记录，从后往前读到前一天就停
+# signals.md 由日记生成，只是给人看的视图：
+#   - signals.md 只放最近 RECENT_LIMIT 条 + 各月归档链接 (大小有上限)
+#   - signals/YYYY-MM.md 按月分页，平时只重写当月那一页
+# 所以每次提交的 diff 只有新增的几行。
+
+JOURNAL_FILE = "signals.jsonl"
+VIEW_FILE = "signals.md"
+ARCHIVE_DIR = "signals"
+RECENT_LIMIT = 50
+
+TABLE_HEADER = "| 日期 | 基金 | 信号类型 | 详情 | 建议操作 |\n|---|---|---|---|---|\n"
+
+def _iter_reverse(path, block=8192):
+    """从文件末尾往前逐行读取 (只读用到的部分)"""
+    if not os.path.exists(path): return
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        tail = b""
+        while pos > 0:
+            step = min(block, pos)
+            pos -= step
+            f.seek(pos)
+            chunk = f.read(step) + tail
+            lines = chunk.split(b"\n")
+            tail = lines[0]
+            for line in reversed(lines[1:]):
+                if line.strip(): yield json.loads(line.decode('utf-8'))
+        if tail.strip(): yield json.loads(tail.decode('utf-8'))
+
+def _key(entry):
+    return (entry["date"], entry["fund"], entry["type"])
+
+class SignalJournal:
+    def __init__(self, path=JOURNAL_FILE):
+        self.path = path
+
+    def keys_for(self, date):
+        """某一天已经记过的 (date, fund, type)；从文件尾往前读到更早的日期就停"""
+        keys = set()
+        for entry in _iter_reverse(self.path):
+            if entry["date"] < date: break
+            if entry["date"] == date: keys.add(_key(entry))
+        return keys
+
+    def append(self, entries, date=None):
+        """追加一批信号 [{'name', 'type', 'detail', 'action'}]，返回实际写入 (去重后) 的记录"""
+        if not entries: return []
+        date = date or datetime.now().strftime("%Y-%m-%d")
+        ts = datetime.now().isoformat(timespec='seconds')
+        seen = self.keys_for(date)
+        new = []
+        for e in entries:
+            record = {"date": date, "fund": e["name"].strip(), "type": e["type"],
+                      "detail": e["detail"], "action": e["action"], "ts": ts}
+            if _key(record) in seen: continue
+            seen.add(_key(record))
+            new.append(record)
+        if new:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.writelines(json.dumps(r, ensure_ascii=False) + "\n" for r in new)
+        return new
+
+    def latest(self, n=RECENT_LIMIT):
+        """最近 n 条 (新的在前)"""
+        out = []
+        for entry in _iter_reverse(self.path):
+            out.append(entry)
+            if len(out) >= n: break
+        return out
+
+    def month(self, month):
+        """某个月 (YYYY-MM) 的全部记录 (新的在前)；当月从尾部读，很快"""
+        out = []
+        for entry in _iter_reverse(self.path):
+            m = entry["date"][:7]
+            if m < month: break
+            if m == month: out.append(entry)
+        return out
+
+    def months(self):
+        """出现过的所有月份 (新的在前)；需要扫全文件，只在生成归档链接 / 全量重建时用"""
+        if not os.path.exists(self.path): return []
+        months = set()
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip(): months.add(json.loads(line)["date"][:7])
+        return sorted(months, reverse=True)
+
+# === 📝 生成 Markdown 视图 ===
+
+def _table(entries):
+    return TABLE_HEADER + "".join(
+        f"| {e['date']} | {e['fund']} | {e['type']} | {e['detail']} | {e['action']} |\n" for e in entries
+    )
+
+def _write(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+def render(journal, months=None):
+    """重写 signals.md 和指定月份的归档页 (默认只重写最近一条信号所在的月份)"""
+    latest = journal.latest()
+    if months is None:
+        months = [latest[0]["date"][:7]] if latest else []
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    for m in months:
+        _write(os.path.join(ARCHIVE_DIR, f"{m}.md"), f"# 🤖 交易信号日记 {m}\n\n" + _table(journal.month(m)))
+
+    # 归档链接直接按 signals/ 目录里已有的月份页生成，不扫日记全文
+    archived = sorted((f[:-3] for f in os.listdir(ARCHIVE_DIR) if f.endswith(".md")), reverse=True)
+    archive_links = " · ".join(f"[{m}]({ARCHIVE_DIR}/{m}.md)" for m in archived)
+    _write(VIEW_FILE,
+           "# 🤖 全自动交易信号日记\n\n"
+           f"最近 {RECENT_LIMIT} 条信号 (完整记录见 `{JOURNAL_FILE}`)。\n\n"
+           + _table(latest)
+           + (f"\n按月归档: {archive_links}\n" if archive_links else ""))
+
+def _parse_markdown(path):
+    """旧版 signals.md 表格 -> 记录列表 (时间顺序)"""
+    rows = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            cells = [c.strip() for c in line.strip().strip('|').split('|')]
+            if len(cells) != 5 or not cells[0][:4].isdigit(): continue
+            rows.append({"date": cells[0], "fund": cells[1], "type": cells[2], "detail": cells[3], "action": cells[4], "ts": ""})
+    # 旧文件新的在上面
+    return list(reversed(rows))
+
+if __name__ == "__main__":
+    # python signal_journal.py migrate   旧 signals.md -> signals.jsonl (去重) 并生成全部视图
+    # python signal_journal.py render    全量重建 signals.md 和所有月份归档
+    journal = SignalJournal()
+    if len(sys.argv) >= 2 and sys.argv[1] == "migrate":
+        parsed = _parse_markdown(VIEW_FILE)
+        rows, seen = [], set()
+        for r in parsed:
+            if _key(r) in seen: continue
+            seen.add(_key(r)); rows.append(r)
+        with open(journal.path, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(r, ensure_ascii=False) + "\n" for r in rows)
+        render(journal, journal.months())
+        print(f"✅ 已迁移 {len(rows)} 条信号 (去重前 {len(parsed)} 条)")
+    elif len(sys.argv) >= 2 and sys.argv[1] == "render":
+        render(journal, journal.months())
+        print("✅ 已重建 signals.md 和按月归档")
+    else:
+        print("用法: python signal_journal.py migrate | render")
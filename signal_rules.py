@@ -0,0 +1,66 @@
+import numpy as np
+
+# ==========================================
+# 🎯 交易信号规则 (看板 / daily_check / 信号回测 共用)
+# ==========================================
+# 买入：估值 < buy_below 且 估值 < 基准 + buy_vs_bench；估值 < double_below 时加仓额 × double_multiplier
+# 止盈：估值 > sell_above 且 估值 > 基准 + sell_vs_bench，建议卖出 sell_fraction 的持仓
+# 参数可以在 funds.json 里按基金覆盖：{"signal_rules": {"buy_below": -3.0}}
+# signal_arrays 对数组逐元素判断，回测时一次给出整张参数网格 × 所有基金的信号。
+
+DEFAULT_RULES = {
+    "buy_below": -2.5,
+    "buy_vs_bench": 0.0,
+    "double_below": -4.0,
+    "double_multiplier": 2,
+    "sell_above": 3.0,
+    "sell_vs_bench": 1.5,
+    "sell_fraction": 0.25,
+}
+
+BUY, SELL = 1, -1
+
+# 基准指数：按基金名里的关键词匹配，先匹配到的优先
+BENCHMARKS = [
+    (("周期", "均衡"), 'sh000001', '上证'),
+    (("成长", "AI", "优选"), 'sz399006', '创指'),
+]
+DEFAULT_BENCHMARK = ('sh000001', '上证')
+
+def benchmark_for(fund_name):
+    """返回 (基准代码, 基准简称)"""
+    for keywords, code, label in BENCHMARKS:
+        if any(k in fund_name for k in keywords): return code, label
+    return DEFAULT_BENCHMARK
+
+def benchmark_codes():
+    return sorted({code for _, code, _ in BENCHMARKS} | {DEFAULT_BENCHMARK[0]})
+
+def rules_for(info):
+    """默认规则 + funds.json 里该基金的覆盖项"""
+    return {**DEFAULT_RULES, **(info.get('signal_rules') or {})}
+
+def signal_arrays(est, bench, rules):
+    """逐元素判断信号，rules 里的值可以是标量或可广播的数组
+    返回 (side, multiplier)：side 为 BUY / SELL / 0，multiplier 为买入倍数 (非买入处为 0)
+    """
+    est, bench = np.asarray(est, dtype=float), np.asarray(bench, dtype=float)
+    buy = (est < rules["buy_below"]) & (est < bench + rules["buy_vs_bench"])
+    sell = ~buy & (est > rules["sell_above"]) & (est > bench + rules["sell_vs_bench"])
+    side = np.where(buy, BUY, np.where(sell, SELL, 0))
+    multiplier = np.where(buy, np.where(est < rules["double_below"], rules["double_multiplier"], 1), 0)
+    return side, multiplier
+
+def evaluate(est, bench, base_unit, rules=DEFAULT_RULES):
+    """单只基金的信号：None 或 {'type': 'BUY'/'SELL', 'gap', 'multiplier', 'amount', 'fraction'}"""
+    side, multiplier = signal_arrays(est, bench, rules)
+    if side == BUY:
+        return {'type': 'BUY', 'gap': abs(est - bench), 'multiplier': int(multiplier), 'amount': int(base_unit * multiplier)}
+    if side == SELL:
+        return {'type': 'SELL', 'gap': abs(est - bench), 'fraction': rules["sell_fraction"]}
+    return None
+
+def fraction_label(fraction):
+    """0.25 -> '1/4'"""
+    if fraction > 0 and abs(1 / fraction - round(1 / fraction)) < 1e-9: return f"1/{round(1 / fraction)}"
+    return f"{fraction:.0%}"
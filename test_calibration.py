@@ -0,0 +1,40 @@
+import calibration
+
+# 晚间审计重复点击不应让因子继续漂移：python test_calibration.py (或 pytest test_calibration.py)
+
+DATES = [f"2026-01-{d:02d}" for d in range(5, 31)]
+
+def make_inputs():
+    # 原始估值 raw 系统性偏小，官方涨跌幅 ≈ 1.2 × raw
+    history = {d: {"A基金": 0.5 + (i % 7) * 0.3 - 1.0} for i, d in enumerate(DATES)}
+    official_map = {d: round(history[d]["A基金"] * 1.2 + (0.01 if i % 2 else -0.01), 4) for i, d in enumerate(DATES)}
+    return history, lambda name, date: official_map.get(date)
+
+def run_audit(history, official, funds_config, factor_history, date):
+    """与 app.py 晚间审计相同的流程：返回写入的新因子，并把它们应用到 funds_config / factor_history"""
+    bases = calibration.base_factors(funds_config, factor_history, date)
+    results = calibration.calibrate(history, official, {n: {'factor': f} for n, f in bases.items()})
+    updates = calibration.audit_factors(results, bases, funds_config)
+    for name, f in updates.items(): funds_config[name]['factor'] = f
+    if updates: factor_history.setdefault(date, {}).update(updates)
+    return updates
+
+def test_accepted_factor_is_pure():
+    r = {'factor': 1.2, 'oos_n': 10, 'oos_mae': 0.01, 'baseline_mae': 0.2}
+    assert calibration.accepted_factor(r, 1.0) == calibration.accepted_factor(r, 1.0) == 1.1
+
+def test_repeat_audit_changes_nothing():
+    history, official = make_inputs()
+    last = DATES[-1]
+    for factor_history in ({}, {"2026-01-02": {"A基金": 1.0}}):
+        funds = {"A基金": {"factor": 1.0}}
+        first = run_audit(history, official, funds, factor_history, last)
+        assert first and 1.0 < first["A基金"] < 1.2
+        after_first = funds["A基金"]["factor"]
+        second = run_audit(history, official, funds, factor_history, last)
+        assert second == {} and funds["A基金"]["factor"] == after_first
+
+if __name__ == "__main__":
+    test_accepted_factor_is_pure()
+    test_repeat_audit_changes_nothing()
+    print("✅ calibration tests passed")
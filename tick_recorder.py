@@ -0,0 +1,127 @@
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# ==========================================
+# 🎞️ 盘中估值录制 (看板每一轮的估值 + 行情向量)
+# ==========================================
+# 按天分文件，定长二进制记录，可以直接 np.memmap 读出来画日内曲线 / 校准估值：
+#   ticks/YYYY-MM-DD.json         当天的分段列表 [{"file", "funds", "symbols"}]
+#   ticks/YYYY-MM-DD.<n>.bin      每条记录: ts(f8) | version(i8) | est[基金数](f4) | quote[证券数](f4, 无行情为 NaN)
+# funds.json 在盘中被修改 (基金 / 持仓列表变化) 时另起一段，旧段不受影响。
+# 写入走后台线程 + 队列，看板循环里只做一次数组拷贝；多个会话看到同一个行情版本时只记一次。
+
+TICK_DIR = "ticks"
+FLUSH_INTERVAL = 5   # 秒：攒一批再写盘
+MAX_PENDING = 10000  # 队列上限，磁盘卡住时丢弃新记录而不是拖慢看板
+
+def tick_dtype(n_funds, n_symbols):
+    return np.dtype([
+        ('ts', '<f8'),
+        ('version', '<i8'),
+        ('est', '<f4', (n_funds,)),
+        ('quote', '<f4', (n_symbols,)),
+    ])
+
+def _bj_date(ts):
+    return (datetime.utcfromtimestamp(ts) + timedelta(hours=8)).strftime("%Y-%m-%d")
+
+class TickRecorder:
+    def __init__(self, root=TICK_DIR, flush_interval=FLUSH_INTERVAL):
+        self.root = root
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=MAX_PENDING)
+        self._last_version = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._segments = {}  # (date, funds, symbols) -> 文件路径
+
+    def record(self, version, engine, est, values, present):
+        """登记一轮估值 (不阻塞)：同一个行情版本只记第一次"""
+        with self._lock:
+            if version <= self._last_version: return False
+            self._last_version = version
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="tick-recorder", daemon=True)
+                self._thread.start()
+        quote = np.where(present, values, np.nan).astype(np.float32)
+        try:
+            self._queue.put_nowait((time.time(), version, tuple(engine.fund_names), tuple(engine.symbols),
+                                    est.astype(np.float32), quote))
+        except queue.Full:
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.time() + self.flush_interval
+            while True:
+                timeout = deadline - time.time()
+                if timeout <= 0: break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                self.flush(batch)
+            except Exception as e:
+                print(f"⚠️ 估值录制写盘失败: {e}")
+
+    def flush(self, batch):
+        """把一批记录按 (日期, 布局) 分组追加到对应的段文件"""
+        groups = {}
+        for ts, version, funds, symbols, est, quote in batch:
+            groups.setdefault((_bj_date(ts), funds, symbols), []).append((ts, version, est, quote))
+        for (date, funds, symbols), rows in groups.items():
+            dtype = tick_dtype(len(funds), len(symbols))
+            records = np.zeros(len(rows), dtype=dtype)
+            for i, (ts, version, est, quote) in enumerate(rows):
+                records[i] = (ts, version, est, quote)
+            with open(self._segment(date, funds, symbols), 'ab') as f:
+                f.write(records.tobytes())
+
+    def _segment(self, date, funds, symbols):
+        key = (date, funds, symbols)
+        path = self._segments.get(key)
+        if path: return path
+        os.makedirs(self.root, exist_ok=True)
+        index_path = os.path.join(self.root, f"{date}.json")
+        segments = _load_index(index_path)
+        for seg in segments:
+            if seg["funds"] == list(funds) and seg["symbols"] == list(symbols):
+                path = os.path.join(self.root, seg["file"])
+                break
+        else:
+            name = f"{date}.{len(segments)}.bin"
+            segments.append({"file": name, "funds": list(funds), "symbols": list(symbols)})
+            with open(index_path, 'w', encoding='utf-8') as f:
+                json.dump(segments, f, ensure_ascii=False)
+            path = os.path.join(self.root, name)
+        self._segments[key] = path
+        return path
+
+def _load_index(index_path):
+    if not os.path.exists(index_path): return []
+    with open(index_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def load_day(date, root=TICK_DIR):
+    """读取某天的录制数据：[(funds, symbols, 记录数组), ...]，记录数组是只读 memmap
+    例: funds, symbols, ticks = load_day("2026-10-16")[0]; ticks['est'][:, funds.index(name)]
+    """
+    out = []
+    for seg in _load_index(os.path.join(root, f"{date}.json")):
+        path = os.path.join(root, seg["file"])
+        dtype = tick_dtype(len(seg["funds"]), len(seg["symbols"]))
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size < dtype.itemsize: continue
+        # 只映射完整的记录 (写到一半的尾巴忽略)
+        ticks = np.memmap(path, dtype=dtype, mode='r', shape=(size // dtype.itemsize,))
+        out.append((seg["funds"], seg["symbols"], ticks))
+    return out
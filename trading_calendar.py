@@ -0,0 +1,117 @@
+from datetime import date, datetime, time, timedelta
+
+# ==========================================
+# 📅 A 股交易日历 (上交所休市安排 + 交易时段)
+# ==========================================
+# 看板、daily_check、nightly_check 统一从这里判断“今天开不开市 / 现在是不是交易时间”，
+# 非交易日直接跳过，不发任何行情 / 净值请求。
+# 休市表只列工作日里的休市日 (周末本来就不开市)，每年年底交易所公布下一年安排后补一行。
+# 表里没有的年份退化为“周一到周五都是交易日”。
+# 交易时段按市场区分 (MARKET_SESSIONS)：港股收得比 A 股晚，持有港股的基金 15:00 之后还在变；
+# 交易日一律按上交所日历判断 (不单独维护港股假期，港股休市当天行情不变，多抓几轮也无妨)。
+
+SSE_HOLIDAYS = {
+    2024: (
+        "2024-01-01",
+        "2024-02-09", "2024-02-12", "2024-02-13", "2024-02-14", "2024-02-15", "2024-02-16",
+        "2024-04-04", "2024-04-05",
+        "2024-05-01", "2024-05-02", "2024-05-03",
+        "2024-06-10",
+        "2024-09-16", "2024-09-17",
+        "2024-10-01", "2024-10-02", "2024-10-03", "2024-10-04", "2024-10-07",
+    ),
+    2025: (
+        "2025-01-01",
+        "2025-01-28", "2025-01-29", "2025-01-30", "2025-01-31", "2025-02-03", "2025-02-04",
+        "2025-04-04",
+        "2025-05-01", "2025-05-02", "2025-05-05",
+        "2025-06-02",
+        "2025-10-01", "2025-10-02", "2025-10-03", "2025-10-06", "2025-10-07", "2025-10-08",
+    ),
+    2026: (
+        "2026-01-01", "2026-01-02",
+        "2026-02-16", "2026-02-17", "2026-02-18", "2026-02-19", "2026-02-20", "2026-02-23",
+        "2026-04-06",
+        "2026-05-01", "2026-05-04", "2026-05-05",
+        "2026-06-19",
+        "2026-09-25",
+        "2026-10-01", "2026-10-02", "2026-10-05", "2026-10-06", "2026-10-07",
+    ),
+}
+HOLIDAYS = frozenset(date.fromisoformat(d) for days in SSE_HOLIDAYS.values() for d in days)
+
+# 连续竞价时段 (北京时间)
+SESSIONS = ((time(9, 30), time(11, 30)), (time(13, 0), time(15, 0)))
+MARKET_OPEN = SESSIONS[0][0]
+MARKET_CLOSE = SESSIONS[-1][1]
+
+# 各市场的交易时段 (北京时间)；港股下午场算到收市竞价结束 (16:00 收盘 + 约 10 分钟竞价)
+MARKET_SESSIONS = {
+    'cn': SESSIONS,
+    'hk': ((time(9, 30), time(12, 0)), (time(13, 0), time(16, 10))),
+}
+
+def bj_now():
+    # GitHub Action / 云端都跑在 UTC，统一换算成北京时间
+    return datetime.utcnow() + timedelta(hours=8)
+
+def from_timestamp(ts):
+    """epoch 秒 -> 北京时间 (naive datetime)"""
+    return datetime.utcfromtimestamp(ts) + timedelta(hours=8)
+
+def _as_date(d):
+    if d is None: return bj_now().date()
+    if isinstance(d, str): return date.fromisoformat(d[:10])
+    if isinstance(d, datetime): return d.date()
+    return d
+
+def is_covered(d=None):
+    """该年份的休市安排是否已录入"""
+    return _as_date(d).year in SSE_HOLIDAYS
+
+def is_trading_day(d=None):
+    """d 可以是 date / datetime / 'YYYY-MM-DD'，默认今天 (北京时间)"""
+    d = _as_date(d)
+    return d.weekday() < 5 and d not in HOLIDAYS
+
+def is_trading_time(dt=None, market='cn'):
+    """是否处于 market 的交易时段内 (午休不算)"""
+    dt = dt or bj_now()
+    if not is_trading_day(dt): return False
+    t = dt.time()
+    return any(start <= t <= end for start, end in MARKET_SESSIONS[market])
+
+def after_close(dt=None):
+    """交易日收盘之后 (当天净值 / 收盘报告可以开始处理)"""
+    dt = dt or bj_now()
+    return is_trading_day(dt) and dt.time() >= MARKET_CLOSE
+
+def previous_trading_day(d=None):
+    d = _as_date(d) - timedelta(days=1)
+    while not is_trading_day(d): d -= timedelta(days=1)
+    return d
+
+def session_date(dt=None):
+    """行情所属的交易日：交易日开盘之后为当天，否则为上一个交易日"""
+    dt = dt or bj_now()
+    if is_trading_day(dt) and dt.time() >= MARKET_OPEN: return dt.date()
+    return previous_trading_day(dt)
+
+def trading_days(start, end):
+    """[start, end] 闭区间内的交易日 (date 列表)"""
+    d, end = _as_date(start), _as_date(end)
+    days = []
+    while d <= end:
+        if is_trading_day(d): days.append(d)
+        d += timedelta(days=1)
+    return days
+
+def last_session_end(dt=None, market='cn'):
+    """dt 之前 (含) market 最近一次交易时段结束的时刻：该市场的行情在这之后不会再变"""
+    dt = dt or bj_now()
+    d = dt.date()
+    sessions = MARKET_SESSIONS[market]
+    if is_trading_day(d):
+        for _, end in reversed(sessions):
+            if dt.time() >= end: return datetime.combine(d, end)
+    return datetime.combine(previous_trading_day(d), sessions[-1][1])
@@ -0,0 +1,253 @@
+import json
+
+import numpy as np
+
+import signal_rules
+
+# ==========================================
+# 🧮 估值引擎 (看板 / 收盘存证 / daily_check 共用)
+# ==========================================
+# funds.json 只编译一次：基金 × 证券 的稀疏权重矩阵 (按基金排列的非零元 + 按证券的反向索引 postings) + factor 向量。
+# 每轮行情只需要做一次稀疏矩阵 × 涨跌幅向量，基金数量再多也不在 Python 里逐只循环。
+#
+# 两种估值模式 (funds.json 里按基金设 "estimator"，或 get_engine(mode=...) 整体指定)：
+#   - covered (默认)：raw = Σ(w·pct) / Σ(有行情的 w)，没行情的持仓和前十大以外的仓位都当作跟着已知持仓走
+#   - residual：未覆盖的仓位 (100% - 有行情的权重，含缺行情的持仓) 按代理指数的涨跌幅计，
+#     raw = (Σ(w·pct) + 未覆盖权重 × 代理涨幅) / max(100%, 有行情的权重)；
+#     代理取 funds.json 的 "proxy" (如行业 ETF)，没配就用基准指数；代理也没行情时退回 covered
+# 代理指数和持仓一起放在 symbols 里，同一次行情向量里算完。
+# 持仓权重的单位是占基金净值的百分比，覆盖率 = 有行情的权重 / 100。
+
+MODES = ("covered", "residual")
+DEFAULT_MODE = "covered"
+NAV_WEIGHT = 100.0
+
+def quote_return(d):
+    """估值用的涨跌幅：跨市场行情用折算成人民币的 effective；所在市场没开盘 (stale) 的当作没有行情"""
+    if d is None or d.get('stale'): return None
+    return d.get('effective', d['change'])
+
+class ValuationEngine:
+    def __init__(self, funds_config, mode=None):
+        self.fund_names = list(funds_config.keys())
+        self.fund_index = {name: i for i, name in enumerate(self.fund_names)}
+        self.symbols = []
+        self.symbol_index = {}
+
+        rows, cols, weights = [], [], []
+        for i, name in enumerate(self.fund_names):
+            for s in funds_config[name].get('holdings', []):
+                code = s['code']
+                j = self.symbol_index.get(code)
+                if j is None:
+                    j = self.symbol_index[code] = len(self.symbols)
+                    self.symbols.append(code)
+                rows.append(i); cols.append(j); weights.append(float(s['weight']))
+
+        # 残余仓位的代理指数 (每只基金一列，排在持仓证券之后)
+        self.proxy_codes = [funds_config[n].get('proxy') or signal_rules.benchmark_for(n)[0] for n in self.fund_names]
+        for code in self.proxy_codes:
+            if code not in self.symbol_index:
+                self.symbol_index[code] = len(self.symbols)
+                self.symbols.append(code)
+        self.proxy_cols = np.array([self.symbol_index[c] for c in self.proxy_codes], dtype=np.int64)
+        modes = [mode or funds_config[n].get('estimator', DEFAULT_MODE) for n in self.fund_names]
+        for name, m in zip(self.fund_names, modes):
+            if m not in MODES: raise ValueError(f"未知估值模式 {m!r} ({name})，可选: {', '.join(MODES)}")
+        self.residual = np.array([m == "residual" for m in modes], dtype=bool)
+
+        # 按行 (基金) 排列的非零元 (COO：行号 / 列号 / 权重)
+        self.rows = np.asarray(rows, dtype=np.int32)
+        self.indices = np.asarray(cols, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float64)
+
+        # 反向索引 (CSC)：证券 j 被哪些基金以什么权重持有
+        #   -> fund_rows / fund_weights[sym_indptr[j]:sym_indptr[j+1]]
+        order = np.argsort(self.indices, kind='stable')
+        self.fund_rows = self.rows[order]
+        self.fund_weights = self.weights[order]
+        self.sym_indptr = np.searchsorted(self.indices[order], np.arange(len(self.symbols) + 1)).astype(np.int32)
+
+        self.factors = np.array([funds_config[n].get('factor', 1.0) for n in self.fund_names], dtype=np.float64)
+        self.principals = np.array([funds_config[n].get('holding_value', 0) for n in self.fund_names], dtype=np.float64)
+
+    @property
+    def n_funds(self):
+        return len(self.fund_names)
+
+    @property
+    def n_symbols(self):
+        return len(self.symbols)
+
+    def combine(self, weighted, covered, values, present, funds=slice(None)):
+        """把 Σ(w·pct)、Σ(有行情的 w) 换算成 raw (按各基金的估值模式)
+        values / present 可以是一维 (证券) 或二维 (天数 × 证券)；funds 为只算部分基金时的下标
+        """
+        cols = self.proxy_cols[funds]
+        use_proxy = self.residual[funds] & present[..., cols]
+        uncovered = np.where(use_proxy, np.maximum(NAV_WEIGHT - covered, 0.0), 0.0)
+        num = weighted + uncovered * np.where(use_proxy, values[..., cols], 0.0)
+        den = covered + uncovered
+        return np.divide(num, den, out=np.zeros(np.shape(num)), where=den > 1e-9)
+
+    def coverage(self, covered):
+        """有行情的持仓占基金净值的比例"""
+        return np.minimum(covered / NAV_WEIGHT, 1.0)
+
+    def quote_vector(self, quotes):
+        """把 {code: {'change':...}} 转成按 self.symbols 排列的 (涨跌幅, 是否有行情) 两个向量"""
+        values = np.zeros(self.n_symbols, dtype=np.float64)
+        present = np.zeros(self.n_symbols, dtype=bool)
+        for j, code in enumerate(self.symbols):
+            pct = quote_return(quotes.get(code))
+            if pct is not None:
+                values[j] = pct
+                present[j] = True
+        return values, present
+
+    def evaluate_vector(self, values, present):
+        """核心计算：返回 (raw, est, covered_weight, profit) 四个按基金排列的数组
+        raw 见 combine (covered 模式下 = Σ(w·pct)/Σw，只统计有行情的持仓)，est = raw × factor
+        """
+        mask = present[self.indices]
+        w = self.weights * mask
+        covered = np.bincount(self.rows, weights=w, minlength=self.n_funds)
+        weighted = np.bincount(self.rows, weights=w * values[self.indices], minlength=self.n_funds)
+        raw = self.combine(weighted, covered, values, present)
+        est = raw * self.factors
+        profit = self.principals * est / 100
+        return raw, est, covered, profit
+
+    def weight_matrix(self):
+        """稠密的 基金 × 证券 权重矩阵 (同一证券重复出现时权重相加)"""
+        W = np.zeros((self.n_funds, self.n_symbols))
+        np.add.at(W, (self.rows, self.indices), self.weights)
+        return W
+
+    def evaluate_matrix(self, values, present):
+        """多天一起算 (回测用)：values / present 为 天数 × 证券，返回 (raw, covered) 两个 天数 × 基金 矩阵"""
+        W = self.weight_matrix()
+        covered = present.astype(np.float64) @ W.T
+        weighted = np.where(present, values, 0.0) @ W.T
+        return self.combine(weighted, covered, values, present), covered
+
+    def postings(self, cols):
+        """cols 这些证券在反向索引里的全部 (基金下标, 权重, 该条属于 cols 中第几个证券)，三个等长数组"""
+        cols = np.asarray(cols, dtype=np.int64)
+        starts, ends = self.sym_indptr[cols], self.sym_indptr[cols + 1]
+        idx = np.concatenate([np.arange(a, b) for a, b in zip(starts, ends)]) if len(cols) else np.zeros(0, dtype=np.int64)
+        return self.fund_rows[idx], self.fund_weights[idx], np.repeat(np.arange(len(cols)), ends - starts)
+
+    def evaluate(self, quotes):
+        """按基金名返回 {'raw', 'est', 'covered_weight', 'coverage', 'profit'}"""
+        raw, est, covered, profit = self.evaluate_vector(*self.quote_vector(quotes))
+        return {
+            name: {
+                'raw': float(raw[i]),
+                'est': float(est[i]),
+                'covered_weight': float(covered[i]),
+                'coverage': float(self.coverage(covered[i])),
+                'profit': float(profit[i]),
+            }
+            for i, name in enumerate(self.fund_names)
+        }
+
+class LiveValuation:
+    """看板每个会话持有一份：维护每只基金的加权涨幅和 Σ(有行情的权重) 两个累加量。
+    某个证券的涨幅变化 Δ 时，只给持有它的基金加上 Δ × 权重 (反向索引)，
+    一轮的开销与变化的行情条数成正比，与总持仓数无关。
+    增量累加会积累浮点误差，每 RESYNC_EVERY 轮全量重算一次。
+    """
+    RESYNC_EVERY = 500
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.values = np.zeros(engine.n_symbols)
+        self.present = np.zeros(engine.n_symbols, dtype=bool)
+        self.weighted = np.zeros(engine.n_funds)
+        self.covered = np.zeros(engine.n_funds)
+        self.raw = np.zeros(engine.n_funds)
+        self.est = np.zeros(engine.n_funds)
+        self.profit = np.zeros(engine.n_funds)
+        self.ready = False
+        self._ticks = 0
+
+    def _rebuild(self, quotes):
+        engine = self.engine
+        self.values, self.present = engine.quote_vector(quotes)
+        w = engine.weights * self.present[engine.indices]
+        self.covered = np.bincount(engine.rows, weights=w, minlength=engine.n_funds)
+        self.weighted = np.bincount(engine.rows, weights=w * self.values[engine.indices], minlength=engine.n_funds)
+        self._finish(np.arange(engine.n_funds))
+        self.ready = True
+        self._ticks = 0
+
+    def _finish(self, funds):
+        raw = self.engine.combine(self.weighted[funds], self.covered[funds], self.values, self.present, funds)
+        self.raw[funds] = raw
+        self.est[funds] = raw * self.engine.factors[funds]
+        self.profit[funds] = self.engine.principals[funds] * self.est[funds] / 100
+
+    def update(self, quotes, changed=None):
+        """changed 为本轮变化的代码集合；None 表示全部重算。返回受影响的基金名列表"""
+        engine = self.engine
+        self._ticks += 1
+        if changed is None or not self.ready or self._ticks >= self.RESYNC_EVERY:
+            self._rebuild(quotes)
+            return list(engine.fund_names)
+
+        cols = [engine.symbol_index[c] for c in changed if c in engine.symbol_index]
+        if not cols: return []
+        cols = np.asarray(cols, dtype=np.int64)
+        new_values = np.zeros(len(cols))
+        new_present = np.zeros(len(cols), dtype=bool)
+        for k, j in enumerate(cols):
+            pct = quote_return(quotes.get(engine.symbols[j]))
+            if pct is not None: new_values[k], new_present[k] = pct, True
+
+        # 每个证券的变化量：Δ(加权涨幅) = 新涨幅·有无 - 旧涨幅·有无，Δ(覆盖) = 新有无 - 旧有无
+        d_weighted = new_values * new_present - self.values[cols] * self.present[cols]
+        d_covered = new_present.astype(float) - self.present[cols]
+        self.values[cols], self.present[cols] = new_values, new_present
+
+        funds, weights, pos = engine.postings(cols)
+        np.add.at(self.weighted, funds, weights * d_weighted[pos])
+        np.add.at(self.covered, funds, weights * d_covered[pos])
+
+        # 代理指数变了，用它补残余仓位的基金也要重算
+        proxied = np.flatnonzero(engine.residual & np.isin(engine.proxy_cols, cols))
+        funds = np.union1d(funds, proxied)
+        self._finish(funds)
+        return [engine.fund_names[i] for i in funds]
+
+    def result(self, name):
+        i = self.engine.fund_index[name]
+        return {
+            'raw': float(self.raw[i]),
+            'est': float(self.est[i]),
+            'covered_weight': float(self.covered[i]),
+            'coverage': float(self.engine.coverage(self.covered[i])),
+            'profit': float(self.profit[i]),
+        }
+
+_engine_cache = {}
+
+def _config_fingerprint(funds_config):
+    return json.dumps(
+        {n: [info.get('factor', 1.0), info.get('holding_value', 0), info.get('holdings', []),
+             info.get('estimator'), info.get('proxy')] for n, info in funds_config.items()},
+        sort_keys=True, ensure_ascii=False
+    )
+
+def get_engine(funds_config, mode=None):
+    """按配置内容缓存编译结果，funds.json 不变就复用同一个引擎；mode 不为 None 时所有基金统一用该估值模式
+    同一份配置的各个模式各缓存一份 (不同会话可以用不同模式，互不挤掉)，配置变了才清掉旧配置的引擎
+    """
+    fingerprint = _config_fingerprint(funds_config)
+    key = (fingerprint, mode)
+    engine = _engine_cache.get(key)
+    if engine is None:
+        for old in [k for k in _engine_cache if k[0] != fingerprint]:
+            _engine_cache.pop(old, None)
+        engine = _engine_cache[key] = ValuationEngine(funds_config, mode)
+    return engine